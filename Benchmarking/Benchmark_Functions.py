@@ -0,0 +1,342 @@
+'''
+-------------------------
+Written for Python 3.7
+Python modules required:
+-Numpy
+-Scipy
+-dadi
+-------------------------
+
+Daniel Portik
+daniel.portik@gmail.com
+https://github.com/dportik
+Updated October 2020
+'''
+import os
+import re
+import sys
+import time
+import subprocess
+import inspect
+import numpy
+import dadi
+from datetime import datetime
+
+#the main directory holds Optimize_Functions.py, whose memory probe measures the peak memory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Optimize_Functions
+
+def get_model_functions(module, models=None):
+    """
+    Return a list of [model_name, function] pairs for the models defined in a
+    model script (ex. Models_2D or Models_3D), in the order they appear in the file.
+
+    Arguments
+    module: an imported model script, ex. Models_2D
+    models: an optional list of model names to restrict the benchmark to
+    """
+    funcs = [f for f in vars(module).values()
+                 if inspect.isfunction(f) and f.__module__ == module.__name__]
+    funcs.sort(key=lambda f: f.__code__.co_firstlineno)
+    if models is not None:
+        missing = [m for m in models if m not in [f.__name__ for f in funcs]]
+        if missing:
+            raise ValueError("Models not found in {0}: {1}".format(module.__name__, ", ".join(missing)))
+        funcs = [f for f in funcs if f.__name__ in models]
+    return [[f.__name__, f] for f in funcs]
+
+def get_param_labels(func):
+    """
+    Return the parameter labels of a model function, read from the line that
+    unpacks the params argument (ex. 'nu1, nu2, m, T = params'). Models that
+    do not use their parameters (ex. no_divergence) return an empty list.
+
+    Arguments
+    func: a model function, ex. Models_2D.sym_mig
+    """
+    source = inspect.getsource(func)
+    match = re.search(r"^\s*([\w\s,]+?)\s*=\s*params\s*$", source, re.MULTILINE)
+    if match is None:
+        return []
+    return [p.strip() for p in match.group(1).split(",") if p.strip()]
+
+def representative_params(param_labels):
+    """
+    Generate a set of representative parameter values for benchmarking. All
+    values are set to 1, except the island fraction (s) and admixture proportion (f),
+    which are set to 0.25 to match the starting values used in dadi_Run_2D_Set.py.
+
+    Arguments
+    param_labels: list of parameter labels, as returned by get_param_labels
+    """
+    return [0.25 if p in ["s", "f"] else 1.0 for p in param_labels]
+
+def time_evaluation(func, params, ns, pts, repeats):
+    """
+    Evaluate a model function several times, return a list with the following elements:
+    [median time per evaluation (seconds), peak memory of a single evaluation (MB)]
+
+    The peak memory is the increase in resident memory of a separate evaluation performed in
+    a forked process, measured as for the memory_budget of Optimize_Routine (see
+    Optimize_Functions.forked_memory), so it includes the arrays allocated by the integrators.
+
+    Arguments
+    func: model function or extrapolating function
+    params: list of parameter values
+    ns: sample sizes
+    pts: grid size (integer) or list of grid sizes for an extrapolating function
+    repeats: number of timed evaluations
+    """
+    times = []
+    for i in range(int(repeats)):
+        tb = time.perf_counter()
+        func(params, ns, pts)
+        times.append(time.perf_counter() - tb)
+
+    peak = Optimize_Functions.forked_memory(func, params, ns, pts)
+
+    return [numpy.median(times), peak]
+
+def Benchmark_Models(module, pts_list, ns_list, outfile, label, repeats=3, models=None):
+    """
+    Benchmark every model of a model script across a matrix of grid sizes and
+    sample sizes. For each model, sample size and grid size set, the median time
+    and peak memory are measured for a single evaluation (at the largest grid size of
+    the set) and for an extrapolated evaluation (across all grid sizes of the set).
+    Results are appended to a tab-delimited file, so runs with different labels
+    (ex. dadi_pipeline or dadi versions) can be compared with Compare_Benchmarks.
+
+    Arguments
+    module: an imported model script, ex. Models_2D
+    pts_list: a list of grid size sets, ex. [[20,30,40], [50,60,70]]
+    ns_list: a list of sample sizes, ex. [[16,32], [20,40]]
+    outfile: prefix for output naming
+    label: a label for this benchmark run, ex. "v3.1.6"
+    repeats: number of timed evaluations per measurement
+    models: an optional list of model names to restrict the benchmark to
+    """
+    outname = "{}.benchmark.txt".format(outfile)
+    if not os.path.exists(outname):
+        with open(outname, 'a') as fh_out:
+            fh_out.write("Label\tDate\tModel\tparam_number\tsample_sizes\tpts\t"
+                             "eval_time(s)\teval_peak(MB)\textrap_time(s)\textrap_peak(MB)\n")
+
+    print("\n\n============================================================================"
+              "\nBenchmarking models in {}\n============================================================================\n".format(module.__name__))
+    tb = datetime.now()
+
+    for model_name, func in get_model_functions(module, models):
+        param_labels = get_param_labels(func)
+        params = representative_params(param_labels)
+        func_exec = dadi.Numerics.make_extrap_log_func(func)
+        print("\n\tModel {0} ({1} parameters):".format(model_name, len(param_labels)))
+
+        for ns in ns_list:
+            for pts in pts_list:
+                single = time_evaluation(func, params, ns, max(pts), repeats)
+                extrap = time_evaluation(func_exec, params, ns, pts, repeats)
+                print("\t\tns = {0}, pts = {1}: evaluation {2:.3f} s ({3:.1f} MB), "
+                          "extrapolated {4:.3f} s ({5:.1f} MB)".format(ns, pts, single[0], single[1],
+                                                                           extrap[0], extrap[1]))
+                with open(outname, 'a') as fh_out:
+                    fh_out.write("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6:.4f}\t{7:.2f}\t{8:.4f}\t{9:.2f}\n".format(
+                        label, datetime.now().strftime("%Y-%m-%d"), model_name, len(param_labels),
+                        ",".join([str(x) for x in ns]), ",".join([str(x) for x in pts]),
+                        single[0], single[1], extrap[0], extrap[1]))
+
+    print("\nBenchmark Time: {0} (H:M:S)\n\n"
+              "============================================================================".format(datetime.now() - tb))
+
+def read_benchmarks(filename):
+    """
+    Read a benchmark results file written by Benchmark_Models, return a dictionary
+    with keys (label, model, sample_sizes, pts) and values:
+    [eval_time, eval_peak, extrap_time, extrap_peak]
+
+    Arguments
+    filename: the benchmark results file, ex. "Models_2D.benchmark.txt"
+    """
+    results = {}
+    with open(filename, 'r') as fh:
+        lines = [line.strip().split('\t') for line in fh if not line.startswith("Label")]
+    for l in lines:
+        if len(l) == 10:
+            results[(l[0], l[2], l[4], l[5])] = [float(x) for x in l[6:]]
+    return results
+
+def Compare_Benchmarks(filename, baseline_label, new_label):
+    """
+    Print the ratio of times and peak memory between two labelled benchmark runs
+    stored in the same results file. Ratios below 1 indicate the new run is faster
+    or uses less memory.
+
+    Arguments
+    filename: the benchmark results file, ex. "Models_2D.benchmark.txt"
+    baseline_label: label of the reference run
+    new_label: label of the run to compare against the reference
+    """
+    results = read_benchmarks(filename)
+    keys = sorted([k for k in results if k[0] == new_label and (baseline_label,) + k[1:] in results],
+                      key=lambda k: k[1:])
+    if not keys:
+        raise ValueError("No shared measurements found for labels '{0}' and '{1}'.".format(baseline_label, new_label))
+
+    print("\n\nComparing benchmark '{0}' to baseline '{1}':\n".format(new_label, baseline_label))
+    print("\tModel\tsample_sizes\tpts\teval_time\teval_peak\textrap_time\textrap_peak")
+    for k in keys:
+        base = results[(baseline_label,) + k[1:]]
+        new = results[k]
+        ratios = ["{:.2f}x".format(n / b) if b > 0 else "NA" for n, b in zip(new, base)]
+        print("\t{0}\t{1}\t{2}\t{3}".format(k[1], k[2], k[3], "\t".join(ratios)))
+
+def Compare_Grids(module, ns, pts, explore_pts, outfile, label, samples=10, seed=1, models=None):
+    """
+    Validate the use of a coarser grid size (explore_pts) during the exploratory rounds of
+    Optimize_Routine, by comparing log-likelihoods calculated with the coarse and full grid
+    sizes for every model of a model script. For each model, a data spectrum is simulated
+    (Poisson-sampled, theta = 1000) at the representative parameter values with the full grid,
+    and a number of parameter sets are drawn around these values (perturbed with fold = 1).
+    Each parameter set is scored against the data with both grid sizes, and the following are
+    reported: the median and maximum absolute difference in log-likelihood, the rank correlation
+    of the log-likelihoods across parameter sets, whether both grid sizes select the same best
+    parameter set, and the ratio of evaluation times (coarse / full). Results are appended to a
+    tab-delimited file named '[outfile].grids.txt'.
+
+    Arguments
+    module: an imported model script, ex. Models_3D
+    ns: sample sizes, ex. [12,20,14]
+    pts: the full grid size, ex. [50,60,70]
+    explore_pts: the coarse grid size, ex. [30,40,50]
+    outfile: prefix for output naming
+    label: a label for this run, ex. "v3.1.6"
+    samples: number of parameter sets compared per model
+    seed: a seed for the random number generator, so every run compares the same parameter sets
+    models: an optional list of model names to restrict the comparison to
+    """
+    from scipy.stats import spearmanr
+    outname = "{}.grids.txt".format(outfile)
+    if not os.path.exists(outname):
+        with open(outname, 'a') as fh_out:
+            fh_out.write("Label\tDate\tModel\tsample_sizes\tpts\texplore_pts\tmedian_ll_diff\tmax_ll_diff\t"
+                             "rank_correlation\tsame_best\ttime_ratio\n")
+
+    print("\n\n============================================================================"
+              "\nComparing grid sizes {0} and {1} for models in {2}"
+              "\n============================================================================\n".format(explore_pts, pts, module.__name__))
+    tb = datetime.now()
+
+    for model_name, func in get_model_functions(module, models):
+        param_labels = get_param_labels(func)
+        if not param_labels:
+            continue
+        numpy.random.seed(seed)
+        params = representative_params(param_labels)
+        func_exec = dadi.Numerics.make_extrap_log_func(func)
+        data = (1000 * func_exec(params, ns, pts)).sample()
+
+        ll_full, ll_explore, t_full, t_explore = [], [], 0.0, 0.0
+        for i in range(int(samples)):
+            p = dadi.Misc.perturb_params(params, fold=1)
+            tb_eval = time.perf_counter()
+            ll_full.append(dadi.Inference.ll_multinom(func_exec(p, ns, pts), data))
+            t_full += time.perf_counter() - tb_eval
+            tb_eval = time.perf_counter()
+            ll_explore.append(dadi.Inference.ll_multinom(func_exec(p, ns, explore_pts), data))
+            t_explore += time.perf_counter() - tb_eval
+
+        diffs = numpy.abs(numpy.array(ll_full) - numpy.array(ll_explore))
+        rank = spearmanr(ll_full, ll_explore)[0] if int(samples) > 2 else numpy.nan
+        same_best = int(numpy.argmax(ll_full) == numpy.argmax(ll_explore))
+        print("\t{0}: median LL difference {1:.3f}, max {2:.3f}, rank correlation {3:.3f}, "
+                  "same best = {4}, time ratio {5:.2f}".format(model_name, numpy.median(diffs), diffs.max(),
+                                                                   rank, bool(same_best), t_explore / t_full))
+        with open(outname, 'a') as fh_out:
+            fh_out.write("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6:.4f}\t{7:.4f}\t{8:.4f}\t{9}\t{10:.3f}\n".format(
+                label, datetime.now().strftime("%Y-%m-%d"), model_name, ",".join([str(x) for x in ns]),
+                ",".join([str(x) for x in pts]), ",".join([str(x) for x in explore_pts]),
+                numpy.median(diffs), diffs.max(), rank, same_best, t_explore / t_full))
+
+    print("\nComparison Time: {0} (H:M:S)\n\n"
+              "============================================================================".format(datetime.now() - tb))
+
+def parse_importtime(text, packages):
+    """
+    Parse the output of 'python -X importtime', return a dictionary with the time
+    in seconds spent importing each package. Time is counted at the outermost import of
+    a package, so the imports a package triggers within itself are not counted twice.
+
+    Arguments
+    text: the stderr output of 'python -X importtime'
+    packages: list of top-level package names, ex. ["numpy", "scipy", "matplotlib", "dadi"]
+    """
+    totals = dict([(p, 0.0) for p in packages])
+    lines = [l for l in text.splitlines() if l.startswith("import time:") and "|" in l and "cumulative" not in l]
+    #lines are written after each import completes, so read them in reverse to visit parents first
+    stack = []
+    for line in reversed(lines):
+        fields = line.split("|")
+        cumulative = float(fields[1]) / 1e6
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        root = name.strip().split(".")[0]
+        if root == "pylab":
+            root = "matplotlib"
+        stack = stack[:depth]
+        if root in totals and root not in stack:
+            totals[root] += cumulative
+        stack.append(root)
+    return totals
+
+def time_import(statement, paths, repeats=3, packages=("numpy", "scipy", "matplotlib", "dadi")):
+    """
+    Time the import statements of an entry point in a new interpreter, return a list with the
+    following elements: [median wall time (seconds), dictionary of import time per package (seconds)]
+
+    Arguments
+    statement: the import statements of the entry point, ex. "import dadi; import Optimize_Functions"
+    paths: list of directories added to PYTHONPATH, so the pipeline modules can be found
+    repeats: number of timed interpreter launches (the median is reported)
+    packages: top-level packages for which the import time is reported
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(list(paths) + [env.get("PYTHONPATH", "")])
+    times = []
+    for i in range(int(repeats)):
+        tb = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], env=env,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        times.append(time.perf_counter() - tb)
+        if proc.returncode != 0:
+            raise RuntimeError("Could not run '{0}':\n{1}".format(statement, proc.stderr.splitlines()[-1]))
+    return [numpy.median(times), parse_importtime(proc.stderr, packages)]
+
+def Benchmark_Startup(entry_points, outfile, label, repeats=3):
+    """
+    Measure the startup cost of pipeline entry points (the time to launch the interpreter and
+    perform their imports), and how much of it is spent importing numpy, scipy, matplotlib
+    and dadi. Results are appended to a tab-delimited file, so runs with different labels
+    can be compared.
+
+    Arguments
+    entry_points: a list of [name, import statements, list of directories for PYTHONPATH],
+                  ex. [["dadi_Run_Optimizations.py", "import dadi; import Optimize_Functions", ["/path/to/dadi_pipeline"]]]
+    outfile: prefix for output naming
+    label: a label for this benchmark run, ex. "v3.1.6"
+    repeats: number of timed interpreter launches per entry point
+    """
+    packages = ["numpy", "scipy", "matplotlib", "dadi"]
+    outname = "{}.startup.txt".format(outfile)
+    if not os.path.exists(outname):
+        with open(outname, 'a') as fh_out:
+            fh_out.write("Label\tDate\tEntry_point\tstartup_time(s)\t{}\n".format(
+                "\t".join(["{}_import(s)".format(p) for p in packages])))
+
+    print("\n\n============================================================================"
+              "\nBenchmarking startup of {} entry points\n============================================================================\n".format(len(entry_points)))
+
+    for name, statement, paths in entry_points:
+        wall, totals = time_import(statement, paths, repeats, packages)
+        print("\t{0}: {1:.3f} s ({2})".format(name, wall, ", ".join(["{0} {1:.3f} s".format(p, totals[p]) for p in packages])))
+        with open(outname, 'a') as fh_out:
+            fh_out.write("{0}\t{1}\t{2}\t{3:.4f}\t{4}\n".format(label, datetime.now().strftime("%Y-%m-%d"), name, wall,
+                                                                    "\t".join(["{:.4f}".format(totals[p]) for p in packages])))
@@ -0,0 +1,134 @@
+'''
+Usage: python dadi_Benchmark_Models.py
+
+The purpose of this script is to measure how expensive each of the 2D and 3D
+models is before launching a set run. Every model function in the Models_2D.py and
+Models_3D.py scripts is evaluated at representative parameter values across a matrix
+of grid sizes (pts) and sample sizes (projections). For each combination the median time
+and peak memory are reported for a single evaluation and for an extrapolated evaluation
+(the type of evaluation performed at every step of an optimization).
+
+The sections with #************** must be edited.
+
+This script must be in the same working directory as Benchmark_Functions.py. It will
+look for the Models_2D.py and Models_3D.py scripts in the Two_Population_Pipeline and
+Three_Population_Pipeline directories of dadi_pipeline.
+
+Outputs:
+ Results are appended to a tab-delimited file for each model script, labelled with
+ the label supplied below. Running the benchmark again with a new label (for example
+ after updating dadi or dadi_pipeline) adds rows to the same file, and the two runs can
+ then be compared with the Compare_Benchmarks function. Here is an example of the output:
+
+ Label	Date	Model	param_number	sample_sizes	pts	eval_time(s)	eval_peak(MB)	extrap_time(s)	extrap_peak(MB)
+ v3.1.6	2020-10-19	no_mig	3	16,32	50,60,70	0.0412	0.63	0.1218	0.96
+ v3.1.6	2020-10-19	sym_mig	4	16,32	50,60,70	0.0456	0.63	0.1334	0.96
+
+-------------------------
+Written for Python 3.7
+Python modules required:
+-Numpy
+-Scipy
+-dadi
+-------------------------
+
+Daniel Portik
+daniel.portik@gmail.com
+https://github.com/dportik
+Updated October 2020
+'''
+import os
+import sys
+import Benchmark_Functions
+
+#add the model script directories so Models_2D and Models_3D can be imported
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(repo_dir, "Two_Population_Pipeline"))
+sys.path.append(os.path.join(repo_dir, "Three_Population_Pipeline"))
+import Models_2D
+import Models_3D
+
+#**************
+#a label for this benchmark run, used to compare results between versions
+label = "v3.1.6"
+
+#**************
+#number of timed evaluations per measurement, the median is reported
+repeats = 3
+
+#================================================================================
+# Benchmark the 2D models
+#================================================================================
+'''
+ We will use a function from the Benchmark_Functions.py script:
+
+ Benchmark_Models(module, pts_list, ns_list, outfile, label, repeats=3, models=None)
+
+   Mandatory Arguments =
+    module: the imported model script, ex. Models_2D
+    pts_list: a list of grid size sets to test, ex. [[20,30,40], [50,60,70]]
+    ns_list: a list of sample sizes (projections) to test, ex. [[16,32], [22,46]]
+    outfile: prefix for output naming
+    label: a label for this benchmark run
+
+   Optional Arguments =
+    repeats: number of timed evaluations per measurement
+    models: a list of model names, to only benchmark a subset of the models
+'''
+
+#**************
+pts_list = [[20,30,40], [50,60,70]]
+ns_list = [[16,32], [22,46]]
+
+Benchmark_Functions.Benchmark_Models(Models_2D, pts_list, ns_list, "Models_2D", label, repeats=repeats)
+
+#================================================================================
+# Benchmark the 3D models
+#================================================================================
+
+#**************
+pts_list = [[20,30,40], [50,60,70]]
+ns_list = [[12,20,14], [26,46,20]]
+
+Benchmark_Functions.Benchmark_Models(Models_3D, pts_list, ns_list, "Models_3D", label, repeats=repeats)
+
+#================================================================================
+# Compare two benchmark runs
+#================================================================================
+'''
+ After running the benchmark again with a new label, the runs can be compared:
+
+ Compare_Benchmarks(filename, baseline_label, new_label)
+
+ This prints the ratio of the new times and peak memory to the baseline values
+ for every model, sample size and grid size measured in both runs.
+'''
+#Benchmark_Functions.Compare_Benchmarks("Models_2D.benchmark.txt", "v3.1.6", "v3.2.0")
+
+#================================================================================
+# Validate a coarse grid size for the exploratory rounds
+#================================================================================
+'''
+ The exploratory rounds of Optimize_Routine can be run with a coarser grid size
+ (explore_pts), with all replicates re-scored using the full grid size. Before doing so,
+ the log-likelihoods calculated with both grid sizes can be compared for every model:
+
+ Compare_Grids(module, ns, pts, explore_pts, outfile, label, samples=10, seed=1, models=None)
+
+   Mandatory Arguments =
+    module: the imported model script, ex. Models_3D
+    ns: sample sizes, ex. [12,20,14]
+    pts: the full grid size, ex. [50,60,70]
+    explore_pts: the coarse grid size, ex. [30,40,50]
+    outfile: prefix for output naming
+    label: a label for this run
+
+   Optional Arguments =
+    samples: number of parameter sets compared per model
+    seed: a seed for the random number generator
+    models: a list of model names, to only compare a subset of the models
+'''
+
+#**************
+#Unhash the command below to compare the grid sizes for the 3D models
+#Benchmark_Functions.Compare_Grids(Models_3D, [12,20,14], [50,60,70], [30,40,50], "Models_3D", label)
@@ -0,0 +1,78 @@
+'''
+Usage: python dadi_Benchmark_Startup.py
+
+The purpose of this script is to measure the startup cost of the dadi_pipeline entry
+points. This cost is paid by every job, and can become noticeable when running thousands
+of short jobs (ex. goodness of fit simulations) as cluster array jobs. For each entry point,
+a new interpreter is launched to perform the imports of the script, and the median time
+is reported along with the time spent importing numpy, scipy, matplotlib and dadi.
+The analysis sections of the scripts are not run.
+
+The sections with #************** can be edited.
+
+This script must be in the same working directory as Benchmark_Functions.py. It will
+look for the pipeline scripts using the directory layout of dadi_pipeline.
+
+Outputs:
+ Results are appended to a tab-delimited file labelled with the label supplied below.
+ Here is an example of the output:
+
+ Label	Date	Entry_point	startup_time(s)	numpy_import(s)	scipy_import(s)	matplotlib_import(s)	dadi_import(s)
+ v3.1.6	2020-10-19	dadi_Run_2D_Set.py	1.0863	0.1819	0.3907	0.3388	0.7985
+ v3.1.6	2020-10-19	Make_Plots.py	1.2609	0.2671	0.5545	0.5328	1.1786
+
+ Time is counted for each package where it is first imported, so the times overlap: for
+ example, dadi imports numpy, scipy and matplotlib (for its plotting functions), and their
+ import times are also included in the dadi import time.
+
+-------------------------
+Written for Python 3.7
+Python modules required:
+-Numpy
+-Scipy
+-dadi
+-------------------------
+
+Daniel Portik
+daniel.portik@gmail.com
+https://github.com/dportik
+Updated October 2020
+'''
+import os
+import Benchmark_Functions
+
+#locate the pipeline directories
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+two_pop = os.path.join(repo_dir, "Two_Population_Pipeline")
+three_pop = os.path.join(repo_dir, "Three_Population_Pipeline")
+gof = os.path.join(repo_dir, "Goodness_of_Fit")
+plotting = os.path.join(repo_dir, "Plotting")
+
+#**************
+#a label for this benchmark run, used to compare results between versions
+label = "v3.1.6"
+
+#**************
+#number of timed interpreter launches per entry point, the median is reported
+repeats = 5
+
+#================================================================================
+# Entry points
+#================================================================================
+'''
+ Each entry point is a list of [name, import statements, directories for PYTHONPATH],
+ where the import statements are those found at the top of the script.
+'''
+entry_points = [["python (no imports)", "pass", []],
+                ["dadi", "import dadi", []],
+                ["dadi_Run_Optimizations.py", "import sys, os, numpy, dadi; from datetime import datetime; "
+                     "import Optimize_Functions", [repo_dir]],
+                ["dadi_Run_2D_Set.py", "import sys, os, numpy, dadi; from datetime import datetime; "
+                     "import Optimize_Functions; import Models_2D", [repo_dir, two_pop]],
+                ["dadi_Run_3D_Set.py", "import sys, os, numpy, dadi; from datetime import datetime; "
+                     "import Optimize_Functions; import Models_3D", [repo_dir, three_pop]],
+                ["Simulate_and_Optimize.py", "import sys, os, numpy, dadi; from datetime import datetime; "
+                     "import Optimize_Functions_GOF", [gof]],
+                ["Make_Plots.py", "import os, numpy, dadi; import Plotting_Functions", [plotting]]]
+
+Benchmark_Functions.Benchmark_Startup(entry_points, "Startup", label, repeats=repeats)
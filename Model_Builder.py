@@ -0,0 +1,380 @@
+'''
+Build dadi model functions from a list of demographic events (splits, admixture,
+and epochs of drift and migration), instead of writing each model function by hand.
+
+A model is described with the event functions below, where the values of population
+sizes, times, migration rates and admixture fractions are given as parameter names
+(strings), constants (numbers), the complement of a parameter ("1-s"), or exponential
+growth between two values (Growth). For example, the sym_mig model of Models_2D.py is:
+
+ sym_mig = Build_Model("sym_mig", [Split(),
+                                   Epoch("T", ["nu1", "nu2"], migration={"m12":"m", "m21":"m"})],
+                       params=["nu1", "nu2", "m", "T"])
+
+and the admix_origin_sym_mig_adj model of Models_3D.py is:
+
+ admix_origin_sym_mig_adj = Build_Model("admix_origin_sym_mig_adj",
+                                        [Split(),
+                                         Epoch("T1", ["nu1", "nu2"]),
+                                         Admixed_Origin("f"),
+                                         Epoch("T2", ["nu1", "nu2", "nu3"],
+                                               migration={"m23":"m2", "m32":"m2", "m13":"m3", "m31":"m3"})],
+                                        params=["nu1", "nu2", "nu3", "m2", "m3", "T1", "T2", "f"])
+
+The model object is called like any model function (params, ns, pts), and can be passed
+directly to Optimize_Routine. Its parameter labels and number of parameters are taken from
+the events, and the phi of every event is kept between calls, so that an evaluation which
+only changes the parameters of later events (ex. the finite differences of the uncertainty
+analyses, or a likelihood scan of the final epoch) resumes from the last unchanged event.
+
+-------------------------
+Written for Python 3.7
+Python modules required:
+-Numpy
+-dadi
+-------------------------
+
+Daniel Portik
+daniel.portik@gmail.com
+https://github.com/dportik
+Updated October 2020
+'''
+import numpy
+from datetime import datetime
+from dadi import Numerics, PhiManip, Integration
+from dadi.Spectrum_mod import Spectrum
+
+#the migration rates that can be set for each number of populations
+migration_keys = {1: [], 2: ["m12", "m21"], 3: ["m12", "m21", "m23", "m32", "m13", "m31"]}
+
+def Split(pop=None):
+    """
+    Return a split event. With one population, the population splits into populations 1 and 2.
+    With two populations, population 1 or 2 (pop) splits to produce population 3.
+
+    Arguments
+    pop: the population that splits (1 or 2), only used when there are two populations
+    """
+    return {"event": "split", "pop": pop}
+
+def Admixed_Origin(f):
+    """
+    Return an event in which population 3 originates from admixture of populations 1 and 2,
+    with a fraction f derived from population 1 (and 1-f from population 2).
+
+    Arguments
+    f: the admixture fraction (a parameter name or a number)
+    """
+    return {"event": "admixed_origin", "f": f}
+
+def Admixture(f, source, target):
+    """
+    Return a discrete admixture event, in which a fraction f of the target population is
+    replaced by migrants from the source population.
+
+    Arguments
+    f: the admixture fraction (a parameter name or a number)
+    source: the population the migrants come from (1, 2 or 3)
+    target: the population receiving the migrants (1, 2 or 3)
+    """
+    return {"event": "admixture", "f": f, "source": int(source), "target": int(target)}
+
+def Epoch(T, sizes, migration=None):
+    """
+    Return an epoch of drift (and migration) lasting time T.
+
+    Arguments
+    T: the scaled time of the epoch (a parameter name or a number)
+    sizes: list with the size of each population during the epoch. Each is a parameter name,
+           a number, a complement ("1-s") or Growth(start, end).
+    migration: an optional dictionary of migration rates, with keys of the dadi arguments
+               (ex. {"m12":"m", "m21":"m"}). Rates not included are zero.
+    """
+    return {"event": "epoch", "T": T, "sizes": list(sizes), "migration": dict(migration or {})}
+
+def Growth(start, end):
+    """
+    Return a population size that changes exponentially from start to end over an epoch.
+
+    Arguments
+    start: size at the start of the epoch (a parameter name, number or complement)
+    end: size at the end of the epoch (a parameter name, number or complement)
+    """
+    return ["growth", start, end]
+
+def value_names(value):
+    """
+    Return the list of parameter names used by a value of an event.
+
+    Arguments
+    value: a parameter name, number, complement ("1-s") or Growth(start, end)
+    """
+    if isinstance(value, list):
+        return value_names(value[1]) + value_names(value[2])
+    if isinstance(value, str):
+        return [value[2:]] if value.startswith("1-") else [value]
+    return []
+
+def event_names(event):
+    """
+    Return the list of parameter names used by an event, in order of appearance.
+
+    Arguments
+    event: an event (ex. returned by Epoch)
+    """
+    names = []
+    if event["event"] == "epoch":
+        values = [event["T"]] + event["sizes"] + list(event["migration"].values())
+    elif event["event"] == "split":
+        values = []
+    else:
+        values = [event["f"]]
+    for value in values:
+        names.extend([n for n in value_names(value) if n not in names])
+    return names
+
+def default_params(events):
+    """
+    Return the parameter names used by a list of events, in the order used by the models of
+    Models_2D.py and Models_3D.py: population sizes, migration rates, times, then fractions.
+    The fractions are the parameters used as complements (ex. s in "1-s"), followed by the
+    admixture fractions, so the island models give [..., s, f]. Within each group, parameters
+    are in order of first appearance.
+
+    Arguments
+    events: a list of events
+    """
+    groups = [[], [], [], [], []]
+    def add(group, value):
+        for name in value_names(value):
+            if name not in groups[group]:
+                groups[group].append(name)
+    for event in events:
+        if event["event"] == "epoch":
+            for size in event["sizes"]:
+                add(0, size)
+                #parameters used as complements are fractions, not sizes
+                for value in (size[1:] if isinstance(size, list) else [size]):
+                    if isinstance(value, str) and value.startswith("1-"):
+                        add(3, value)
+            for rate in event["migration"].values():
+                add(1, rate)
+            add(2, event["T"])
+        elif event["event"] != "split":
+            add(4, event["f"])
+    fractions = groups[3] + groups[4]
+    params = []
+    for group, names in enumerate(groups):
+        params.extend([n for n in names if n not in params and (group >= 3 or n not in fractions)])
+    return params
+
+def resolve(value, values, T=None):
+    """
+    Return the numerical value (or function of time, for Growth) of a value of an event.
+
+    Arguments
+    value: a parameter name, number, complement ("1-s") or Growth(start, end)
+    values: dictionary of {parameter name: value}
+    T: the time of the epoch, required for Growth
+    """
+    if isinstance(value, list):
+        start, end = resolve(value[1], values), resolve(value[2], values)
+        return lambda t: start * (end/start)**(t/T)
+    if isinstance(value, str):
+        return 1 - values[value[2:]] if value.startswith("1-") else values[value]
+    return value
+
+class Model(object):
+    """
+    A model function built from a list of events (see Build_Model). This is a class rather than
+    a closure so that the model can be sent to worker processes.
+    """
+    def __init__(self, name, events, params, description, cache):
+        self.__name__ = name
+        self.__doc__ = description
+        self.events = events
+        self.param_labels = params
+        self.param_number = len(params)
+        self.cache = cache
+        self.phi_cache = {}
+        #the parameters used by each event and all events before it, which identify a cached phi
+        self.prefix_names = []
+        used = []
+        for event in events:
+            used.extend([n for n in event_names(event) if n not in used])
+            self.prefix_names.append(list(used))
+        #the number of populations after each event
+        self.structure = []
+        npops = 1
+        for event in events:
+            if event["event"] in ["split", "admixed_origin"]:
+                npops += 1
+            self.structure.append([event["event"], npops])
+        self.npops = npops
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["phi_cache"] = {}
+        return state
+
+    def __repr__(self):
+        return "Model_Builder.Model({})".format(self.__name__)
+
+    def apply(self, event, phi, xx, values, npops):
+        """
+        Apply an event to phi, return the new phi.
+
+        Arguments
+        event: the event
+        phi: phi before the event
+        xx: the grid
+        values: dictionary of {parameter name: value}
+        npops: number of populations before the event
+        """
+        if event["event"] == "split":
+            if npops == 1:
+                return PhiManip.phi_1D_to_2D(xx, phi)
+            if event["pop"] == 1:
+                return PhiManip.phi_2D_to_3D_split_1(xx, phi)
+            return PhiManip.phi_2D_to_3D_split_2(xx, phi)
+        if event["event"] == "admixed_origin":
+            return PhiManip.phi_2D_to_3D_admix(phi, resolve(event["f"], values), xx, xx, xx)
+        if event["event"] == "admixture":
+            #the admixture functions of dadi modify phi in place, which would change the cached phi
+            phi = phi.copy()
+            f = resolve(event["f"], values)
+            if npops == 2:
+                if event["target"] == 2:
+                    return PhiManip.phi_2D_admix_1_into_2(phi, f, xx, xx)
+                return PhiManip.phi_2D_admix_2_into_1(phi, f, xx, xx)
+            fractions = [f if p == event["source"] else 0 for p in [1, 2, 3] if p != event["target"]]
+            admix = {1: PhiManip.phi_3D_admix_2_and_3_into_1, 2: PhiManip.phi_3D_admix_1_and_3_into_2,
+                         3: PhiManip.phi_3D_admix_1_and_2_into_3}[event["target"]]
+            return admix(phi, fractions[0], fractions[1], xx, xx, xx)
+        T = resolve(event["T"], values)
+        sizes = [resolve(s, values, T) for s in event["sizes"]]
+        rates = dict([(k, resolve(v, values)) for k, v in event["migration"].items()])
+        if npops == 1:
+            return Integration.one_pop(phi, xx, T, nu=sizes[0])
+        if npops == 2:
+            return Integration.two_pops(phi, xx, T, nu1=sizes[0], nu2=sizes[1],
+                                            m12=rates.get("m12", 0), m21=rates.get("m21", 0))
+        return Integration.three_pops(phi, xx, T, nu1=sizes[0], nu2=sizes[1], nu3=sizes[2],
+                                          m12=rates.get("m12", 0), m21=rates.get("m21", 0),
+                                          m23=rates.get("m23", 0), m32=rates.get("m32", 0),
+                                          m13=rates.get("m13", 0), m31=rates.get("m31", 0))
+
+    def __call__(self, params, ns, pts):
+        values = dict(zip(self.param_labels, [float(p) for p in params]))
+        xx = Numerics.default_grid(pts)
+        keys = [tuple([values[n] for n in names]) for names in self.prefix_names]
+
+        #resume from the last event whose parameters are unchanged since the previous call
+        cached = self.phi_cache.get(pts, []) if self.cache else []
+        start = 0
+        while start < len(cached) and cached[start][0] == keys[start]:
+            start += 1
+        phi = cached[start-1][1] if start > 0 else PhiManip.phi_1D(xx)
+        npops = self.structure[start-1][1] if start > 0 else 1
+        cached = cached[:start]
+
+        for event, key, (kind, pops) in zip(self.events[start:], keys[start:], self.structure[start:]):
+            phi = self.apply(event, phi, xx, values, npops)
+            npops = pops
+            if self.cache:
+                cached.append([key, phi])
+        if self.cache:
+            self.phi_cache[pts] = cached
+        return Spectrum.from_phi(phi, ns, tuple([xx] * npops))
+
+def Build_Model(name, events, params=None, description=None, cache=True):
+    """
+    Build a model function from a list of events, which can be used in place of the functions
+    of Models_2D.py and Models_3D.py. The model starts from one population at equilibrium, and
+    the events are applied in order from the past to the present. The returned model has the
+    attributes param_labels, param_number and structure (a list of [event type, number of
+    populations after the event]), which can be used to fill in the arguments of Optimize_Routine
+    and to estimate the cost of the model (see Estimate_Eval_Costs).
+
+    Arguments
+    name: the name of the model, ex. "sym_mig"
+    events: a list of events, from Split, Admixed_Origin, Admixture and Epoch
+    params: an optional list of the parameter names, giving their order in the params argument
+            of the model. Default is population sizes, migration rates, times, complements,
+            then admixture fractions (see default_params).
+    description: an optional description of the model, used as its docstring
+    cache: a Boolean, if True the phi of every event is kept and reused by the next call when
+           the parameters of that event and all earlier events are unchanged
+    """
+    used = []
+    for event in events:
+        used.extend([n for n in event_names(event) if n not in used])
+    if params is None:
+        params = default_params(events)
+    elif sorted(params) != sorted(used):
+        raise ValueError("\n\nERROR: The parameters of model '{0}' ({1}) do not match the parameters "
+                             "used by its events ({2}).\n\n".format(name, ", ".join(params), ", ".join(used)))
+    npops = 1
+    for event in events:
+        if event["event"] in ["split", "admixed_origin"]:
+            if (event["event"] == "split" and npops == 2 and event["pop"] not in [1, 2]) or \
+              (event["event"] == "admixed_origin" and npops != 2) or npops == 3:
+                raise ValueError("\n\nERROR: Invalid {0} event with {1} population(s) in model '{2}'.\n\n".format(event["event"], npops, name))
+            npops += 1
+        elif event["event"] == "admixture":
+            if npops == 1 or event["source"] == event["target"] or max(event["source"], event["target"]) > npops:
+                raise ValueError("\n\nERROR: Invalid admixture event with {0} population(s) in model '{1}'.\n\n".format(npops, name))
+        elif len(event["sizes"]) != npops or [k for k in event["migration"] if k not in migration_keys[npops]]:
+            raise ValueError("\n\nERROR: An epoch of model '{0}' requires {1} size(s) and migration rates "
+                                 "from: {2}.\n\n".format(name, npops, ", ".join(migration_keys[npops]) or "none"))
+    if description is None:
+        description = "Model built from events: {0}.\n\nParameters: {1}".format(", ".join([e["event"] for e in events]), ", ".join(params))
+    return Model(name, events, list(params), description, cache)
+
+def Make_Model_Set(models):
+    """
+    Return a list of dictionaries for Optimize_Model_Set (or Work_Queue.Run_Coordinator) from a
+    list of built models, with the model name, function, number of parameters and parameter labels.
+
+    Arguments
+    models: a list of models returned by Build_Model
+    """
+    return [{"model_name": m.__name__, "func": m, "param_number": m.param_number,
+                 "param_labels": ", ".join(m.param_labels)} for m in models]
+
+def model_cost(model, pts):
+    """
+    Return the relative cost of an extrapolated evaluation of a built model, as the number of grid
+    cells integrated in each epoch, summed over the epochs and the grid sizes of the extrapolation.
+
+    Arguments
+    model: a model returned by Build_Model
+    pts: grid size for extrapolation, list of three values
+    """
+    return float(sum([int(p)**npops for p in pts for kind, npops in model.structure if kind == "epoch"]))
+
+def Estimate_Eval_Costs(models, pts, ns, seconds_per_unit=None):
+    """
+    Estimate the seconds per extrapolated evaluation of each built model from its structure,
+    return a dictionary of {model_name: seconds} which can be used as the eval_costs argument
+    of Optimize_Model_Set, so the first round is also allocated from the budget.
+
+    The relative costs (see model_cost) are converted to seconds by timing one evaluation of
+    the cheapest model, with all parameters set to 0.5, unless seconds_per_unit is supplied.
+    The integration time of an epoch also depends on its parameter values, so these are
+    estimates, which Optimize_Model_Set replaces with measured costs after the first round.
+
+    Arguments
+    models: a list of models returned by Build_Model
+    pts: grid size for extrapolation, list of three values
+    ns: sample sizes of the spectrum, ex. fs.sample_sizes
+    seconds_per_unit: optional seconds per unit of relative cost
+    """
+    costs = dict([(m.__name__, model_cost(m, pts)) for m in models])
+    if seconds_per_unit is None:
+        reference = min(models, key=lambda m: costs[m.__name__])
+        func_exec = Numerics.make_extrap_log_func(reference)
+        tb = datetime.now()
+        func_exec(numpy.array([0.5] * reference.param_number), ns, pts)
+        seconds_per_unit = (datetime.now() - tb).total_seconds() / costs[reference.__name__]
+    return dict([(name, cost * seconds_per_unit) for name, cost in costs.items()])
@@ -14,10 +14,24 @@ Updated September 2019
 '''
 import sys
 import os
+import re
+import io
+import gzip
+import contextlib
 import numpy
 import dadi
 from datetime import datetime
 
+class DuplicateOptimum(Exception):
+    """
+    Raised during a replicate when the optimizer reaches the neighborhood of an optimum
+    that was already found, so the remaining iterations of the replicate can be skipped.
+    """
+    def __init__(self, params, label):
+        Exception.__init__(self, "Reached the optimum of {}".format(label))
+        self.params = params
+        self.label = label
+
 def parse_params(param_number, in_params=None, in_upper=None, in_lower=None):
     """    
     Function to correctly deal with parameters and bounds, and if none were provided, 
@@ -109,7 +123,7 @@ def parse_opt_settings(rounds, reps=None, maxiters=None, folds=None):
         
     return reps_list, maxiters_list, folds_list
 
-def collect_results(fs, sim_model, params_opt, roundrep, fs_folded):
+def collect_results(fs, sim_model, params_opt, roundrep, fs_folded, quiet=False):
     """    
     Gather up a bunch of results, return a list with following elements: 
     [roundnum_repnum, log-likelihood, AIC, chi^2 test stat, theta, parameter values] 
@@ -119,21 +133,25 @@ def collect_results(fs, sim_model, params_opt, roundrep, fs_folded):
     sim_model: model fit with optimized parameters
     params_opt: list of the optimized parameters
     fs_folded: a Boolean (True, False) for whether empirical spectrum is folded or not
+    quiet: a Boolean, if True the results are not printed to screen
     """    
 
     #calculate theta
     theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
     theta = numpy.around(theta, 2)
-    print("\t\t\tTheta = {:,}".format(theta))
+    if not quiet:
+        print("\t\t\tTheta = {:,}".format(theta))
     
     #calculate likelihood
     ll = dadi.Inference.ll_multinom(sim_model, fs)
     ll = numpy.around(ll, 2)
-    print("\t\t\tLikelihood = {:,}".format(ll))
+    if not quiet:
+        print("\t\t\tLikelihood = {:,}".format(ll))
 
     #calculate AIC 
     aic = ( -2*( float(ll))) + (2*len(params_opt))
-    print("\t\t\tAIC = {:,}".format(aic))
+    if not quiet:
+        print("\t\t\tAIC = {:,}".format(aic))
 
     #get Chi^2
     scaled_sim_model = sim_model*theta
@@ -146,14 +164,90 @@ def collect_results(fs, sim_model, params_opt, roundrep, fs_folded):
         #calculate Chi^2 statistic for unfolded
         chi2 = numpy.sum((scaled_sim_model - fs)**2/scaled_sim_model)
         chi2 = numpy.around(chi2, 2)
-    print("\t\t\tChi-Squared = {:,}".format(chi2))        
+    if not quiet:
+        print("\t\t\tChi-Squared = {:,}".format(chi2))
 
     #store key results in temporary sublist, append to larger results list
     temp_results = [roundrep, ll, aic, chi2, theta, params_opt]
 
     return temp_results
 
-def write_log(outfile, model_name, rep_results, roundrep):
+def score_spectra(sim_model, spectra, fs_folded, mask=None):
+    """
+    Score a stack of observed spectra (ex. goodness of fit simulations or bootstrapped spectra)
+    against a single model spectrum in one vectorized pass, return a list with the following
+    elements: [array of theta, array of log-likelihoods, array of chi^2 test stats].
+
+    The values are equivalent to those of dadi.Inference.optimal_sfs_scaling, dadi.Inference.ll_multinom
+    and the chi^2 test stat of collect_results for each spectrum: entries masked in the model or the
+    observed spectra are ignored, as are entries where the scaled model is not positive (log-likelihood)
+    or is zero (chi^2). Unlike collect_results, the values are not rounded.
+
+    Arguments
+    sim_model: model fit with optimized parameters
+    spectra: a list of spectrum objects sharing the same mask, or an array of shape (number of spectra,
+             spectrum shape) of spectrum data
+    fs_folded: a Boolean (True, False) for whether the observed spectra are folded or not
+    mask: the mask of the observed spectra, required if spectra is an array
+    """
+    from scipy.special import gammaln
+    if mask is None:
+        if isinstance(spectra, numpy.ndarray) and not numpy.ma.isMaskedArray(spectra[0]):
+            raise ValueError("\n\nERROR: A mask is required when scoring an array of spectrum data.\n\n")
+        mask = numpy.ma.getmaskarray(spectra[0])
+        if any([not numpy.array_equal(numpy.ma.getmaskarray(fs), mask) for fs in spectra[1:]]):
+            raise ValueError("\n\nERROR: The spectra to score must share the same mask.\n\n")
+    data = numpy.array([numpy.ma.filled(fs, 0) for fs in spectra], dtype=float)
+
+    if fs_folded is True and not sim_model.folded:
+        sim_model = sim_model.fold()
+    keep = numpy.logical_not(numpy.logical_or(mask, numpy.ma.getmaskarray(sim_model)))
+    model = numpy.asarray(sim_model.data)[keep]
+    data = data[:, keep]
+
+    #optimal scaling of the model for each spectrum
+    theta = data.sum(axis=1)/model.sum()
+    scaled = theta[:, numpy.newaxis]*model[numpy.newaxis, :]
+
+    #Poisson log-likelihood of each entry, and chi^2 contribution of each entry
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        valid = scaled > 0
+        ll_bins = -scaled + data*numpy.log(numpy.where(valid, scaled, 1.0)) - gammaln(data + 1.0)
+        ll = numpy.where(valid, ll_bins, 0.0).sum(axis=1)
+        nonzero = scaled != 0
+        chi2 = numpy.where(nonzero, (scaled - data)**2/numpy.where(nonzero, scaled, 1.0), 0.0).sum(axis=1)
+    return [theta, ll, chi2]
+
+def open_log(outfile, model_name, compress=False):
+    """
+    Open the main log file of a model for appending, return the file handle. If compress is
+    True, the log is written with gzip to '[outfile].[model_name].log.txt.gz' (each write adds
+    a gzip member, and the file can be read with zcat or gzip.open).
+
+    Arguments
+    outfile: prefix for output naming
+    model_name: a label to slap on the output files; ex. "no_mig"
+    compress: a Boolean, whether the log file is compressed
+    """
+    logname = "{0}.{1}.log.txt".format(outfile, model_name)
+    if compress:
+        return gzip.open("{}.gz".format(logname), 'at')
+    return open(logname, 'a')
+
+def read_trace(log_label):
+    """
+    Return the contents of a replicate log file, or an empty string if it does not exist.
+
+    Arguments
+    log_label: the label of the replicate log file ('[log_label].log.txt')
+    """
+    templogname = "{}.log.txt".format(log_label)
+    if not os.path.exists(templogname):
+        return ""
+    with open(templogname, 'r') as fh_templog:
+        return fh_templog.read()
+
+def write_log(outfile, model_name, rep_results, roundrep, log_label=None, trace=None, compress=False):
     """    
     Reproduce replicate log to bigger log file, because constantly re-written.
     
@@ -163,25 +257,1184 @@ def write_log(outfile, model_name, rep_results, roundrep):
     rep_results: the list returned by collect_results function: 
                  [roundnum_repnum, log-likelihood, AIC, chi^2 test stat, theta, parameter values]
     roundrep: name of replicate (ex, "Round_1_Replicate_10")
+    log_label: an optional label of the replicate log file, used in place of model_name
+    trace: an optional string of the evaluations of the replicate, written in place of the
+           contents of the replicate log file (an empty string writes no evaluations)
+    compress: a Boolean, whether the main log file is compressed (see open_log)
     """    
-    fh_log = open("{0}.{1}.log.txt".format(outfile, model_name), 'a')
+    fh_log = open_log(outfile, model_name, compress)
     fh_log.write("\n{}\n".format(roundrep))
-    templogname = "{}.log.txt".format(model_name)
-    try:
-        fh_templog = open(templogname, 'r')
-        for line in fh_templog:
-            fh_log.write(line)
-        fh_templog.close()
-    except IOError:
-        print("Nothing written to log file this replicate...")
+    if trace is not None:
+        fh_log.write(trace)
+    else:
+        templogname = "{}.log.txt".format(log_label if log_label is not None else model_name)
+        try:
+            fh_templog = open(templogname, 'r')
+            for line in fh_templog:
+                fh_log.write(line)
+            fh_templog.close()
+        except IOError:
+            print("Nothing written to log file this replicate...")
     fh_log.write("likelihood = {}\n".format(rep_results[1]))
     fh_log.write("theta = {}\n".format(rep_results[4]))
     fh_log.write("Optimized parameters = {}\n".format(rep_results[5]))
     fh_log.close()
 
+def write_header(outfile, model_name, param_labels=None):
+    """
+    Write the header line of the main results file for a model, return the file name.
+
+    Arguments
+    outfile: prefix for output naming
+    model_name: a label to slap on the output files; ex. "no_mig"
+    param_labels: a string, labels for parameters that will be written to the output file
+    """
+    outname = "{0}.{1}.optimized.txt".format(outfile, model_name)
+    with open(outname, 'a') as fh_out:
+        if param_labels:
+            fh_out.write("Model\tReplicate\tlog-likelihood\tAIC\tchi-squared\ttheta\toptimized_params({})\n".format(param_labels))
+        else:
+            fh_out.write("Model\tReplicate\tlog-likelihood\tAIC\tchi-squared\ttheta\toptimized_params\n")
+    return outname
+
+def write_result(outname, model_name, rep_results):
+    """
+    Append the results of a replicate to the main results file of a model (see write_header).
+
+    Arguments
+    outname: the main results file, as returned by write_header
+    model_name: a label to slap on the output files; ex. "no_mig"
+    rep_results: the list returned by collect_results function:
+                 [roundnum_repnum, log-likelihood, AIC, chi^2 test stat, theta, parameter values]
+    """
+    with open(outname, 'a') as fh_out:
+        #join the param values together with commas
+        easy_p = ",".join([str(numpy.around(x, 4)) for x in rep_results[5]])
+        fh_out.write("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\n".format(model_name, rep_results[0],
+                                                                      rep_results[1], rep_results[2],
+                                                                      rep_results[3], rep_results[4],
+                                                                      easy_p))
+
+def get_pool(workers):
+    """
+    Create a pool of worker processes, return None if workers is 1 or less.
+
+    The pool is created with the 'fork' start method, so that model functions defined
+    within a run script can be used by the workers without the script being re-run.
+
+    Arguments
+    workers: number of worker processes
+    """
+    if workers is None or int(workers) <= 1:
+        return None
+    import multiprocessing
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise ValueError("\n\nERROR: Using workers > 1 requires the 'fork' start method, "
+                             "which is not available on this platform.\n\n")
+    return multiprocessing.get_context("fork").Pool(int(workers))
+
+#peak memory (MB) of a single extrapolated evaluation, measured once per model, sample sizes and grid size
+memory_probes = {}
+
+def resident_memory():
+    """
+    Return a list with the current and peak resident memory (MB) of this process, read from
+    /proc/self/status, or None if it cannot be read (ex. on macOS).
+    """
+    memory = {}
+    try:
+        with open("/proc/self/status", 'r') as fh:
+            for line in fh:
+                if line.startswith("VmRSS:") or line.startswith("VmHWM:"):
+                    memory[line.split(":")[0]] = float(line.split()[1]) / 1024.
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+    if len(memory) < 2:
+        return None
+    return [memory["VmRSS"], memory["VmHWM"]]
+
+def measure_evaluation(func_exec, params, ns, pts):
+    """
+    Evaluate a model once and return the increase in resident memory (MB) of the process
+    at the peak of the evaluation. Called in the forked process of forked_memory.
+
+    Arguments
+    func_exec: a model function (with a single grid size) or extrapolating function
+    params: parameter values used for the evaluation
+    ns: sample sizes
+    pts: grid size, or list of three values for an extrapolating function
+    """
+    start = resident_memory()
+    if start is not None:
+        #reset the peak resident memory to the current value (Linux), so the peak is that of the evaluation
+        try:
+            with open("/proc/self/clear_refs", 'w') as fh:
+                fh.write("5")
+        except (IOError, OSError):
+            pass
+        start = resident_memory()
+        func_exec(params, ns, pts)
+        return max(0., resident_memory()[1] - start[0])
+    import resource
+    #ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024.**2 if sys.platform == "darwin" else 1024.
+    start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    func_exec(params, ns, pts)
+    return max(0., resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale - start)
+
+def forked_memory(func_exec, params, ns, pts, name="model"):
+    """
+    Return the peak memory (MB) of a single evaluation of a model. The evaluation is performed
+    in a forked process, as the workers are, and the increase in its resident memory is measured,
+    which includes the arrays allocated by the compiled integration code (unlike tracemalloc).
+
+    Arguments
+    func_exec: a model function (with a single grid size) or extrapolating function
+    params: parameter values used for the evaluation
+    ns: sample sizes
+    pts: grid size, or list of three values for an extrapolating function
+    name: the name of the model, used in the error message if the evaluation fails
+    """
+    if not hasattr(os, "fork"):
+        return measure_evaluation(func_exec, params, ns, pts)
+    read_end, write_end = os.pipe()
+    sys.stdout.flush()
+    pid = os.fork()
+    if pid == 0:
+        #probe process: report the measurement (or the error) to the parent and exit
+        os.close(read_end)
+        try:
+            message = "{}".format(measure_evaluation(func_exec, params, ns, pts))
+        except BaseException as err:
+            message = "error: {}".format(repr(err))
+        with os.fdopen(write_end, 'w') as fh:
+            fh.write(message)
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end, 'r') as fh:
+        message = fh.read()
+    os.waitpid(pid, 0)
+    try:
+        return float(message)
+    except ValueError:
+        raise ValueError("\n\nERROR: The memory probe evaluation of model {0} failed: {1}\n\n".format(name, message))
+
+def probe_memory(func, params, ns, pts):
+    """
+    Return the peak memory (MB) of a single extrapolated evaluation of a model, measured in a
+    forked process (see forked_memory). The probe is performed once for each model, sample sizes
+    and grid size, and the result is reused by later calls.
+
+    Arguments
+    func: the model function, ex. Models_3D.split_nomig
+    params: parameter values used for the probe evaluation
+    ns: sample sizes
+    pts: grid size for extrapolation, list of three values
+    """
+    key = (func.__module__, func.__name__, tuple(ns), tuple(pts))
+    if key not in memory_probes:
+        memory_probes[key] = forked_memory(dadi.Numerics.make_extrap_log_func(func), params, ns, pts,
+                                               name=func.__name__)
+    return memory_probes[key]
+
+def available_memory():
+    """
+    Return the memory currently available on this machine (MB), or None if it cannot be determined.
+    MemAvailable in /proc/meminfo is used where it exists (Linux), as it includes the page cache
+    that can be reclaimed, otherwise the free physical memory reported by sysconf.
+    """
+    try:
+        with open("/proc/meminfo", 'r') as fh:
+            for line in fh:
+                if line.startswith("MemAvailable:"):
+                    return float(line.split()[1]) / 1024.
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES") / 1024.**2
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def memory_workers(workers, memory_budget, probes):
+    """
+    Cap the number of worker processes so that the largest model evaluation of every worker
+    fits in a memory budget, return a list with the following elements:
+    [number of workers, a message describing the decision].
+
+    Arguments
+    workers: the requested number of worker processes
+    memory_budget: the memory budget in MB, or "auto" to use 80% of the memory currently available
+    probes: a list of [func, params, ns, pts] to measure (see probe_memory), the largest peak is used
+    """
+    if memory_budget == "auto":
+        available = available_memory()
+        if available is None:
+            return [int(workers), "Available memory could not be determined, using {} workers.".format(workers)]
+        memory_budget = 0.8 * available
+    peak = max([probe_memory(*probe) for probe in probes])
+    allowed = max(1, int(float(memory_budget) // max(peak, 1e-6)))
+    if allowed >= int(workers):
+        return [int(workers), "Peak memory per evaluation is {0:.1f} MB, {1} workers fit in the memory budget "
+                    "of {2:.0f} MB.".format(peak, workers, float(memory_budget))]
+    return [allowed, "Peak memory per evaluation is {0:.1f} MB, reducing workers from {1} to {2} to fit in the "
+                "memory budget of {3:.0f} MB.".format(peak, workers, allowed, float(memory_budget))]
+
+def log_likelihood_objective(log_params, fs, func, pts, lower_bound, upper_bound):
+    """
+    Objective function for optimization in log(params), return the negative log-likelihood
+    of the model. Parameters outside of the bounds, and models that cannot be evaluated or
+    return a log-likelihood of nan, receive the same penalty used by dadi (1e8). This function is defined at the
+    module level so it can be sent to worker processes.
+
+    Arguments
+    log_params: array of log(parameter values)
+    fs: spectrum object name
+    func: the model function, ex. Models_2D.no_mig
+    pts: grid size for extrapolation, list of three values
+    lower_bound: a list of lower bound values, or None to skip the bounds check
+    upper_bound: a list of upper bound values, or None to skip the bounds check
+    """
+    params = numpy.exp(log_params)
+    if lower_bound is not None and numpy.any(params < numpy.asarray(lower_bound)):
+        return 1e8
+    if upper_bound is not None and numpy.any(params > numpy.asarray(upper_bound)):
+        return 1e8
+    func_exec = dadi.Numerics.make_extrap_log_func(func)
+    try:
+        sim_model = func_exec(params, fs.sample_sizes, pts)
+        ll = dadi.Inference.ll_multinom(sim_model, fs)
+    except (AttributeError, ValueError):
+        #the model could not be evaluated at these parameters
+        return 1e8
+    if numpy.isnan(ll):
+        return 1e8
+    return -ll
+
+def log_likelihood_objective_star(args):
+    """
+    Call log_likelihood_objective with a tuple of arguments, for use with pool.map.
+
+    Arguments
+    args: tuple of (log_params, fs, func, pts, lower_bound, upper_bound)
+    """
+    return log_likelihood_objective(*args)
+
+def write_evaluation(fh_templog, count, ll, params):
+    """
+    Write one model evaluation to a replicate log file, in the format of the dadi
+    optimizers read by parse_trace.
+
+    Arguments
+    fh_templog: an open replicate log file
+    count: the number of the evaluation
+    ll: the log-likelihood of the evaluation
+    params: the parameter values of the evaluation
+    """
+    fh_templog.write("{0:<8d}, {1:<12g}, array([{2}])\n".format(count, ll,
+                                                                ", ".join([str(numpy.around(x, 6)) for x in params])))
+
+def log_likelihood_and_gradient(log_params, fs, func, pts, lower_bound, upper_bound, pool, epsilon=1e-3,
+                                    fh_templog=None, evals=None):
+    """
+    Return the negative log-likelihood of the model and its forward-difference gradient
+    with respect to log(params). The k+1 model evaluations of the stencil (the point itself
+    and one step along each parameter) are performed in parallel on a pool of workers, so
+    the wall time of a gradient is roughly that of a single model evaluation.
+
+    Arguments
+    log_params: array of log(parameter values)
+    fs: spectrum object name
+    func: the model function, ex. Models_2D.no_mig
+    pts: grid size for extrapolation, list of three values
+    lower_bound: a list of lower bound values, or None
+    upper_bound: a list of upper bound values, or None
+    pool: a pool of worker processes (see get_pool)
+    epsilon: step size in log(params), the same default used by dadi
+    fh_templog: an optional open replicate log file, every evaluation of the stencil is written to it
+    evals: an optional single-item list counting model evaluations
+    """
+    log_params = numpy.asarray(log_params, dtype=float)
+    stencil = [log_params]
+    for i in range(len(log_params)):
+        step = numpy.array(log_params)
+        step[i] += epsilon
+        stencil.append(step)
+    values = pool.map(log_likelihood_objective_star,
+                          [(x, fs, func, pts, lower_bound, upper_bound) for x in stencil])
+    count = evals[0] if evals is not None else 0
+    if evals is not None:
+        evals[0] += len(stencil)
+    if fh_templog is not None:
+        for i, (x, value) in enumerate(zip(stencil, values)):
+            write_evaluation(fh_templog, count + i + 1, -value, numpy.exp(x))
+        fh_templog.flush()
+    grad = (numpy.array(values[1:]) - values[0]) / epsilon
+    return values[0], grad
+
+def optimize_log_parallel_grad(params_perturbed, fs, func, pts, model_name, lower_bound, upper_bound,
+                                   maxiter, optimizer, pool, evals=None):
+    """
+    Optimize log(params) to fit model to data using the BFGS (optimizer="log") or
+    L-BFGS-B (optimizer="log_lbfgsb") method, with the finite-difference gradient
+    evaluated in parallel on a pool of workers. Return the optimized parameters.
+
+    The settings follow the dadi optimizers: BFGS penalizes parameters outside the bounds
+    and performs at most maxiter iterations, while L-BFGS-B searches within the bounds and
+    performs at most maxiter model evaluations (counted as k+1 evaluations per gradient).
+
+    Arguments
+    params_perturbed: list of starting parameter values
+    fs: spectrum object name
+    func: the model function, ex. Models_2D.no_mig
+    pts: grid size for extrapolation, list of three values
+    model_name: a label to slap on the output files; ex. "no_mig"
+    lower_bound: a list of lower bound values
+    upper_bound: a list of upper bound values
+    maxiter: the maxiter argument passed to the optimizer
+    optimizer: a string, either log or log_lbfgsb
+    pool: a pool of worker processes (see get_pool)
+    evals: an optional single-item list counting model evaluations
+    """
+    import scipy.optimize
+
+    x0 = numpy.log(params_perturbed)
+    #count the evaluations of this replicate if no counter is supplied, so the log lines are numbered
+    if evals is None:
+        evals = [0]
+    with open("{}.log.txt".format(model_name), 'w') as fh_templog:
+        if optimizer == "log":
+            result = scipy.optimize.minimize(log_likelihood_and_gradient, x0, jac=True, method="BFGS",
+                                                 args=(fs, func, pts, lower_bound, upper_bound, pool,
+                                                           1e-3, fh_templog, evals),
+                                                 options={"maxiter":maxiter, "gtol":1e-5})
+        else:
+            bounds = list(zip(numpy.log(lower_bound), numpy.log(upper_bound)))
+            result = scipy.optimize.minimize(log_likelihood_and_gradient, x0, jac=True, method="L-BFGS-B",
+                                                 bounds=bounds,
+                                                 args=(fs, func, pts, None, None, pool,
+                                                           1e-3, fh_templog, evals),
+                                                 options={"maxfun":max(1, int(maxiter) // (len(x0) + 1)),
+                                                              "gtol":1e-5})
+    return numpy.exp(result.x)
+
+def optimize_log_de(params_perturbed, fs, func, pts, model_name, lower_bound, upper_bound, maxiter,
+                        fold, pool=None, popsize=15):
+    """
+    Optimize log(params) to fit model to data using differential evolution, return a list
+    with the following elements: [optimized parameters, number of model evaluations].
+
+    The initial population is generated by perturbing the starting parameters by the fold
+    argument, with the starting parameters included as the first member. If a pool is
+    supplied, all candidates of a generation are evaluated in parallel. Every evaluation is
+    written to the replicate log file in the format of the dadi optimizers (see parse_trace),
+    followed by the best parameters of the generation.
+
+    Arguments
+    params_perturbed: list of starting parameter values
+    fs: spectrum object name
+    func: the model function, ex. Models_2D.no_mig
+    pts: grid size for extrapolation, list of three values
+    model_name: a label to slap on the output files; ex. "no_mig"
+    lower_bound: a list of lower bound values
+    upper_bound: a list of upper bound values
+    maxiter: the maximum number of generations
+    fold: the fold argument used to perturb the initial population
+    pool: an optional pool of worker processes (see get_pool)
+    popsize: multiplier for the population size (population = popsize * number of parameters)
+    """
+    import scipy.optimize
+
+    #log-space bounds, slightly inside the bounds as in dadi.Misc.perturb_params
+    bounds = [(numpy.log(1.01*l), numpy.log(0.99*u)) for l, u in zip(lower_bound, upper_bound)]
+    init = [params_perturbed]
+    for i in range(popsize * len(params_perturbed) - 1):
+        init.append(dadi.Misc.perturb_params(params_perturbed, fold=fold, upper_bound=upper_bound,
+                                                 lower_bound=lower_bound))
+    init = numpy.clip(numpy.log(init), [b[0] for b in bounds], [b[1] for b in bounds])
+
+    fh_templog = open("{}.log.txt".format(model_name), 'w')
+    count = [0]
+    def record(candidates, values):
+        for x, value in zip(candidates, values):
+            count[0] += 1
+            write_evaluation(fh_templog, count[0], -value, numpy.exp(x))
+
+    def callback(xk, convergence=None):
+        fh_templog.write("generation best = [{}]\n".format(", ".join([str(numpy.around(x, 6)) for x in numpy.exp(xk)])))
+
+    #the candidates are evaluated in the workers, so the evaluations are written here as their values return
+    if pool is not None:
+        objective = log_likelihood_objective
+        def workers(wrapped, candidates):
+            candidates = list(candidates)
+            values = list(pool.map(wrapped, candidates))
+            record(candidates, values)
+            return values
+    else:
+        def objective(x, *args):
+            value = log_likelihood_objective(x, *args)
+            record([x], [value])
+            return value
+        workers = 1
+
+    try:
+        result = scipy.optimize.differential_evolution(objective, bounds,
+                                                           args=(fs, func, pts, lower_bound, upper_bound),
+                                                           maxiter=int(maxiter), init=init, polish=False,
+                                                           callback=callback, seed=numpy.random.randint(2**31),
+                                                           updating="deferred" if pool is not None else "immediate",
+                                                           workers=workers)
+    finally:
+        fh_templog.close()
+    with open("{}.log.txt".format(model_name), 'a') as fh_templog:
+        fh_templog.write("{0:<8d}, {1:<12g}, generations = {2}\n".format(result.nfev, -result.fun, result.nit))
+    return [numpy.exp(result.x), result.nfev]
+
+def fit_gaussian_process(X, y, length_scales=(0.05, 0.1, 0.2, 0.4, 0.8), noise=1e-6):
+    """
+    Fit a Gaussian process with a squared exponential kernel to standardized targets,
+    selecting the length scale with the highest marginal likelihood. Return a dictionary
+    with the training points, the length scale, and the terms needed for prediction.
+
+    Arguments
+    X: array of training points (one row per point), scaled to the unit cube
+    y: array of standardized target values
+    length_scales: candidate length scales of the kernel
+    noise: value added to the diagonal of the kernel for numerical stability
+    """
+    d2 = numpy.sum((X[:, None, :] - X[None, :, :])**2, axis=2)
+    best = None
+    for ls in length_scales:
+        K = numpy.exp(-d2 / (2. * ls**2)) + noise * numpy.eye(len(X))
+        try:
+            L = numpy.linalg.cholesky(K)
+        except numpy.linalg.LinAlgError:
+            continue
+        alpha = numpy.linalg.solve(L.T, numpy.linalg.solve(L, y))
+        marginal = -0.5 * numpy.dot(y, alpha) - numpy.sum(numpy.log(numpy.diag(L)))
+        if best is None or marginal > best["marginal"]:
+            best = {"X": X, "length_scale": ls, "L": L, "alpha": alpha, "marginal": marginal}
+    return best
+
+def predict_gaussian_process(gp, Xnew):
+    """
+    Return the predicted mean and standard deviation of a fitted Gaussian process
+    (see fit_gaussian_process) at new points.
+
+    Arguments
+    gp: dictionary returned by fit_gaussian_process
+    Xnew: array of points (one row per point), scaled to the unit cube
+    """
+    d2 = numpy.sum((Xnew[:, None, :] - gp["X"][None, :, :])**2, axis=2)
+    Ks = numpy.exp(-d2 / (2. * gp["length_scale"]**2))
+    mean = numpy.dot(Ks, gp["alpha"])
+    v = numpy.linalg.solve(gp["L"], Ks.T)
+    var = numpy.clip(1. - numpy.sum(v**2, axis=0), 1e-12, None)
+    return mean, numpy.sqrt(var)
+
+def optimize_log_gp(params_perturbed, fs, func_exec, pts, model_name, lower_bound, upper_bound,
+                        maxiter, fold, history=None, max_points=300, candidates=2000):
+    """
+    Optimize log(params) to fit model to data using a Gaussian process surrogate of the
+    log-likelihood surface, return the best parameters found.
+
+    The surrogate is fit to all (log(params), log-likelihood) pairs evaluated so far for
+    this model on the same grid size, including those from earlier replicates and rounds
+    supplied in history. Each iteration proposes the point with the highest expected improvement
+    among random candidates (drawn within the bounds and mostly around the best point, using the
+    fold argument), and only this point is evaluated with the model. The maxiter argument is
+    therefore the number of model evaluations performed by the replicate. While the grid has
+    fewer evaluations that could be scored than parameters + 1, perturbed starting parameters
+    are evaluated instead.
+
+    Arguments
+    params_perturbed: list of starting parameter values
+    fs: spectrum object name
+    func_exec: extrapolating function of the model
+    pts: grid size for extrapolation, list of three values
+    model_name: a label to slap on the output files; ex. "no_mig"
+    lower_bound: a list of lower bound values
+    upper_bound: a list of upper bound values
+    maxiter: the number of model evaluations to perform
+    fold: the fold argument used to generate candidates around the best point
+    history: an optional dictionary of {tuple(pts): list of [log(params), log-likelihood] pairs},
+             which is updated with every evaluation made by this replicate
+    max_points: maximum number of points (the best scoring) used to fit the surrogate
+    candidates: number of random candidates scored by expected improvement per iteration
+    """
+    import scipy.special
+
+    #points evaluated on other grid sizes have different likelihoods, so each grid has its own list
+    if history is None:
+        history = {}
+    history = history.setdefault(tuple(pts), [])
+    lo = numpy.log(1.01 * numpy.asarray(lower_bound, dtype=float))
+    hi = numpy.log(0.99 * numpy.asarray(upper_bound, dtype=float))
+    k = len(params_perturbed)
+
+    fh_templog = open("{}.log.txt".format(model_name), 'w')
+    def evaluate(log_params):
+        try:
+            sim_model = func_exec(numpy.exp(log_params), fs.sample_sizes, pts)
+            ll = dadi.Inference.ll_multinom(sim_model, fs)
+        except (AttributeError, ValueError):
+            #the model could not be evaluated at these parameters
+            ll = numpy.nan
+        if numpy.isnan(ll):
+            ll = -1e8
+        history.append([numpy.array(log_params), ll])
+        fh_templog.write("{0:<8d}, {1:<12g}, array([{2}])\n".format(len(history), ll,
+                                                                    ", ".join([str(numpy.around(x, 6)) for x in numpy.exp(log_params)])))
+        fh_templog.flush()
+        return ll
+
+    try:
+        start = numpy.clip(numpy.log(params_perturbed), lo, hi)
+        evaluate(start)
+        done = 1
+        while done < int(maxiter):
+            finite = [h for h in history if h[1] > -1e8]
+            if len(finite) < k + 1:
+                #too few points to fit the surrogate (ex. the model failed everywhere so far)
+                p = dadi.Misc.perturb_params(params_perturbed, fold=fold, upper_bound=upper_bound, lower_bound=lower_bound)
+                evaluate(numpy.clip(numpy.log(p), lo, hi))
+                done += 1
+                continue
+
+            #fit the surrogate to the best points evaluated so far, in unit-cube coordinates
+            points = []
+            for h in sorted(finite, key=lambda h: h[1], reverse=True):
+                u = numpy.clip((h[0] - lo) / (hi - lo), 0., 1.)
+                #skip repeated points, which make the kernel matrix singular
+                if all([numpy.max(numpy.abs(u - q[0])) > 1e-6 for q in points]):
+                    points.append([u, h[1]])
+                if len(points) == int(max_points):
+                    break
+            X = numpy.array([q[0] for q in points])
+            #the surrogate is fit to log(1 - log-likelihood), which compresses poorly fitting regions
+            f = numpy.log(1. - numpy.array([q[1] for q in points]))
+            mu, sd = numpy.mean(f), numpy.std(f)
+            if sd == 0:
+                sd = 1.
+            gp = fit_gaussian_process(X, (f - mu) / sd)
+
+            #score random candidates, a quarter within the bounds and the rest around the best point
+            best_u = X[0]
+            spread = fold * numpy.log(2.) / (hi - lo)
+            n = int(candidates) // 4
+            cand = numpy.vstack([numpy.random.uniform(size=(n, k)),
+                                     best_u + numpy.random.normal(size=(int(candidates) - n, k)) * spread])
+            cand = numpy.clip(cand, 0., 1.)
+            if gp is None:
+                proposal = cand[0]
+            else:
+                mean, std = predict_gaussian_process(gp, cand)
+                improvement = (f[0] - mu) / sd - mean
+                z = improvement / std
+                ei = improvement * scipy.special.ndtr(z) + std * numpy.exp(-0.5 * z**2) / numpy.sqrt(2. * numpy.pi)
+                proposal = cand[numpy.argmax(ei)]
+            evaluate(lo + proposal * (hi - lo))
+            done += 1
+    finally:
+        fh_templog.close()
+
+    best = max(history[-done:], key=lambda h: h[1])
+    return numpy.exp(best[0])
+
+def parse_trace(text, param_number):
+    """
+    Parse the evaluations of a replicate, as written to the log files by the optimizers
+    (ex. '12      , -562.796    , array([ 1.47039    ,  2.62195    ,  3.13753    ])'), return
+    a list with the following elements: [array of evaluation numbers, array of log-likelihoods,
+    array of parameter values with one row per evaluation]. Other lines are ignored.
+
+    Arguments
+    text: the evaluations of the replicate
+    param_number: number of parameters in the model
+    """
+    evals, lls, params = [], [], []
+    for match in re.finditer(r"^\s*(\d+)\s*,\s*(\S+)\s*,\s*array\(\[(.*)\]\)", text, re.MULTILINE):
+        values = [float(x) for x in match.group(3).split(",") if x.strip()]
+        if len(values) != int(param_number):
+            continue
+        evals.append(int(match.group(1)))
+        lls.append(float(match.group(2)))
+        params.append(values)
+    return [numpy.array(evals, dtype=numpy.int64), numpy.array(lls, dtype=float),
+                numpy.array(params, dtype=float).reshape(len(params), int(param_number))]
+
+def trace_filename(outfile, model_name, round_num):
+    """
+    Return the name of the trace archive of a round: '[outfile].[model_name].traces.Round_[round_num].npz'
+
+    Arguments
+    outfile: prefix for output naming
+    model_name: a label to slap on the output files; ex. "no_mig"
+    round_num: the round number (starting at 1)
+    """
+    return "{0}.{1}.traces.Round_{2}.npz".format(outfile, model_name, round_num)
+
+def write_traces(outfile, model_name, round_num, traces, param_number):
+    """
+    Write the evaluations of all replicates of a round to a compressed NumPy archive
+    (see trace_filename). The archive stores one row per evaluation in the columns 'replicate'
+    (index into the 'replicates' array of names), 'eval', 'll' and 'params'.
+
+    Arguments
+    outfile: prefix for output naming
+    model_name: a label to slap on the output files; ex. "no_mig"
+    round_num: the round number (starting at 1)
+    traces: a list of [roundnum_repnum, evaluations of the replicate (see parse_trace)]
+    param_number: number of parameters in the model
+    """
+    names, index, evals, lls, params = [], [], [], [], []
+    for roundrep, text in traces:
+        rep_evals, rep_lls, rep_params = parse_trace(text, param_number)
+        index.append(numpy.full(len(rep_evals), len(names), dtype=numpy.int32))
+        names.append(roundrep)
+        evals.append(rep_evals)
+        lls.append(rep_lls)
+        params.append(rep_params)
+    outname = trace_filename(outfile, model_name, round_num)
+    #write to a temporary file first, so an interrupted run never leaves a partial archive
+    tmpname = "{}.tmp.npz".format(outname[:-4])
+    numpy.savez_compressed(tmpname, replicates=numpy.array(names, dtype=str),
+                               replicate=numpy.concatenate(index), eval=numpy.concatenate(evals),
+                               ll=numpy.concatenate(lls), params=numpy.concatenate(params))
+    os.replace(tmpname, outname)
+
+def Iter_Traces(outfile, model_name, rounds=None, replicates=None, columns=("eval", "ll", "params")):
+    """
+    Read the trace archives of a model one round at a time, and yield a list of
+    [roundnum_repnum, dictionary of {column: array}] for every replicate, so the traces of
+    a long run can be analyzed without loading every round into memory.
+
+    Arguments
+    outfile: prefix for output naming
+    model_name: a label to slap on the output files; ex. "no_mig"
+    rounds: an optional list of round numbers to read, default is every round found
+    replicates: an optional list of replicate names to read, ex. ["Round_2_Replicate_5"]
+    columns: the columns to read, any of "eval", "ll" and "params"
+    """
+    if rounds is None:
+        prefix = "{0}.{1}.traces.Round_".format(os.path.basename(outfile), model_name)
+        rounds = sorted([int(f[len(prefix):-4]) for f in os.listdir(os.path.dirname(os.path.abspath(outfile)))
+                             if f.startswith(prefix) and f.endswith(".npz") and f[len(prefix):-4].isdigit()])
+    for round_num in rounds:
+        #only the requested columns are decompressed
+        with numpy.load(trace_filename(outfile, model_name, round_num)) as archive:
+            names = archive["replicates"]
+            index = archive["replicate"]
+            data = dict([(c, archive[c]) for c in columns])
+        for i, name in enumerate(names):
+            if replicates is not None and name not in replicates:
+                continue
+            rows = index == i
+            yield [str(name), dict([(c, data[c][rows]) for c in columns])]
+
+def Read_Traces(outfile, model_name, rounds=None, replicates=None, columns=("eval", "ll", "params")):
+    """
+    Read the trace archives of a model, return a dictionary of {roundnum_repnum: {column: array}}.
+    The arguments are the same as for Iter_Traces.
+    """
+    return dict(Iter_Traces(outfile, model_name, rounds, replicates, columns))
+
+def optimize_replicate(params_perturbed, fs, func_exec, pts, model_name, lower_bound, upper_bound,
+                           maxiter, optimizer, func=None, fold=1, pool=None, evals=None, history=None,
+                           log_mode="full", trace=None):
+    """
+    Optimize a single replicate from perturbed starting parameters, return the optimized parameters.
+
+    Arguments
+    params_perturbed: list of starting parameter values
+    fs: spectrum object name
+    func_exec: extrapolating function of the model
+    pts: grid size for extrapolation, list of three values
+    model_name: a label to slap on the output files; ex. "no_mig"
+    lower_bound: a list of lower bound values
+    upper_bound: a list of upper bound values
+    maxiter: the maxiter argument passed to the optimizer
+    optimizer: a string, to select the optimizer (log, log_lbfgsb, log_fmin, log_powell, de, or gp)
+    func: the model function, required for the de optimizer
+    fold: the fold argument, used by the de optimizer to generate the initial population
+    pool: an optional pool of worker processes, used by the de optimizer and to evaluate
+          the gradients of the log and log_lbfgsb optimizers in parallel
+    evals: an optional single-item list counting model evaluations performed in the pool
+    history: an optional dictionary of {tuple(pts): list of [log(params), log-likelihood] pairs},
+             used and updated by the gp optimizer
+    log_mode: controls the evaluations written by the dadi optimizers (log, log_lbfgsb, log_fmin, log_powell):
+              "full" writes every evaluation to the replicate log file '[model_name].log.txt', "none" does
+              not record evaluations, and any other mode keeps the evaluations in memory
+    trace: an optional list, to which the evaluations kept in memory are appended as a string
+    """
+    dadi_optimizers = {"log":dadi.Inference.optimize_log, "log_lbfgsb":dadi.Inference.optimize_log_lbfgsb,
+                           "log_fmin":dadi.Inference.optimize_log_fmin, "log_powell":dadi.Inference.optimize_log_powell}
+    if optimizer == "de":
+        params_opt, nfev = optimize_log_de(params_perturbed, fs, func, pts, model_name, lower_bound,
+                                               upper_bound, maxiter, fold, pool=pool)
+        if evals is not None:
+            evals[0] += nfev
+    elif optimizer == "gp":
+        params_opt = optimize_log_gp(params_perturbed, fs, func_exec, pts, model_name, lower_bound,
+                                         upper_bound, maxiter, fold, history=history)
+    elif optimizer in ["log", "log_lbfgsb"] and pool is not None:
+        params_opt = optimize_log_parallel_grad(params_perturbed, fs, func, pts, model_name, lower_bound,
+                                                    upper_bound, maxiter, optimizer, pool, evals=evals)
+    elif optimizer in dadi_optimizers and log_mode == "full":
+        params_opt = dadi_optimizers[optimizer](params_perturbed, fs, func_exec, pts,
+                                                    lower_bound=lower_bound, upper_bound=upper_bound,
+                                                    verbose=1, maxiter=maxiter,
+                                                    output_file = "{}.log.txt".format(model_name))
+    elif optimizer in dadi_optimizers and log_mode == "none":
+        params_opt = dadi_optimizers[optimizer](params_perturbed, fs, func_exec, pts,
+                                                    lower_bound=lower_bound, upper_bound=upper_bound,
+                                                    verbose=0, maxiter=maxiter)
+    elif optimizer in dadi_optimizers:
+        #the optimizer writes its evaluations to the screen, which are kept in memory instead
+        #the evaluations are kept even if the replicate is stopped early (see DuplicateOptimum)
+        buffer = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(buffer):
+                params_opt = dadi_optimizers[optimizer](params_perturbed, fs, func_exec, pts,
+                                                            lower_bound=lower_bound, upper_bound=upper_bound,
+                                                            verbose=1, maxiter=maxiter)
+        finally:
+            if trace is not None:
+                trace.append(buffer.getvalue())
+    else:
+        raise ValueError("\n\nERROR: Unrecognized optimizer option: {}\nPlease select from: log, log_lbfgsb, log_fmin, log_powell, de, or gp.\n\n".format(optimizer))
+    return params_opt
+
+def run_round(fs, pts, outfile, model_name, func, round_num, rep_number, maxiter, fold, best_params,
+                  upper_bound, lower_bound, fs_folded, param_labels, optimizer, round_stats=None, workers=1,
+                  history=None, seeds=None, known_optima=None, duplicate_tol=None, rep_ids=None, seed=None,
+                  log_label=None, opt_pts=None, log_mode="full", quiet=False, compress_log=False,
+                  trace_archive=False):
+    """
+    Perform all replicates of one optimization round, return a list containing a sublist of
+    [roundnum_repnum, log-likelihood, AIC, chi^2 test stat, theta, parameter values] for every replicate.
+    Each replicate is written to the log file and main results file as soon as it is complete.
+
+    Arguments
+    fs: spectrum object name
+    pts: grid size for extrapolation, list of three values
+    outfile: prefix for output naming
+    model_name: a label to slap on the output files; ex. "no_mig"
+    func: the model function, ex. Models_2D.no_mig
+    round_num: the round number (starting at 1)
+    rep_number: number of replicates to perform in this round
+    maxiter: the maxiter argument passed to the optimizer
+    fold: the fold argument used to perturb the starting parameters
+    best_params: the parameters that are perturbed to start each replicate
+    upper_bound: a list of upper bound values
+    lower_bound: a list of lower bound values
+    fs_folded: a Boolean (True, False) for whether empirical spectrum is folded or not
+    param_labels: a string, labels for parameters that will be written to the output file
+    optimizer: a string, to select the optimizer
+    round_stats: an optional dictionary, which is updated with the number of model
+                 evaluations ("evals") and time in seconds ("seconds") spent in this round
+    workers: number of worker processes used to evaluate models in parallel
+    history: an optional dictionary of {tuple(pts): list of [log(params), log-likelihood] pairs}
+             for this model, which is updated with every evaluation of the gp optimizer
+    seeds: an optional list of parameter sets used in place of best_params, with the
+           replicates distributed evenly across them (see select_elites)
+    known_optima: an optional list of [roundnum_repnum, parameter values] for the optima found
+                  so far, which is updated with the optimum of every replicate
+    duplicate_tol: if supplied, a replicate is stopped as soon as the optimizer evaluates parameters
+                   whose log values are all within duplicate_tol of a known optimum, and is labelled
+                   as a duplicate. Applies to the log_fmin, log_powell, gp, and (without workers) log
+                   and log_lbfgsb optimizers.
+    rep_ids: an optional list of the replicate numbers to perform, used in place of 1 to rep_number
+    seed: an optional integer. If supplied, the random number generator is seeded for every replicate
+          from this value, the round number and the replicate number, so that a replicate starts from
+          the same parameters wherever it is run (see Optimize_Shard)
+    log_label: an optional label of the replicate log file, which is otherwise named after model_name
+    opt_pts: an optional (coarser) grid size used during the optimizations in place of pts. The
+             optimized parameters of every replicate are re-scored with pts.
+    log_mode: controls the evaluations written to the main log file (see Optimize_Routine): "full",
+              "buffered", "best", or "none"
+    quiet: a Boolean, if True the progress of each replicate is not printed to screen
+    compress_log: a Boolean, whether the main log file is compressed (see open_log)
+    trace_archive: a Boolean, if True the evaluations of all replicates of the round are written
+                   to a compressed archive (see write_traces)
+    """
+    outname = "{0}.{1}.optimized.txt".format(outfile, model_name)
+    if opt_pts is None:
+        opt_pts = pts
+
+    #optdict
+    optdict = {"log":"BFGS method", "log_lbfgsb":"L-BFGS-B method", "log_fmin":"Nelder-Mead method", "log_powell":"Powell's method",
+                   "de":"differential evolution", "gp":"Gaussian process surrogate"}
+
+    #create a pool of workers if requested, used for the duration of the round
+    pool = get_pool(workers)
+
+    #create an extrapolating function, and count the model evaluations it performs
+    func_exec_extrap = dadi.Numerics.make_extrap_log_func(func)
+    evals = [0]
+    if known_optima is None:
+        known_optima = []
+    check_duplicates = [False]
+    def func_exec(params, ns, pts):
+        #stop the replicate if it has reached an optimum that was already found
+        if check_duplicates[0] and known_optima:
+            log_params = numpy.log(numpy.abs(params))
+            for label, optimum in known_optima:
+                if numpy.max(numpy.abs(log_params - numpy.log(optimum))) <= duplicate_tol:
+                    raise DuplicateOptimum(numpy.array(params), label)
+        evals[0] += 1
+        return func_exec_extrap(params, ns, pts)
+
+    tb_round = datetime.now()
+    round_results = []
+
+    if rep_ids is None:
+        rep_ids = range(1, (rep_number+1) )
+    if log_label is None:
+        log_label = model_name
+
+    #evaluations of the replicates of this round, kept when only the best replicate is logged
+    round_traces = []
+    archive_traces = []
+
+    #perform an optimization routine for each rep number in this round number
+    for rep in rep_ids:
+        if not quiet:
+            print("\n\t\tRound {0} Replicate {1} of {2}:".format(round_num, rep, rep_number))
+
+        #keep track of start time for rep
+        tb_rep = datetime.now()
+
+        #seed the random number generator for this replicate
+        if seed is not None:
+            numpy.random.seed((int(seed) + 1000003 * int(round_num) + 7919 * int(rep)) % (2**32))
+
+        #perturb starting parameters, cycling through the seeds if several were supplied
+        if seeds:
+            start_params = seeds[(rep-1) % len(seeds)]
+            if not quiet:
+                print("\t\t\tStarting from optimum {0} of {1}".format((rep-1) % len(seeds) + 1, len(seeds)))
+        else:
+            start_params = best_params
+        params_perturbed = dadi.Misc.perturb_params(start_params, fold=fold,
+                                                        upper_bound=upper_bound, lower_bound=lower_bound)
+
+        if quiet:
+            pass
+        elif param_labels:
+            print("\n\t\t\tModel parameters = {}".format(param_labels))
+            print("\t\t\tStarting parameters = [{}]".format(", ".join([str(numpy.around(x, 6)) for x in params_perturbed])))
+        else:
+            print("\n\t\t\tStarting parameters = [{}]".format(", ".join([str(numpy.around(x, 6)) for x in params_perturbed])))
+
+        #remove the replicate log file of the previous replicate, so its evaluations are never read for this one
+        if os.path.exists("{}.log.txt".format(log_label)):
+            os.remove("{}.log.txt".format(log_label))
+
+        #optimize from perturbed parameters
+        roundrep = "Round_{0}_Replicate_{1}".format(round_num, rep)
+        check_duplicates[0] = duplicate_tol is not None
+        trace = []
+        try:
+            params_opt = optimize_replicate(params_perturbed, fs, func_exec, opt_pts, log_label,
+                                                lower_bound, upper_bound, maxiter, optimizer,
+                                                func=func, fold=fold, pool=pool, evals=evals, history=history,
+                                                log_mode="buffered" if (trace_archive and log_mode == "none") else log_mode,
+                                                trace=trace)
+        except DuplicateOptimum as duplicate:
+            if not quiet:
+                print("\t\t\tStopped early, reached the optimum of {}".format(duplicate.label))
+            params_opt = duplicate.params
+            roundrep = "{}_duplicate".format(roundrep)
+        check_duplicates[0] = False
+
+        if not quiet:
+            print("\t\t\tOptimized parameters =[{}]".format(", ".join([str(numpy.around(x, 6)) for x in params_opt])))
+            print("\t\t\tOptimized using: {0} ({1})\n".format(optimizer, optdict[optimizer]))
+
+        #get the evaluations of the replicate to write to the main log file (None reads the replicate log file)
+        if log_mode == "full":
+            trace_text = None
+        elif log_mode == "none":
+            trace_text = ""
+        elif trace:
+            trace_text = trace[0]
+        else:
+            #optimizers of the pipeline (de, gp, and parallel gradients) always write a replicate log file
+            trace_text = read_trace(log_label)
+
+        #simulate the model with the optimized parameters (using the full grid size)
+        sim_model = func_exec(params_opt, fs.sample_sizes, pts)
+
+        #collect results into a list using function above - [roundnum_repnum, log-likelihood, AIC, chi^2 test stat, theta, parameter values]
+        rep_results = collect_results(fs, sim_model, params_opt, roundrep, fs_folded, quiet=quiet)
+        if not roundrep.endswith("_duplicate"):
+            known_optima.append([roundrep, params_opt])
+
+        if trace_archive:
+            archive_traces.append([roundrep, trace_text if trace_text else (trace[0] if trace else read_trace(log_label))])
+
+        #reproduce replicate log to bigger log file, because constantly re-written
+        if log_mode == "best":
+            round_traces.append([roundrep, rep_results[1], trace_text])
+            trace_text = ""
+        write_log(outfile, model_name, rep_results, roundrep, log_label=log_label, trace=trace_text,
+                      compress=compress_log)
+
+        #append results from this sim to round list
+        round_results.append(rep_results)
+
+        #write all this info to our main results file
+        write_result(outname, model_name, rep_results)
+
+        #calculate elapsed time for replicate
+        tf_rep = datetime.now()
+        if not quiet:
+            print("\n\t\t\tReplicate time: {0} (H:M:S)\n".format(tf_rep - tb_rep))
+
+    if trace_archive:
+        write_traces(outfile, model_name, round_num, archive_traces, len(best_params))
+
+    #write the evaluations of the best replicate of the round
+    if round_traces:
+        best = max(round_traces, key=lambda x: float(x[1]))
+        with open_log(outfile, model_name, compress_log) as fh_log:
+            fh_log.write("\nEvaluations of the best replicate of round {0} ({1})\n{2}".format(round_num, best[0], best[2]))
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    if round_stats is not None:
+        round_stats["evals"] = evals[0]
+        round_stats["seconds"] = (datetime.now() - tb_round).total_seconds()
+
+    return round_results
+
+def run_replicate_task(args):
+    """
+    Perform a single optimization replicate in a worker process, return a list with the
+    following elements: [round number, results of the replicate (see collect_results)].
+    The replicate log is written to '[log_label].log.txt'.
+
+    Arguments
+    args: tuple of (fs, pts, func, round_num, rep, params_perturbed, maxiter, fold, upper_bound,
+          lower_bound, fs_folded, optimizer, log_label, seed, opt_pts, quiet), where opt_pts is the grid
+          size used during the optimization (the results are scored with pts)
+    """
+    (fs, pts, func, round_num, rep, params_perturbed, maxiter, fold, upper_bound, lower_bound,
+         fs_folded, optimizer, log_label, seed, opt_pts, quiet) = args
+    numpy.random.seed(seed)
+    func_exec = dadi.Numerics.make_extrap_log_func(func)
+    params_opt = optimize_replicate(params_perturbed, fs, func_exec, opt_pts, log_label, lower_bound, upper_bound,
+                                        maxiter, optimizer, func=func, fold=fold)
+    sim_model = func_exec(params_opt, fs.sample_sizes, pts)
+    roundrep = "Round_{0}_Replicate_{1}".format(round_num, rep)
+    return [round_num, collect_results(fs, sim_model, params_opt, roundrep, fs_folded, quiet=quiet)]
+
+def run_async_rounds(fs, pts, outfile, model_name, func, params, upper_bound, lower_bound, reps_list,
+                         maxiters_list, folds_list, fs_folded, param_labels, optimizer, workers, quorum,
+                         explore_pts=None, quiet=False, compress_log=False):
+    """
+    Perform all optimization rounds with replicates running on a pool of workers, where each
+    round is started once a quorum of the replicates of the previous round has finished, return
+    a list containing a sublist of [roundnum_repnum, log-likelihood, AIC, chi^2 test stat, theta,
+    parameter values] for every replicate, sorted by log-likelihood.
+
+    The replicates of the next round are perturbed from the best parameters found so far, and
+    are queued behind the unfinished replicates of the previous round, so workers are never left
+    waiting on the slowest replicate. Replicates finishing late are still written to the output
+    files and included in the results. Each replicate is written to the log file and main results
+    file as soon as it is complete.
+
+    Arguments
+    fs: spectrum object name
+    pts: grid size for extrapolation, list of three values
+    outfile: prefix for output naming
+    model_name: a label to slap on the output files; ex. "no_mig"
+    func: the model function, ex. Models_2D.no_mig
+    params: the starting parameters of the first round
+    upper_bound: a list of upper bound values
+    lower_bound: a list of lower bound values
+    reps_list: list of the number of replicates of each round
+    maxiters_list: list of the maxiter argument of each round
+    folds_list: list of the fold argument of each round
+    fs_folded: a Boolean (True, False) for whether empirical spectrum is folded or not
+    param_labels: a string, labels for parameters that will be written to the output file
+    optimizer: a string, to select the optimizer
+    workers: number of worker processes
+    quorum: fraction of the replicates of a round that must finish before the next round starts
+    explore_pts: an optional (coarser) grid size used to optimize the replicates of all rounds
+                 except the final round
+    quiet: a Boolean, if True the results of each replicate are not printed to screen by the workers
+    compress_log: a Boolean, whether the main log file is compressed (see open_log)
+    """
+    outname = "{0}.{1}.optimized.txt".format(outfile, model_name)
+    rounds = len(reps_list)
+    pool = get_pool(workers)
+    results_list = []
+    pending = []
+    finished = [0] * rounds
+
+    def start_round(r):
+        best_params = params if r == 0 else results_list[0][5]
+        print("\tBeginning Optimizations for Round {0} ({1} replicates):".format(r+1, reps_list[r]))
+        for rep in range(1, reps_list[r]+1):
+            params_perturbed = dadi.Misc.perturb_params(best_params, fold=folds_list[r],
+                                                            upper_bound=upper_bound, lower_bound=lower_bound)
+            log_label = "{0}.Round_{1}_Replicate_{2}".format(model_name, r+1, rep)
+            opt_pts = explore_pts if (explore_pts is not None and r < rounds-1) else pts
+            args = (fs, pts, func, r+1, rep, params_perturbed, maxiters_list[r], folds_list[r], upper_bound,
+                        lower_bound, fs_folded, optimizer, log_label, numpy.random.randint(2**31), opt_pts, quiet)
+            pending.append([log_label, pool.apply_async(run_replicate_task, (args,))])
+
+    current = 0
+    start_round(current)
+    while pending:
+        done = [p for p in pending if p[1].ready()]
+        if not done:
+            pending[0][1].wait(0.5)
+            continue
+        for log_label, result in done:
+            pending.remove([log_label, result])
+            round_num, rep_results = result.get()
+            finished[round_num-1] += 1
+            if not quiet:
+                print("\n\t\t{0} finished: Likelihood = {1:,}, AIC = {2:,}".format(rep_results[0], rep_results[1], rep_results[2]))
+
+            #reproduce replicate log to bigger log file, and write the results to our main results file
+            write_log(outfile, model_name, rep_results, rep_results[0], log_label=log_label, compress=compress_log)
+            if os.path.exists("{}.log.txt".format(log_label)):
+                os.remove("{}.log.txt".format(log_label))
+            write_result(outname, model_name, rep_results)
+            results_list.append(rep_results)
+            results_list.sort(key=lambda x: float(x[1]), reverse=True)
+
+        #start the next round once a quorum of the current round has finished
+        if current < rounds-1 and finished[current] >= numpy.ceil(quorum * reps_list[current]):
+            print("\n\t{0} of {1} replicates of round {2} finished.".format(finished[current], reps_list[current], current+1))
+            print_best(results_list)
+            current += 1
+            start_round(current)
+
+    pool.close()
+    pool.join()
+    return results_list
+
+def check_convergence(round_results, converge_top, converge_ll=0.5, converge_params=0.05):
+    """
+    Check whether the best replicates of a round agree, return a string describing the
+    agreement if they do, otherwise return None.
+
+    The round is considered converged if the top converge_top replicates have log-likelihoods
+    within converge_ll of each other, and each of their parameters are within converge_params
+    of each other in log space (0.05 is a difference of about 5%).
+
+    Arguments
+    round_results: list of replicate results of a round, as returned by run_round
+    converge_top: number of top replicates that must agree
+    converge_ll: maximum difference in log-likelihood among the top replicates
+    converge_params: maximum difference in log(parameter values) among the top replicates
+    """
+    if converge_top is None or len(round_results) < max(2, int(converge_top)):
+        return None
+    top = sorted(round_results, key=lambda x: float(x[1]), reverse=True)[:int(converge_top)]
+    lls = [float(x[1]) for x in top]
+    log_params = numpy.log(numpy.array([x[5] for x in top], dtype=float))
+    ll_range = max(lls) - min(lls)
+    param_range = numpy.max(numpy.max(log_params, axis=0) - numpy.min(log_params, axis=0))
+    if ll_range <= converge_ll and param_range <= converge_params:
+        return ("top {0} replicates agree within {1} log-likelihood units and {2} log-parameter units "
+                    "(tolerances {3} and {4})".format(len(top), numpy.around(ll_range, 4), numpy.around(param_range, 4),
+                                                          converge_ll, converge_params))
+    return None
+
+def adapt_schedule(round_results, fold, reps, ll_tol=1.0, low=0.2, high=0.5, scale=1.5):
+    """
+    Adjust the fold and replicate number planned for the next round, based on how
+    dispersed the replicates of the previous round were. Return a list with the following
+    elements: [fold, replicates, description of the adjustment].
+
+    The dispersion is measured as the fraction of replicates with a log-likelihood within
+    ll_tol of the best replicate of the round. If few replicates reached the best score
+    (fraction below low), the surface is still multimodal and the fold and replicates are
+    increased by the scale factor. If most replicates reached it (fraction of high or more),
+    the fold and replicates are decreased by the scale factor. Otherwise the planned values
+    are kept.
+
+    Arguments
+    round_results: list of replicate results of the previous round, as returned by run_round
+    fold: the fold planned for the next round
+    reps: the number of replicates planned for the next round
+    ll_tol: log-likelihood difference to the best replicate counted as reaching the best score
+    low: fraction of replicates below which the fold and replicates are increased
+    high: fraction of replicates above which the fold and replicates are decreased
+    scale: factor used to increase or decrease the fold and replicates
+    """
+    lls = numpy.array([float(x[1]) for x in round_results])
+    near = numpy.mean(lls >= numpy.max(lls) - ll_tol)
+    if near < low:
+        new_fold = float(numpy.around(fold * scale, 3))
+        new_reps = int(numpy.ceil(reps * scale))
+        change = "widened"
+    elif near >= high:
+        new_fold = float(numpy.around(fold / scale, 3))
+        new_reps = max(2, int(numpy.ceil(reps / scale)))
+        change = "narrowed"
+    else:
+        return [fold, reps, "{0:.0%} of replicates within {1} log-likelihood units of the best, "
+                    "keeping fold = {2} and replicates = {3}".format(near, ll_tol, fold, reps)]
+    return [new_fold, new_reps, "{0:.0%} of replicates within {1} log-likelihood units of the best, "
+                "{2} fold from {3} to {4} and replicates from {5} to {6}".format(near, ll_tol, change, fold,
+                                                                                  new_fold, reps, new_reps)]
+
+def select_elites(results_list, elite_k, elite_distance=0.5):
+    """
+    Select up to elite_k distinct optima from the replicates found so far, return a list
+    of their parameter values, starting with the best replicate.
+
+    Replicates are visited in order of log-likelihood, and a replicate is accepted as a new
+    optimum if each of its log(parameter values) differ by more than elite_distance from those
+    of an optimum already accepted (0.5 is a difference of about 65%). Replicates that converged
+    to the same basin are therefore represented once, by the best of them.
+
+    Arguments
+    results_list: list of replicate results, sorted by log-likelihood
+    elite_k: maximum number of distinct optima to return
+    elite_distance: minimum difference in log(parameter values) between distinct optima
+    """
+    elites = []
+    for rep_results in results_list:
+        log_params = numpy.log(numpy.array(rep_results[5], dtype=float))
+        if all([numpy.max(numpy.abs(log_params - numpy.log(e))) > elite_distance for e in elites]):
+            elites.append(rep_results[5])
+        if len(elites) == int(elite_k):
+            break
+    return elites
+
+def print_best(results_list):
+    """
+    Print a summary of the best replicate found so far.
+
+    Arguments
+    results_list: list of replicate results, sorted by log-likelihood
+    """
+    print("\n\t----------------------------------------------\n"
+              "\tBest replicate: {0}\n"
+              "\t\tLikelihood = {1:,}\n\t\tAIC = {2:,}\n"
+              "\t\tChi-Squared = {3:,}\n\t\tParams = [{4}]\n"
+              "\t----------------------------------------------\n\n".format(results_list[0][0],
+                                                                          results_list[0][1],
+                                                                          results_list[0][2],
+                                                                          results_list[0][3],
+                                                                          ", ".join([str(numpy.around(x, 4)) for x in results_list[0][5]])))
+
 def Optimize_Routine(fs, pts, outfile, model_name, func, rounds, param_number, fs_folded=True,
                          reps=None, maxiters=None, folds=None, in_params=None,
-                         in_upper=None, in_lower=None, param_labels=None, optimizer="log_fmin"):
+                         in_upper=None, in_lower=None, param_labels=None, optimizer="log_fmin", workers=1,
+                         converge_top=None, converge_ll=0.5, converge_params=0.05, adaptive=False,
+                         elite_k=1, elite_distance=0.5, duplicate_tol=None, quorum=None, explore_pts=None,
+                         memory_budget=None, log_mode="full", quiet=False, compress_log=False, trace_archive=False):
     """
     Main function for running dadi routine.
 
@@ -204,132 +1457,160 @@ def Optimize_Routine(fs, pts, outfile, model_name, func, rounds, param_number, f
     (14) in_lower: a list of lower bound values
     (15) param_labels: a string, labels for parameters that will be written to the output file to keep track of their order
     (16) optimizer: a string, to select the optimizer. Choices include: log (BFGS method), 
-                    log_lbfgsb (L-BFGS-B method), log_fmin (Nelder-Mead method, DEFAULT), and log_powell (Powell's method).
+                    log_lbfgsb (L-BFGS-B method), log_fmin (Nelder-Mead method, DEFAULT), log_powell (Powell's method),
+                    de (differential evolution, where maxiter is the number of generations), and gp
+                    (Gaussian process surrogate, where maxiter is the number of model evaluations).
+    (17) workers: number of worker processes used to evaluate models in parallel. With the de optimizer,
+                  the candidates of each generation are evaluated in parallel. With the log and log_lbfgsb
+                  optimizers, the finite-difference gradient is evaluated in parallel. Default is 1.
+    (18) converge_top: if supplied, the remaining rounds are skipped once the top converge_top replicates
+                       of a round agree in log-likelihood and parameter values. The reason is printed and
+                       written to the log file. Default is None (all rounds are performed).
+    (19) converge_ll: maximum difference in log-likelihood among the top replicates. Default is 0.5.
+    (20) converge_params: maximum difference in log(parameter values) among the top replicates. Default is 0.05.
+    (21) adaptive: a Boolean value (True or False). If True, the fold and replicates of each round after the
+                   first are adjusted from the planned values, based on the dispersion of the previous
+                   round's results (see adapt_schedule). Adjustments are printed and written to the log file.
+                   Default is False.
+    (22) elite_k: number of distinct optima used to start the replicates of each round after the first.
+                  The replicates are distributed evenly across the top elite_k distinct optima found so far
+                  (see select_elites). Default is 1 (only the best replicate is used).
+    (23) elite_distance: minimum difference in log(parameter values) between distinct optima. Default is 0.5.
+    (24) duplicate_tol: if supplied, a replicate is stopped as soon as the optimizer evaluates parameters whose
+                        log values are all within duplicate_tol of an optimum already found (ex. 0.01, about 1%).
+                        These replicates are labelled as Round_X_Replicate_Y_duplicate in the output files.
+                        Default is None (all replicates run to completion).
+    (25) quorum: if supplied (ex. 0.8, must be greater than 0 and at most 1), rounds are run asynchronously: the replicates are run on the pool of
+                 workers, and each round starts once this fraction of the replicates of the previous round has
+                 finished, perturbed from the best parameters found so far. Replicates finishing late are still
+                 included in the results. Requires workers > 1, and cannot be combined with converge_top, adaptive,
+                 elite_k or duplicate_tol. Default is None (each round waits for all replicates of the previous round).
+    (26) explore_pts: a coarser grid size (ex. [30,40,50]) used to optimize the replicates of all rounds except the
+                      final round, which uses pts. The optimized parameters of every replicate are re-scored with pts,
+                      so all results are comparable. Default is None (pts is used for all rounds).
+    (27) memory_budget: memory available to the workers in MB (ex. 8000), or "auto" to use 80% of the memory
+                        currently available. If supplied with workers > 1, the peak memory of a model evaluation
+                        is measured once and the number of workers is reduced to fit in the budget. Default is None.
+    (28) log_mode: controls the evaluations written to the log file. "full" writes every evaluation of every
+                   replicate to a replicate log file as it is performed, and copies it to the main log file
+                   (the original behaviour). "buffered" keeps the evaluations of the dadi optimizers in memory and
+                   writes them to the main log file once per replicate. "best" writes only the results of each
+                   replicate, plus the evaluations of the best replicate of each round. "none" writes only the
+                   results of each replicate. Default is "full".
+    (29) quiet: a Boolean, if True the progress of each replicate is not printed to screen, only the best
+                replicate after each round. Default is False.
+    (30) compress_log: a Boolean, if True the main log file is compressed with gzip and named
+                       '[outfile].[model_name].log.txt.gz'. Default is False.
+    (31) trace_archive: a Boolean, if True the evaluations (evaluation number, log-likelihood and parameter values)
+                        of all replicates of each round are also written to a compressed NumPy archive named
+                        '[outfile].[model_name].traces.Round_[round].npz', which can be read with Read_Traces
+                        or Iter_Traces. Can be combined with any log_mode. Default is False.
     """    
 
+    if log_mode not in ["full", "buffered", "best", "none"]:
+        raise ValueError("\n\nERROR: Unrecognized log_mode: '{}'.\nPlease select from: full, buffered, best, or none.\n\n".format(log_mode))
+    if quorum is not None:
+        if not 0 < float(quorum) <= 1:
+            raise ValueError("\n\nERROR: quorum must be greater than 0 and at most 1, not {}.\n\n".format(quorum))
+        if workers is None or int(workers) <= 1:
+            raise ValueError("\n\nERROR: Asynchronous rounds (quorum) require workers > 1.\n\n")
+        if converge_top is not None or adaptive or int(elite_k) > 1 or duplicate_tol is not None:
+            raise ValueError("\n\nERROR: Asynchronous rounds (quorum) cannot be combined with converge_top, "
+                                 "adaptive, elite_k or duplicate_tol.\n\n")
+        if log_mode != "full" or trace_archive:
+            raise ValueError("\n\nERROR: Asynchronous rounds (quorum) require log_mode = 'full' and no trace_archive.\n\n")
+
     #call function that determines if our params and bounds have been set or need to be generated for us
     params, upper_bound, lower_bound = parse_params(param_number, in_params, in_upper, in_lower)
 
     #call function that determines if our replicates, maxiter, and fold have been set or need to be generated for us
     reps_list, maxiters_list, folds_list = parse_opt_settings(rounds, reps, maxiters, folds)
+    #copy the replicate and fold lists, which are modified by the adaptive schedule
+    reps_list, folds_list = list(reps_list), list(folds_list)
     
     print("\n\n============================================================================"
               "\nModel {}\n============================================================================\n\n".format(model_name))
 
+    #reduce the number of workers if their model evaluations would not fit in the memory budget
+    if memory_budget is not None and workers is not None and int(workers) > 1:
+        workers, message = memory_workers(workers, memory_budget, [[func, params, fs.sample_sizes, pts]])
+        print("\t{}\n".format(message))
+        with open_log(outfile, model_name, compress_log) as fh_log:
+            fh_log.write("\n{}\n".format(message))
+
     #start keeping track of time it takes to complete optimizations for this model
     tbr = datetime.now()
 
-    #optimizer dict
-    optdict = {"log":"BFGS method", "log_lbfgsb":"L-BFGS-B method", "log_fmin":"Nelder-Mead method", "log_powell":"Powell's method"}
-    
     # We need an output file that will store all summary info for each replicate, across rounds
-    outname = "{0}.{1}.optimized.txt".format(outfile, model_name)
-    with open(outname, 'a') as fh_out:
-        if param_labels:
-            fh_out.write("Model\tReplicate\tlog-likelihood\tAIC\tchi-squared\ttheta\toptimized_params({})\n".format(param_labels))
-        else:
-            fh_out.write("Model\tReplicate\tlog-likelihood\tAIC\tchi-squared\ttheta\toptimized_params\n")
+    write_header(outfile, model_name, param_labels)
         
     #Create list to store sublists of [roundnum_repnum, log-likelihood, AIC, chi^2 test stat, theta, parameter values] for every replicate
     results_list = []
+
+    #Create dictionary to store the [log(params), log-likelihood] pairs evaluated for this model on each grid size, used by the gp optimizer
+    history = {}
+
+    #Create list to store [roundnum_repnum, parameter values] of the optima found, used to detect duplicates
+    known_optima = []
     
     #for every round, execute the assigned number of replicates with other round-defined args (maxiter, fold, best_params)
     rounds = int(rounds)
-    for r in range(rounds):
-        print("\tBeginning Optimizations for Round {}:".format(r+1))
+    if quorum is not None:
+        results_list = run_async_rounds(fs, pts, outfile, model_name, func, params, upper_bound, lower_bound,
+                                            reps_list, maxiters_list, folds_list, fs_folded, param_labels,
+                                            optimizer, workers, quorum, explore_pts=explore_pts, quiet=quiet,
+                                            compress_log=compress_log)
+        print_best(results_list)
+    else:
+        for r in range(rounds):
+            print("\tBeginning Optimizations for Round {}:".format(r+1))
        
-        #make sure first round params are assigned (either user input or auto generated)
-        if r == int(0):
-            best_params = params
-        #and that all subsequent rounds use the params from a previous best scoring replicate
-        else:
-            best_params = results_list[0][5]
-
-        #perform an optimization routine for each rep number in this round number
-        for rep in range(1, (reps_list[r]+1) ):
-            print("\n\t\tRound {0} Replicate {1} of {2}:".format(r+1, rep, (reps_list[r])))
-                
-            #keep track of start time for rep
-            tb_rep = datetime.now()
-            
-            #create an extrapolating function 
-            func_exec = dadi.Numerics.make_extrap_log_func(func)
-            
-            #perturb starting parameters
-            params_perturbed = dadi.Misc.perturb_params(best_params, fold=folds_list[r],
-                                                            upper_bound=upper_bound, lower_bound=lower_bound)
-            
-            if param_labels:
-                print("\n\t\t\tModel parameters = {}".format(param_labels))
-                print("\t\t\tStarting parameters = [{}]".format(", ".join([str(numpy.around(x, 6)) for x in params_perturbed])))
-            else:
-                print("\n\t\t\tStarting parameters = [{}]".format(", ".join([str(numpy.around(x, 6)) for x in params_perturbed])))
-                
-            #optimize from perturbed parameters
-            if optimizer == "log_fmin":
-                params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,
-                                                                  lower_bound=lower_bound, upper_bound=upper_bound,
-                                                                  verbose=1, maxiter=maxiters_list[r],
-                                                                  output_file = "{}.log.txt".format(model_name))
-            elif optimizer == "log":
-                params_opt = dadi.Inference.optimize_log(params_perturbed, fs, func_exec, pts,
-                                                                  lower_bound=lower_bound, upper_bound=upper_bound,
-                                                                  verbose=1, maxiter=maxiters_list[r],
-                                                                  output_file = "{}.log.txt".format(model_name))
-            elif optimizer == "log_lbfgsb":
-                params_opt = dadi.Inference.optimize_log_lbfgsb(params_perturbed, fs, func_exec, pts,
-                                                                  lower_bound=lower_bound, upper_bound=upper_bound,
-                                                                  verbose=1, maxiter=maxiters_list[r],
-                                                                  output_file = "{}.log.txt".format(model_name))
-            elif optimizer == "log_powell":
-                params_opt = dadi.Inference.optimize_log_powell(params_perturbed, fs, func_exec, pts,
-                                                                  lower_bound=lower_bound, upper_bound=upper_bound,
-                                                                  verbose=1, maxiter=maxiters_list[r],
-                                                                  output_file = "{}.log.txt".format(model_name))
+            #make sure first round params are assigned (either user input or auto generated)
+            if r == int(0):
+                best_params = params
+            #and that all subsequent rounds use the params from a previous best scoring replicate
             else:
-                 raise ValueError("\n\nERROR: Unrecognized optimizer option: {}\nPlease select from: log, log_lbfgsb, log_fmin, or log_powell.\n\n".format(optimizer))
-                 
-            print("\t\t\tOptimized parameters =[{}]".format(", ".join([str(numpy.around(x, 6)) for x in params_opt])))
-            print("\t\t\tOptimized using: {0} ({1})\n".format(optimizer, optdict[optimizer]))
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #collect results into a list using function above - [roundnum_repnum, log-likelihood, AIC, chi^2 test stat, theta, parameter values]
-            roundrep = "Round_{0}_Replicate_{1}".format(r+1, rep)
-            rep_results = collect_results(fs, sim_model, params_opt, roundrep, fs_folded)
-            
-            #reproduce replicate log to bigger log file, because constantly re-written
-            write_log(outfile, model_name, rep_results, roundrep)
-            
-            #append results from this sim to larger list
-            results_list.append(rep_results)
-            
-            #write all this info to our main results file
-            with open(outname, 'a') as fh_out:
-                #join the param values together with commas
-                easy_p = ",".join([str(numpy.around(x, 4)) for x in rep_results[5]])
-                fh_out.write("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\n".format(model_name, rep_results[0],
-                                                                              rep_results[1], rep_results[2],
-                                                                              rep_results[3], rep_results[4],
-                                                                              easy_p))
-
-            #calculate elapsed time for replicate
-            tf_rep = datetime.now()
-            print("\n\t\t\tReplicate time: {0} (H:M:S)\n".format(tf_rep - tb_rep))
+                best_params = results_list[0][5]
+
+            #optionally spread the replicates across several distinct optima found so far
+            seeds = None
+            if r > 0 and int(elite_k) > 1:
+                seeds = select_elites(results_list, elite_k, elite_distance)
+                print("\tSeeding round {0} from {1} distinct optima.\n".format(r+1, len(seeds)))
+
+            #adjust the fold and replicates of this round based on the results of the previous round
+            if adaptive and r > 0:
+                folds_list[r], reps_list[r], change = adapt_schedule(round_results, folds_list[r], reps_list[r])
+                message = "Adaptive schedule for round {0}: {1}.".format(r+1, change)
+                print("\t{}\n".format(message))
+                with open_log(outfile, model_name, compress_log) as fh_log:
+                    fh_log.write("\n{}\n".format(message))
 
-        #Now that this round is over, sort results in order of likelihood score
-        #we'll use the parameters from the best rep to start the next round as the loop continues
-        results_list.sort(key=lambda x: float(x[1]), reverse=True)
-        print("\n\t----------------------------------------------\n"
-                  "\tBest replicate: {0}\n"
-                  "\t\tLikelihood = {1:,}\n\t\tAIC = {2:,}\n"
-                  "\t\tChi-Squared = {3:,}\n\t\tParams = [{4}]\n"
-                  "\t----------------------------------------------\n\n".format(results_list[0][0],
-                                                                              results_list[0][1],
-                                                                              results_list[0][2],
-                                                                              results_list[0][3],
-                                                                              ", ".join([str(numpy.around(x, 4)) for x in results_list[0][5]])))
+            #perform an optimization routine for each rep number in this round number
+            round_results = run_round(fs, pts, outfile, model_name, func, r+1, reps_list[r], maxiters_list[r],
+                                          folds_list[r], best_params, upper_bound, lower_bound,
+                                          fs_folded, param_labels, optimizer, workers=workers,
+                                          history=history, seeds=seeds, known_optima=known_optima,
+                                          duplicate_tol=duplicate_tol,
+                                          opt_pts=explore_pts if r < rounds-1 else None,
+                                          log_mode=log_mode, quiet=quiet, compress_log=compress_log,
+                                          trace_archive=trace_archive)
+            results_list.extend(round_results)
+
+            #Now that this round is over, sort results in order of likelihood score
+            #we'll use the parameters from the best rep to start the next round as the loop continues
+            results_list.sort(key=lambda x: float(x[1]), reverse=True)
+            print_best(results_list)
+
+            #skip the remaining rounds if the best replicates of this round have converged
+            if r < rounds-1:
+                reason = check_convergence(round_results, converge_top, converge_ll, converge_params)
+                if reason is not None:
+                    message = "Converged after round {0} of {1}: {2}. Skipping the remaining rounds.".format(r+1, rounds, reason)
+                    print("\t{}\n".format(message))
+                    with open_log(outfile, model_name, compress_log) as fh_log:
+                        fh_log.write("\n{}\n".format(message))
+                    break
 
     #Now that all rounds are over, calculate elapsed time for the whole model
     tfr = datetime.now()
@@ -337,4 +1618,455 @@ def Optimize_Routine(fs, pts, outfile, model_name, func, rounds, param_number, f
               "============================================================================".format(model_name, tfr - tbr))
 
     #cleanup file
-    os.remove("{}.log.txt".format(model_name))
+    if os.path.exists("{}.log.txt".format(model_name)):
+        os.remove("{}.log.txt".format(model_name))
+
+def allocate_replicates(model_states, round_budget, round_index, reps_list, maxiters_list,
+                            ll_tol=0.5, aic_scale=10.0, max_scale=3):
+    """
+    Divide the CPU time budget of a round among the models of a set, return a dictionary of
+    {model_name: number of replicates}. Models that are still improving (best log-likelihood
+    changed by more than ll_tol in the previous round) receive a full share, because their AIC
+    is not yet a reliable measure of their fit. The share of models that have stopped improving
+    is halved, and weighted down further when they trail the best model on AIC. Each share is
+    then divided by the cost per replicate of the model.
+
+    Arguments
+    model_states: dictionary of {model_name: state dictionary} maintained by Optimize_Model_Set
+    round_budget: CPU seconds available for this round
+    round_index: index of the round to allocate (starting at 0)
+    reps_list: the replicate schedule used as the default allocation
+    maxiters_list: the maxiter schedule, used to scale replicate costs between rounds
+    ll_tol: minimum improvement in log-likelihood for a model to count as still improving
+    aic_scale: AIC difference at which the weight of a model that stopped improving is halved again
+    max_scale: maximum multiple of the default number of replicates a model can receive
+    """
+    best_aic = min([s["results"][0][2] for s in model_states.values() if s["results"]] or [0])
+    weights, costs = {}, {}
+    for name, state in model_states.items():
+        if state["results"]:
+            gap = max(0.0, float(state["results"][0][2]) - float(best_aic))
+        else:
+            gap = 0.0
+        if state["improvement"] is None or state["improvement"] > ll_tol:
+            weights[name] = 1.0
+        else:
+            weights[name] = 0.5 / (1.0 + gap / float(aic_scale))
+        costs[name] = replicate_cost(state, round_index, maxiters_list)
+
+    allocation = {}
+    total = sum(weights.values())
+    for name in model_states:
+        n = int(round_budget * weights[name] / total / costs[name])
+        allocation[name] = max(1, min(n, int(max_scale * reps_list[round_index])))
+    return allocation
+
+def replicate_cost(state, round_index, maxiters_list):
+    """
+    Estimate the cost in CPU seconds of one replicate of a model for a round.
+
+    The number of model evaluations per replicate is taken from the last completed round
+    and scaled by the ratio of maxiter values, or before any round is complete, estimated
+    as the Nelder-Mead starting simplex plus two evaluations per iteration.
+
+    Arguments
+    state: the state dictionary of the model, maintained by Optimize_Model_Set
+    round_index: index of the round to estimate (starting at 0)
+    maxiters_list: the maxiter schedule
+    """
+    if state["evals_per_rep"] is None:
+        evals = state["param_number"] + 1 + 2 * maxiters_list[round_index]
+    else:
+        evals = state["evals_per_rep"] * float(maxiters_list[round_index]) / maxiters_list[state["last_round"]]
+    return max(evals * state["eval_cost"], 1e-6)
+
+def race_models(model_states, active, race_threshold, race_sd=1.0, race_top=3, race_window=3.0):
+    """
+    Find the models of a set that clearly trail the best model on AIC, return a list of
+    [model_name, AIC difference, AIC standard deviation] for every model to drop. A model is
+    dropped when its best AIC trails the best AIC of all models by more than race_threshold
+    plus race_sd standard deviations of the AIC of its top replicates. Only the replicates
+    within race_window log-likelihood units of the best replicate of the model are used, so
+    the standard deviation measures the agreement of replicates that reached the same optimum
+    (at most a few AIC units), rather than the spread of unconverged replicates.
+
+    Arguments
+    model_states: dictionary of {model_name: state dictionary} maintained by Optimize_Model_Set
+    active: list of names of the models still receiving rounds
+    race_threshold: AIC difference beyond which a model is considered to be losing
+    race_sd: number of standard deviations of replicate AIC to add to the threshold
+    race_top: maximum number of top replicates used to calculate the standard deviation of AIC
+    race_window: log-likelihood difference to the best replicate of a model within which
+                 replicates are used to calculate the standard deviation of AIC
+    """
+    best_aic = min([float(model_states[name]["results"][0][2]) for name in active])
+    dropped = []
+    for name in active:
+        results = model_states[name]["results"]
+        aics = [float(x[2]) for x in results[:race_top]
+                    if float(results[0][1]) - float(x[1]) <= float(race_window)]
+        gap = aics[0] - best_aic
+        sd = numpy.std(aics)
+        if gap > float(race_threshold) + race_sd * sd:
+            dropped.append([name, numpy.around(gap, 2), numpy.around(sd, 2)])
+    return dropped
+
+def Optimize_Model_Set(fs, pts, outfile, model_set, rounds, fs_folded=True, reps=None, maxiters=None,
+                           folds=None, optimizer="log_fmin", budget_hours=None, eval_costs=None,
+                           race_threshold=None, race_sd=1.0, workers=1, memory_budget=None, aic_scale=10.0):
+    """
+    Run the optimization routine for a set of models, one round at a time across all models.
+    If a budget is supplied, after each round the replicates of the next round are allocated
+    among the models based on their measured cost per replicate, whether they are still
+    improving, and how far they trail the best model on AIC. The allocation of every round
+    is written to the file '[outfile].Model_Set_Schedule.txt'. Outputs for each model are
+    identical to those of Optimize_Routine.
+
+    Mandatory/Positional Arguments
+    (1) fs:  spectrum object name
+    (2) pts: grid size for extrapolation, list of three values
+    (3) outfile:  prefix for output naming
+    (4) model_set: a list of dictionaries, one per model, with the keys "model_name", "func" and
+                   "param_number", and optionally "in_params", "in_upper", "in_lower" and "param_labels".
+                   ex. [{"model_name":"no_mig", "func":Models_2D.no_mig, "param_number":3, "param_labels":"nu1, nu2, T"}]
+    (5) rounds: number of optimization rounds to perform
+
+    Optional Arguments
+    (6) fs_folded: A Boolean value (True or False) indicating whether the empirical fs is folded (True) or not (False). Default is True.
+    (7) reps: a list of integers controlling the number of replicates in each optimization round.
+              With a budget, these are the default allocations that are scaled up or down.
+    (8) maxiters: a list of integers controlling the maxiter argument in each optimization round
+    (9) folds: a list of integers controlling the fold argument when perturbing input parameter values
+    (10) optimizer: a string, to select the optimizer (see Optimize_Routine)
+    (11) budget_hours: total CPU-hours available for the whole model set (wall-clock hours multiplied by
+                       the number of workers). If None, every model receives the replicates in reps.
+    (12) eval_costs: an optional dictionary of {model_name: CPU seconds per extrapolated evaluation},
+                     for example from the extrap_time column of a benchmark file (see the Benchmarking
+                     directory, or Model_Builder.Estimate_Eval_Costs). If supplied, the first round is also
+                     allocated from the budget. The costs measured during each round replace these estimates.
+    (13) race_threshold: if supplied, racing is performed: after each round, models whose best AIC trails
+                         the best model by more than this AIC difference (plus race_sd standard deviations
+                         of the AIC of their top three replicates within 3 log-likelihood units of their best
+                         replicate) stop receiving rounds. The status of every
+                         model is written to the file '[outfile].Model_Set_Status.txt'.
+    (14) race_sd: number of standard deviations of replicate AIC added to race_threshold. Default is 1.
+    (15) workers: number of worker processes used to evaluate models in parallel (see Optimize_Routine)
+    (16) memory_budget: memory available to the workers in MB, or "auto" (see Optimize_Routine). The number
+                        of workers is fit to the model with the largest peak memory.
+    (17) aic_scale: with a budget, the AIC difference to the best model at which the share of a model that
+                    has stopped improving is halved. Models that are still improving are not penalized for
+                    their AIC. Default is 10.
+    """
+    reps_list, maxiters_list, folds_list = parse_opt_settings(rounds, reps, maxiters, folds)
+    rounds = int(rounds)
+
+    print("\n\n============================================================================"
+              "\nModel Set: {}\n============================================================================\n\n".format(
+                  ", ".join([m["model_name"] for m in model_set])))
+    tbs = datetime.now()
+
+    #set up the state of each model
+    model_states = {}
+    for m in model_set:
+        params, upper_bound, lower_bound = parse_params(m["param_number"], m.get("in_params"),
+                                                            m.get("in_upper"), m.get("in_lower"))
+        write_header(outfile, m["model_name"], m.get("param_labels"))
+        model_states[m["model_name"]] = {"func": m["func"], "param_number": int(m["param_number"]),
+                                             "param_labels": m.get("param_labels"), "params": params,
+                                             "upper_bound": upper_bound, "lower_bound": lower_bound,
+                                             "results": [], "improvement": None, "last_round": None,
+                                             "evals_per_rep": None, "eval_cost": None, "history": {}}
+        if eval_costs is not None and m["model_name"] in eval_costs:
+            model_states[m["model_name"]]["eval_cost"] = float(eval_costs[m["model_name"]])
+
+    #reduce the number of workers if their model evaluations would not fit in the memory budget
+    if memory_budget is not None and workers is not None and int(workers) > 1:
+        workers, message = memory_workers(workers, memory_budget, [[s["func"], s["params"], fs.sample_sizes, pts]
+                                                                       for s in model_states.values()])
+        print("\t{}\n".format(message))
+    #the budget and costs are in CPU seconds, and the workers evaluate models in parallel
+    cpus = max(1, int(workers or 1))
+
+    schedule_out = "{}.Model_Set_Schedule.txt".format(outfile)
+    with open(schedule_out, 'a') as fh_out:
+        fh_out.write("Round\tModel\treplicates\test_cpu_seconds_per_rep\tbest_AIC\tll_improvement\n")
+
+    if budget_hours is not None:
+        budget = float(budget_hours) * 3600.
+
+    #models that are still receiving rounds, and the status of those that are not
+    active = [m["model_name"] for m in model_set]
+    status = {}
+
+    for r in range(rounds):
+        #decide how many replicates each model receives this round
+        active_states = dict([(name, model_states[name]) for name in active])
+        costs_known = all([s["eval_cost"] is not None for s in active_states.values()])
+        if budget_hours is not None and costs_known:
+            remaining = budget - (datetime.now() - tbs).total_seconds() * cpus
+            round_budget = max(0.0, remaining) * reps_list[r] / float(sum(reps_list[r:]))
+            allocation = allocate_replicates(active_states, round_budget, r, reps_list, maxiters_list,
+                                                 aic_scale=aic_scale)
+        else:
+            allocation = dict([(name, reps_list[r]) for name in active])
+
+        for name in active:
+            state = model_states[name]
+            with open(schedule_out, 'a') as fh_out:
+                est = numpy.around(replicate_cost(state, r, maxiters_list), 2) if state["eval_cost"] is not None else "NA"
+                best = state["results"][0][2] if state["results"] else "NA"
+                improvement = numpy.around(state["improvement"], 2) if state["improvement"] is not None else "NA"
+                fh_out.write("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\n".format(r+1, name, allocation[name], est, best, improvement))
+
+            print("\n\n\tBeginning Optimizations for Model {0}, Round {1} ({2} replicates):".format(name, r+1, allocation[name]))
+            if r == 0:
+                best_params = state["params"]
+            else:
+                best_params = state["results"][0][5]
+            previous_ll = state["results"][0][1] if state["results"] else None
+
+            round_stats = {}
+            state["results"].extend(run_round(fs, pts, outfile, name, state["func"], r+1, allocation[name],
+                                                  maxiters_list[r], folds_list[r], best_params,
+                                                  state["upper_bound"], state["lower_bound"], fs_folded,
+                                                  state["param_labels"], optimizer, round_stats=round_stats,
+                                                  workers=workers, history=state["history"]))
+            state["results"].sort(key=lambda x: float(x[1]), reverse=True)
+            print_best(state["results"])
+
+            #update the cost model and convergence information of this model
+            if previous_ll is not None:
+                state["improvement"] = float(state["results"][0][1]) - float(previous_ll)
+            if round_stats["evals"] > 0:
+                state["evals_per_rep"] = round_stats["evals"] / float(allocation[name])
+                state["last_round"] = r
+                #measured costs replace the supplied estimates
+                state["eval_cost"] = round_stats["seconds"] * cpus / float(round_stats["evals"])
+
+        #stop giving rounds to models that are clearly losing
+        if race_threshold is not None and r < rounds-1:
+            for name, gap, sd in race_models(model_states, active, race_threshold, race_sd):
+                print("\n\tRacing: model {0} trails the best model by {1} AIC units (replicate AIC SD = {2}), "
+                          "no further rounds will be performed.".format(name, gap, sd))
+                status[name] = ["dropped", r+1, gap, sd]
+                active.remove(name)
+
+    if race_threshold is not None:
+        best_aic = min([float(model_states[name]["results"][0][2]) for name in model_states])
+        with open("{}.Model_Set_Status.txt".format(outfile), 'a') as fh_out:
+            fh_out.write("Model\tstatus\trounds_completed\tbest_AIC\tdelta_AIC\tAIC_SD_at_drop\n")
+            for name in [m["model_name"] for m in model_set]:
+                aic = float(model_states[name]["results"][0][2])
+                if name in status:
+                    fh_out.write("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\n".format(name, status[name][0], status[name][1],
+                                                                       aic, numpy.around(aic - best_aic, 2), status[name][3]))
+                else:
+                    fh_out.write("{0}\tcompleted\t{1}\t{2}\t{3}\tNA\n".format(name, rounds, aic,
+                                                                           numpy.around(aic - best_aic, 2)))
+
+    for name in model_states:
+        #cleanup file
+        if os.path.exists("{}.log.txt".format(name)):
+            os.remove("{}.log.txt".format(name))
+
+    print("\nAnalysis Time for Model Set: {0} (H:M:S)\n\n"
+              "============================================================================".format(datetime.now() - tbs))
+
+def shard_prefix(outfile, round_num, shard_index, shard_count):
+    """
+    Return the output prefix of a shard, ex. "V1.Round_2.Shard_3_of_50".
+
+    Arguments
+    outfile: prefix for output naming
+    round_num: the round number (starting at 1)
+    shard_index: the index of the shard (starting at 0)
+    shard_count: the total number of shards
+    """
+    return "{0}.Round_{1}.Shard_{2}_of_{3}".format(outfile, round_num, int(shard_index), int(shard_count))
+
+def read_results(filename):
+    """
+    Read a main results file ([outfile].[model_name].optimized.txt) or shard results file,
+    return a list containing a sublist of [roundnum_repnum, log-likelihood, AIC, chi^2 test stat,
+    theta, parameter values] for every replicate, sorted by log-likelihood.
+
+    Arguments
+    filename: the results file
+    """
+    results = []
+    with open(filename, 'r') as fh:
+        for line in fh:
+            l = line.strip().split('\t')
+            if line.startswith("Model") or len(l) != 7:
+                continue
+            results.append([l[1], float(l[2]), float(l[3]), float(l[4]), float(l[5]),
+                                [float(x) for x in l[6].split(',')]])
+    results.sort(key=lambda x: float(x[1]), reverse=True)
+    return results
+
+def Optimize_Shard(fs, pts, outfile, model_name, func, rounds, param_number, round_num, shard_index,
+                       shard_count, seed, fs_folded=True, reps=None, maxiters=None, folds=None, in_params=None,
+                       in_upper=None, in_lower=None, param_labels=None, optimizer="log_fmin", workers=1,
+                       memory_budget=None):
+    """
+    Perform one shard of the replicates of an optimization round, so that a round can be spread
+    across many nodes (ex. as a cluster array job) without a coordinator. Each of the shard_count
+    shards performs every shard_count-th replicate of the round, starting with replicate
+    shard_index+1. The replicates are seeded from the seed, round number and replicate number,
+    so a round gives identical results however it is sharded. The results are written to
+    '[outfile].Round_[round_num].Shard_[shard_index]_of_[shard_count].[model_name].optimized.txt'
+    (and log file), which are combined by Merge_Shards once all shards of the round are done.
+    When the shard is complete, the number of replicates it performed is written to the file
+    '[outfile].Round_[round_num].Shard_[shard_index]_of_[shard_count].[model_name].done', which
+    Merge_Shards requires. Running a shard again replaces its previous results and log file.
+
+    The first round starts from in_params (or the default parameters), and later rounds start
+    from the best parameters found in the previous rounds, which are read from the file
+    '[outfile].[model_name].Round_[round_num].start.txt' written by Merge_Shards.
+
+    Mandatory/Positional Arguments
+    (1) fs:  spectrum object name
+    (2) pts: grid size for extrapolation, list of three values
+    (3) outfile:  prefix for output naming
+    (4) model_name: a label to slap on the output files; ex. "no_mig"
+    (5) func: access the model function from a separate python model script, ex. Models_2D.no_mig
+    (6) rounds: number of optimization rounds to perform (used to set the default settings of each round)
+    (7) param_number: number of parameters in the model selected
+    (8) round_num: the round to perform (starting at 1)
+    (9) shard_index: index of this shard (starting at 0), ex. the array job index
+    (10) shard_count: total number of shards the round is divided into
+    (11) seed: an integer shared by all shards of the run
+
+    Optional Arguments
+    (12-20) fs_folded, reps, maxiters, folds, in_params, in_upper, in_lower, param_labels, optimizer:
+            see Optimize_Routine. The same values must be used for all shards and rounds.
+    (21) workers: number of worker processes used to evaluate models in parallel (see Optimize_Routine)
+    (22) memory_budget: memory available to the workers in MB, or "auto" (see Optimize_Routine)
+    """
+    params, upper_bound, lower_bound = parse_params(param_number, in_params, in_upper, in_lower)
+    reps_list, maxiters_list, folds_list = parse_opt_settings(rounds, reps, maxiters, folds)
+    round_num, shard_index, shard_count = int(round_num), int(shard_index), int(shard_count)
+    if round_num < 1 or round_num > int(rounds):
+        raise ValueError("Round number must be between 1 and the number of rounds: {}".format(rounds))
+    if shard_index < 0 or shard_index >= shard_count:
+        raise ValueError("Shard index must be between 0 and the number of shards minus one: {}".format(shard_count - 1))
+
+    if round_num == 1:
+        best_params = params
+    else:
+        start_name = "{0}.{1}.Round_{2}.start.txt".format(outfile, model_name, round_num)
+        if not os.path.exists(start_name):
+            raise ValueError("\n\nERROR: Starting parameters for round {0} not found ({1}).\n"
+                                 "Please run Merge_Shards for round {2} first.\n\n".format(round_num, start_name, round_num-1))
+        best_params = read_results(start_name)[0][5]
+
+    rep_ids = [rep for rep in range(1, reps_list[round_num-1]+1) if (rep-1) % shard_count == shard_index]
+    prefix = shard_prefix(outfile, round_num, shard_index, shard_count)
+
+    print("\n\n============================================================================"
+              "\nModel {0}, Round {1}, Shard {2} of {3} ({4} replicates)\n"
+              "============================================================================\n\n".format(model_name, round_num, shard_index,
+                                                                                                  shard_count, len(rep_ids)))
+
+    #reduce the number of workers if their model evaluations would not fit in the memory budget
+    if memory_budget is not None and workers is not None and int(workers) > 1:
+        workers, message = memory_workers(workers, memory_budget, [[func, params, fs.sample_sizes, pts]])
+        print("\t{}\n".format(message))
+    tbr = datetime.now()
+    #start from empty shard files, in case the shard was started before (ex. on a node that failed)
+    for name in ["optimized.txt", "log.txt", "done"]:
+        if os.path.exists("{0}.{1}.{2}".format(prefix, model_name, name)):
+            os.remove("{0}.{1}.{2}".format(prefix, model_name, name))
+    write_header(prefix, model_name, param_labels)
+    log_label = "{0}.{1}.replicate".format(prefix, model_name)
+    round_results = run_round(fs, pts, prefix, model_name, func, round_num, reps_list[round_num-1],
+                                  maxiters_list[round_num-1], folds_list[round_num-1], best_params, upper_bound,
+                                  lower_bound, fs_folded, param_labels, optimizer, workers=workers, rep_ids=rep_ids,
+                                  seed=seed, log_label=log_label)
+    if round_results:
+        round_results.sort(key=lambda x: float(x[1]), reverse=True)
+        print_best(round_results)
+
+    print("\nAnalysis Time for Shard: {0} (H:M:S)\n\n"
+              "============================================================================".format(datetime.now() - tbr))
+
+    #cleanup file
+    if os.path.exists("{}.log.txt".format(log_label)):
+        os.remove("{}.log.txt".format(log_label))
+
+    #mark the shard as complete, as its last step
+    with open("{0}.{1}.done".format(prefix, model_name), 'w') as fh_out:
+        fh_out.write("{}\n".format(len(rep_ids)))
+
+def Merge_Shards(outfile, model_name, round_num, shard_count, param_labels=None):
+    """
+    Combine the shard results of an optimization round (see Optimize_Shard) into the main
+    results file and log file of the model, select the best replicate found so far, and write its
+    parameters to '[outfile].[model_name].Round_[round_num+1].start.txt', from which the shards
+    of the next round start. Return the results of the best replicate.
+
+    All shards of the round must be complete: each shard must have written its completion file
+    (see Optimize_Shard), and its results file must contain all of its replicates. If the round
+    was already merged, the main results file is not modified, and the starting parameters are
+    written again.
+
+    Arguments
+    outfile: prefix for output naming
+    model_name: a label to slap on the output files; ex. "no_mig"
+    round_num: the round to merge (starting at 1)
+    shard_count: total number of shards the round was divided into
+    param_labels: a string, labels for parameters that will be written to the output file
+    """
+    round_num, shard_count = int(round_num), int(shard_count)
+    prefixes = [shard_prefix(outfile, round_num, i, shard_count) for i in range(shard_count)]
+    missing = []
+    for p in prefixes:
+        done_name = "{0}.{1}.done".format(p, model_name)
+        if not os.path.exists(done_name):
+            missing.append(p)
+            continue
+        with open(done_name, 'r') as fh:
+            expected = int(fh.read().strip())
+        if len(read_results("{0}.{1}.optimized.txt".format(p, model_name))) != expected:
+            missing.append(p)
+    if missing:
+        raise ValueError("\n\nERROR: Round {0} has {1} unfinished shards: {2}\n\n".format(round_num, len(missing),
+                                                                                            ", ".join(missing)))
+
+    outname = "{0}.{1}.optimized.txt".format(outfile, model_name)
+    merged = []
+    if os.path.exists(outname):
+        merged = read_results(outname)
+    else:
+        write_header(outfile, model_name, param_labels)
+
+    if any([r[0].startswith("Round_{}_".format(round_num)) for r in merged]):
+        print("\nRound {0} of model {1} was already merged.\n".format(round_num, model_name))
+    else:
+        round_rows, round_logs = [], []
+        for p in prefixes:
+            with open("{0}.{1}.optimized.txt".format(p, model_name), 'r') as fh:
+                round_rows.extend([line for line in fh if not line.startswith("Model") and line.strip()])
+            if os.path.exists("{0}.{1}.log.txt".format(p, model_name)):
+                with open("{0}.{1}.log.txt".format(p, model_name), 'r') as fh:
+                    round_logs.append(fh.read())
+        #order the replicates of the round by replicate number
+        round_rows.sort(key=lambda line: int(line.split('\t')[1].split('_')[3]))
+        with open(outname, 'a') as fh_out:
+            for line in round_rows:
+                fh_out.write(line)
+        with open("{0}.{1}.log.txt".format(outfile, model_name), 'a') as fh_log:
+            for log in round_logs:
+                fh_log.write(log)
+        print("\nMerged {0} replicates from {1} shards of round {2}.\n".format(len(round_rows), shard_count, round_num))
+
+    results_list = read_results(outname)
+    print_best(results_list)
+
+    start_name = "{0}.{1}.Round_{2}.start.txt".format(outfile, model_name, round_num+1)
+    best = results_list[0]
+    with open(start_name, 'w') as fh_out:
+        fh_out.write("Model\tReplicate\tlog-likelihood\tAIC\tchi-squared\ttheta\toptimized_params\n")
+        fh_out.write("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\n".format(model_name, best[0], best[1], best[2], best[3], best[4],
+                                                                  ",".join([str(x) for x in best[5]])))
+    return best
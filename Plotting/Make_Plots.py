@@ -238,3 +238,38 @@ For a 3D jsfs:
 #Plotting_Functions.Plot_3D(fs, model_fit, prefix, "something")
 
 
+#================================================================================
+# Plotting a set of models from a summary file
+#================================================================================
+
+'''
+ After running the 2D or 3D pipeline and summarizing the outputs with Summarize_Outputs.py,
+ the best replicate of every model in the summary file can be plotted at once, across a
+ pool of worker processes and without displaying the plots:
+ 	Batch_Plots(fs, pts, outfile, summary_file, module, fs_folded=True, models=None, formats=None,
+                    vmin_val=None, workers=1, cache=True)
+
+ Mandatory Arguments =
+	fs:  spectrum object name
+	pts: grid size for extrapolation, list of three values
+ 	outfile: prefix for output naming
+ 	summary_file: a summary file written by Summarize_Outputs.py, ex. Results_Summary_Short.txt
+ 	module: the imported model script containing the models, ex. Models_2D
+
+ Optional Arguments =
+     fs_folded: A Boolean value indicating whether the empirical fs is folded (True) or not (False)
+     models: a list of model names, to only plot a subset of the models in the summary file
+     formats: a list of file formats for the plots, ex. ["pdf", "png"]
+     vmin_val: Minimum values plotted for sfs (2D and 3D spectra only)
+     workers: number of worker processes
+     cache: whether to save the model spectra and reuse them when the same parameters are plotted again
+'''
+
+#**************
+#Unhash the commands below to plot all the models of a summary file, make sure to
+#change the path to the Two_Population_Pipeline directory and to the summary file
+
+#import sys
+#sys.path.append("/Users/portik/Documents/GitHub/dadi_pipeline/Two_Population_Pipeline")
+#import Models_2D
+#Plotting_Functions.Batch_Plots(fs, pts, prefix, "Results_Summary_Short.txt", Models_2D, formats=["pdf", "png"], workers=4)
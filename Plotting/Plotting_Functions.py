@@ -3,8 +3,6 @@ import os
 import numpy
 import dadi
 from datetime import datetime
-import pylab
-import matplotlib.pyplot as plt
 
 def collect_results(fs, sim_model, params_opt, roundrep, fs_folded):
     #--------------------------------------------------------------------------------------
@@ -93,6 +91,8 @@ def Fit_Empirical(fs, pts, outfile, model_name, func, in_params, fs_folded=True)
 
 def Plot_1D(fs, model_fit, outfile, model_name):
     #Routine for plotting with 1D sfs
+    #pylab is imported here so that fitting models does not require loading matplotlib
+    import pylab
     print('\nPlotting {0}_{1}.pdf'.format(outfile, model_name))
     print("\nNOTE - CLOSE PLOT TO ADVANCE.")
     outname = '{0}_{1}.pdf'.format(outfile, model_name)
@@ -103,6 +103,7 @@ def Plot_1D(fs, model_fit, outfile, model_name):
     
 def Plot_2D(fs, model_fit, outfile, model_name, vmin_val=None):
     #Routine for plotting with 2D jsfs
+    import pylab
     print('\nPlotting {0}_{1}.pdf'.format(outfile, model_name))
     print("\nNOTE - CLOSE PLOT TO ADVANCE.")
     outname = '{0}_{1}.pdf'.format(outfile, model_name)
@@ -116,6 +117,7 @@ def Plot_2D(fs, model_fit, outfile, model_name, vmin_val=None):
     
 def Plot_3D(fs, model_fit, outfile, model_name, vmin_val=None):
     #Routine for plotting with 3D jsfs
+    import pylab
     print('\nPlotting {0}_{1}.pdf'.format(outfile, model_name))
     print("\nNOTE - CLOSE PLOT TO ADVANCE.")
     outname = '{0}_{1}.pdf'.format(outfile, model_name)
@@ -126,3 +128,148 @@ def Plot_3D(fs, model_fit, outfile, model_name, vmin_val=None):
     else:
         dadi.Plotting.plot_3d_comp_multinom(model_fit, fs, resid_range = 3, vmin = vmin_val)
     fig.savefig(outname)
+
+def read_summary(summary_file, models=None):
+    #--------------------------------------------------------------------------------------
+    # Read a summary file written by Summarize_Outputs.py (Results_Summary_Short.txt or
+    # Results_Summary_Extended.txt), return a list of [model_name, replicate, parameter values]
+    # for the best replicate (lowest AIC) of each model, in the order of the file.
+    
+    # Arguments
+    # summary_file: the summary file
+    # models: an optional list of model names, to only plot a subset of the models
+    #--------------------------------------------------------------------------------------
+    best = []
+    seen = []
+    with open(summary_file, 'r') as fh:
+        for line in fh:
+            if line.startswith("Model"):
+                continue
+            l = line.strip().split('\t')
+            if len(l) != 7 or l[0] in seen:
+                continue
+            if models is not None and l[0] not in models:
+                continue
+            seen.append(l[0])
+            best.append([l[0], l[1], [float(x) for x in l[6].split(',')]])
+    return best
+
+def get_model_fit(fs, pts, outfile, model_name, func, in_params, cache=True):
+    #--------------------------------------------------------------------------------------
+    # Return the model spectrum for a set of parameters. If cache is True, the model spectrum
+    # is saved to '[outfile]_[model_name].model.fs' along with the parameters and grid size used,
+    # and is read from this file (instead of being simulated again) when these are unchanged.
+    
+    # Arguments
+    # fs:  spectrum object name
+    # pts: grid size for extrapolation, list of three values
+    # outfile: prefix for output naming
+    # model_name: a label to help name the output files; ex. "sym_mig"
+    # func: the model function, ex. Models_2D.sym_mig
+    # in_params: the previously optimized parameters to use
+    # cache: a Boolean, whether to read and write the cached model spectrum
+    #--------------------------------------------------------------------------------------
+    cachename = '{0}_{1}.model.fs'.format(outfile, model_name)
+    settings = "params={0} pts={1} ns={2}".format(",".join([str(p) for p in in_params]),
+                                                      ",".join([str(p) for p in pts]),
+                                                      ",".join([str(n) for n in fs.sample_sizes]))
+    if cache and os.path.exists(cachename):
+        model_fit, comments = dadi.Spectrum.from_file(cachename, return_comments=True)
+        if settings in comments:
+            return model_fit
+    func_exec = dadi.Numerics.make_extrap_log_func(func)
+    model_fit = func_exec(in_params, fs.sample_sizes, pts)
+    if cache:
+        model_fit.to_file(cachename, comment_lines=[settings])
+    return model_fit
+
+def batch_plot_task(args):
+    #--------------------------------------------------------------------------------------
+    # Fit and plot a single model in a worker process, return a list of
+    # [model_name, replicate, log-likelihood, theta, chi-squared, list of output file names].
+    
+    # Arguments
+    # args: tuple of (fs, pts, outfile, model_name, func, replicate, in_params, fs_folded,
+    #       formats, vmin_val, cache)
+    #--------------------------------------------------------------------------------------
+    fs, pts, outfile, model_name, func, replicate, in_params, fs_folded, formats, vmin_val, cache = args
+    import pylab
+    model_fit = get_model_fit(fs, pts, outfile, model_name, func, in_params, cache=cache)
+    theta = dadi.Inference.optimal_sfs_scaling(model_fit, fs)
+    ll = dadi.Inference.ll_multinom(model_fit, fs)
+    scaled_model = model_fit*theta
+    if fs_folded is True:
+        scaled_model = scaled_model.fold()
+    chi2 = numpy.sum((scaled_model - fs)**2/scaled_model)
+
+    fig = pylab.figure(figsize=(7,7))
+    if fs.ndim == 1:
+        dadi.Plotting.plot_1d_comp_multinom(model_fit, fs, show=False)
+    elif fs.ndim == 2:
+        dadi.Plotting.plot_2d_comp_multinom(model_fit, fs, vmin=vmin_val, resid_range=3, show=False)
+    else:
+        dadi.Plotting.plot_3d_comp_multinom(model_fit, fs, vmin=vmin_val, resid_range=3, show=False)
+    outnames = []
+    for fmt in formats:
+        outname = '{0}_{1}.{2}'.format(outfile, model_name, fmt)
+        fig.savefig(outname)
+        outnames.append(outname)
+    pylab.close(fig)
+    return [model_name, replicate, numpy.around(ll, 2), numpy.around(theta, 2), numpy.around(chi2, 2), outnames]
+
+def Batch_Plots(fs, pts, outfile, summary_file, module, fs_folded=True, models=None, formats=None,
+                    vmin_val=None, workers=1, cache=True):
+    #--------------------------------------------------------------------------------------
+    # Plot the empirical and model spectra (with residuals) for the best replicate of every
+    # model in a summary file, without displaying the plots. The models are fit and plotted
+    # across a pool of worker processes, and the fits are written to a tab-delimited file
+    # named '[outfile].Batch_Plots.txt'.
+    
+    # Mandatory Arguments =
+    #(1) fs:  spectrum object name
+    #(2) pts: grid size for extrapolation, list of three values
+    #(3) outfile:  prefix for output naming
+    #(4) summary_file: a summary file written by Summarize_Outputs.py, ex. Results_Summary_Short.txt
+    #(5) module: the imported model script containing the models, ex. Models_2D
+    
+    # Optional Arguments =
+    #(6) fs_folded: A Boolean value indicating whether the empirical fs is folded (True) or not (False). Default is True.
+    #(7) models: a list of model names, to only plot a subset of the models in the summary file
+    #(8) formats: a list of file formats for the plots, ex. ["pdf", "png"]. Default is ["pdf"].
+    #(9) vmin_val: Minimum values plotted for sfs (2D and 3D spectra only)
+    #(10) workers: number of worker processes. Default is 1.
+    #(11) cache: A Boolean, whether to save the model spectra and reuse them when the same
+    #            parameters are plotted again. Default is True.
+    #--------------------------------------------------------------------------------------
+    #use a non-interactive backend, so plots are written to files without being displayed
+    import matplotlib
+    matplotlib.use("Agg")
+
+    if formats is None:
+        formats = ["pdf"]
+    best = read_summary(summary_file, models)
+    missing = [b[0] for b in best if not hasattr(module, b[0])]
+    if missing:
+        raise ValueError("\n\nERROR: Models not found in {0}: {1}\n\n".format(module.__name__, ", ".join(missing)))
+    print("============================================================================\n"
+              "Plotting {0} models from {1}...\n"
+              "============================================================================\n".format(len(best), summary_file))
+
+    tasks = [(fs, pts, outfile, model_name, getattr(module, model_name), replicate, in_params, fs_folded,
+                  formats, vmin_val, cache) for model_name, replicate, in_params in best]
+    if workers is None or int(workers) <= 1:
+        fits = [batch_plot_task(t) for t in tasks]
+    else:
+        import multiprocessing
+        pool = multiprocessing.get_context("fork").Pool(int(workers))
+        fits = pool.map(batch_plot_task, tasks)
+        pool.close()
+        pool.join()
+
+    outname = "{0}.Batch_Plots.txt".format(outfile)
+    with open(outname, 'a') as fh_out:
+        fh_out.write("Model\tReplicate\tlog-likelihood\ttheta\tchi-squared\tplots\n")
+        for fit in fits:
+            print("\t{0}: Likelihood = {1:,}, plotted to {2}".format(fit[0], fit[2], ", ".join(fit[5])))
+            fh_out.write("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\n".format(fit[0], fit[1], fit[2], fit[3], fit[4], ",".join(fit[5])))
+    return fits
@@ -82,7 +82,6 @@ import sys
 import os
 import numpy
 import dadi
-import pylab
 from datetime import datetime
 import Optimize_Functions
 import Models_2D
@@ -0,0 +1,212 @@
+'''
+-------------------------
+Written for Python 3.7
+Python modules required:
+-Numpy
+-Scipy
+-dadi
+-------------------------
+
+Daniel Portik
+daniel.portik@gmail.com
+https://github.com/dportik
+Updated October 2020
+'''
+import os
+import gzip
+import numpy
+import dadi
+from scipy import sparse
+
+def read_loci(snps_file, locus_column="Gene"):
+    """
+    Parse a SNPs input file (the same format used by dadi.Misc.make_data_dict), and return
+    a list with the following elements: [list of locus names in the order they first appear,
+    dictionary of locus name to a data dictionary of the SNPs of that locus].
+
+    The SNPs of each locus are stored in a data dictionary formatted as in
+    dadi.Misc.make_data_dict, so they can be used with the dadi functions directly.
+
+    Arguments
+    snps_file: path to the SNPs input file (can be gzipped)
+    locus_column: the header of the column identifying the locus of each SNP (ex. "Gene")
+    """
+    if os.path.splitext(snps_file)[1] == '.gz':
+        fh = gzip.open(snps_file, 'rt')
+    else:
+        fh = open(snps_file, 'r')
+
+    #skip to the header
+    header = fh.readline()
+    while header.startswith('#'):
+        header = fh.readline()
+    header = header.split()
+    allele2_index = header.index('Allele2')
+    pops = header[3:allele2_index]
+    if locus_column not in header[allele2_index+1+len(pops):]:
+        raise ValueError("\n\nERROR: The locus column '{0}' was not found in the header of {1}.\n\n".format(locus_column, snps_file))
+    locus_index = header.index(locus_column)
+
+    loci = []
+    locus_dicts = {}
+    for snp_ii, line in enumerate(fh):
+        if line.startswith('#') or not line.strip():
+            continue
+        spl = line.split()
+        calls_dict = {}
+        for ii, pop in enumerate(pops):
+            calls_dict[pop] = int(spl[3+ii]), int(spl[allele2_index+1+ii])
+        locus = spl[locus_index]
+        if locus not in locus_dicts:
+            loci.append(locus)
+            locus_dicts[locus] = {}
+        locus_dicts[locus]["SNP_{}".format(snp_ii)] = {'context': spl[0].upper(),
+                                                        'outgroup_context': spl[1].upper(),
+                                                        'outgroup_allele': spl[1][1].upper(),
+                                                        'segregating': (spl[2].upper(), spl[allele2_index].upper()),
+                                                        'calls': calls_dict}
+    fh.close()
+    return [loci, locus_dicts]
+
+def Index_Loci(snps_file, pop_ids, projections, polarized=True, locus_column="Gene"):
+    """
+    Index the SNPs of a SNPs input file by locus, return a dictionary that is used by the
+    other functions of this script to build spectra from resampled loci.
+
+    Every SNP configuration (the calls and derived calls in each population) is projected
+    only once, and each locus is stored as the counts of the configurations it contains.
+    The spectrum of any set of locus weights is then the weighted sum of the configuration
+    counts multiplied by the projected configurations, so resampled spectra are produced
+    without parsing the SNPs file or projecting the SNPs again.
+
+    Arguments
+    snps_file: path to the SNPs input file (can be gzipped)
+    pop_ids: list of population labels matching the columns of the SNPs file, ex. ["North", "South"]
+    projections: list of projection sizes, in alleles, ex. [16,32]
+    polarized: a Boolean, if False the spectra are folded (as in dadi.Spectrum.from_data_dict)
+    locus_column: the header of the column identifying the locus of each SNP (ex. "Gene")
+    """
+    loci, locus_dicts = read_loci(snps_file, locus_column)
+
+    #count the SNP configurations of every locus, numbering each configuration once
+    config_ids = {}
+    rows, cols, vals = [], [], []
+    for row, locus in enumerate(loci):
+        count_dict = dadi.Misc.count_data_dict(locus_dicts[locus], pop_ids)
+        for config, count in count_dict.items():
+            if polarized and not config[2]:
+                continue
+            #the polarization of a SNP only matters for excluding it, so it is dropped from the key
+            key = config[:2]
+            if key not in config_ids:
+                config_ids[key] = len(config_ids)
+            rows.append(row)
+            cols.append(config_ids[key])
+            vals.append(count)
+    counts = sparse.csr_matrix((vals, (rows, cols)), shape=(len(loci), len(config_ids)))
+
+    #project every configuration once, folding them if required (folding is a linear operation)
+    shape = tuple(numpy.array(projections) + 1)
+    configs = numpy.zeros((len(config_ids), int(numpy.prod(shape))))
+    for key, column in config_ids.items():
+        fs = dadi.Spectrum._from_count_dict({(key[0], key[1], True): 1}, projections,
+                                                polarized=polarized, pop_ids=pop_ids)
+        configs[column] = numpy.ma.filled(fs, 0).ravel()
+
+    template = dadi.Spectrum(numpy.zeros(shape), pop_ids=pop_ids)
+    if not polarized:
+        template = template.fold()
+
+    index = {"loci": loci,
+             "counts": counts,
+             "configs": configs,
+             "shape": shape,
+             "mask": numpy.ma.getmaskarray(template),
+             "pop_ids": pop_ids,
+             "folded": not polarized}
+    return index
+
+def bootstrap_weights(nloci, nboot, seed=None):
+    """
+    Return an array of shape (nboot, nloci) with the number of times each locus is drawn
+    in each bootstrap replicate (loci are resampled with replacement).
+
+    Arguments
+    nloci: number of loci
+    nboot: number of bootstrap replicates
+    seed: an optional seed for the random number generator, for reproducible replicates
+    """
+    rng = numpy.random.RandomState(seed)
+    return rng.multinomial(nloci, [1.0/nloci]*nloci, size=nboot)
+
+def Index_Array(index, weights=None):
+    """
+    Return an array of shape (n, spectrum shape) with the spectrum data of each row of
+    locus weights. Masked entries of the spectra are set to zero.
+
+    Arguments
+    index: the dictionary returned by Index_Loci
+    weights: an array of shape (n, number of loci), or None to return the empirical spectrum
+    """
+    if weights is None:
+        weights = numpy.ones((1, len(index["loci"])))
+    weights = numpy.atleast_2d(weights)
+    arrays = numpy.asarray(sparse.csr_matrix(weights).dot(index["counts"]).todense()).dot(index["configs"])
+    arrays = arrays.reshape((weights.shape[0],) + index["shape"])
+    arrays[:, index["mask"]] = 0
+    return arrays
+
+def Index_Spectrum(index, data):
+    """
+    Return a dadi spectrum object from an array of spectrum data, with the mask,
+    folding and population labels of the indexed data.
+
+    Arguments
+    index: the dictionary returned by Index_Loci
+    data: an array with the shape of the spectrum, ex. a row returned by Index_Array
+    """
+    return dadi.Spectrum(data, mask=index["mask"].copy(), data_folded=index["folded"],
+                             pop_ids=index["pop_ids"])
+
+def Bootstrap_Array(index, nboot, seed=None):
+    """
+    Return an array of shape (nboot, spectrum shape) with the data of nboot spectra
+    obtained by resampling the loci with replacement.
+
+    Arguments
+    index: the dictionary returned by Index_Loci
+    nboot: number of bootstrap replicates
+    seed: an optional seed for the random number generator, for reproducible replicates
+    """
+    weights = bootstrap_weights(len(index["loci"]), nboot, seed)
+    return Index_Array(index, weights)
+
+def Bootstrap_Spectra(index, nboot, seed=None):
+    """
+    Return a list of nboot dadi spectrum objects obtained by resampling the loci with
+    replacement, for use with the uncertainty and goodness of fit functions.
+
+    Arguments
+    index: the dictionary returned by Index_Loci
+    nboot: number of bootstrap replicates
+    seed: an optional seed for the random number generator, for reproducible replicates
+    """
+    return [Index_Spectrum(index, data) for data in Bootstrap_Array(index, nboot, seed)]
+
+def Write_Bootstraps(index, nboot, outfile, seed=None):
+    """
+    Write nboot spectra obtained by resampling the loci with replacement to files
+    named '[outfile].Bootstrap_[number].fs', return the list of file names.
+
+    Arguments
+    index: the dictionary returned by Index_Loci
+    nboot: number of bootstrap replicates
+    outfile: prefix for output naming
+    seed: an optional seed for the random number generator, for reproducible replicates
+    """
+    filenames = []
+    for i, fs in enumerate(Bootstrap_Spectra(index, nboot, seed)):
+        filename = "{0}.Bootstrap_{1}.fs".format(outfile, i+1)
+        fs.to_file(filename)
+        filenames.append(filename)
+    return filenames
@@ -0,0 +1,95 @@
+'''
+Usage: python Make_Bootstraps.py
+
+The purpose of this script is to generate bootstrapped frequency spectra by resampling
+the loci of a SNPs input file with replacement. The SNPs file is parsed once, and the
+SNPs are indexed by the locus (Gene) column. Every SNP configuration is projected only
+once, so hundreds of bootstrapped spectra can be produced per second without rebuilding
+data dictionaries for each replicate. The bootstrapped spectra are used to estimate
+parameter uncertainties (Godambe Information Matrix), and can be written to files.
+
+The sections with #************** must be edited.
+
+This script must be in the same working directory as Bootstrap_Functions.py.
+
+Outputs:
+ A frequency spectrum file is written for each bootstrap replicate, named
+ [outfile].Bootstrap_[number].fs, in the format of dadi.Spectrum.to_file. These
+ can be read with dadi.Spectrum.from_file.
+
+Notes/Caveats:
+ Loci are resampled as a whole, so SNPs of the same locus (which are linked) are kept
+ together in every bootstrap replicate. The locus column must therefore identify the
+ loci of the data (ex. the RAD locus or the gene), not the individual SNPs.
+
+-------------------------
+Written for Python 3.7
+Python modules required:
+-Numpy
+-Scipy
+-dadi
+-------------------------
+
+Daniel Portik
+daniel.portik@gmail.com
+https://github.com/dportik
+Updated October 2020
+'''
+import Bootstrap_Functions
+
+#===========================================================================
+# Index the SNPs of the input file by locus
+#===========================================================================
+'''
+ We will use a function from the Bootstrap_Functions.py script:
+
+ Index_Loci(snps_file, pop_ids, projections, polarized=True, locus_column="Gene")
+
+   Mandatory Arguments =
+    snps_file: path to the SNPs input file (can be gzipped)
+    pop_ids: list of population labels matching the columns of the SNPs file
+    projections: list of projection sizes, in alleles
+
+   Optional Arguments =
+    polarized: a Boolean, if False the spectra are folded (as in dadi.Spectrum.from_data_dict)
+    locus_column: the header of the column identifying the locus of each SNP
+'''
+
+#**************
+snps = "/Users/portik/Documents/GitHub/dadi_pipeline/Example_Data/dadi_2pops_North_South_snps.txt"
+
+#**************
+#pop_ids is a list which should match the populations headers of your SNPs file columns
+pop_ids=["North", "South"]
+
+#**************
+#projection sizes, in ALLELES not individuals
+proj = [16,32]
+
+#[polarized = False] creates folded spectrum objects
+index = Bootstrap_Functions.Index_Loci(snps, pop_ids, proj, polarized=False, locus_column="Gene")
+
+#================================================================================
+# Generate and write the bootstrapped spectra
+#================================================================================
+'''
+ Write_Bootstraps(index, nboot, outfile, seed=None)
+
+   Mandatory Arguments =
+    index: the dictionary returned by Index_Loci
+    nboot: number of bootstrap replicates
+    outfile: prefix for output naming
+
+   Optional Arguments =
+    seed: a seed for the random number generator, for reproducible replicates
+
+ The spectra can also be kept in memory with Bootstrap_Spectra(index, nboot, seed=None),
+ which returns a list of dadi spectrum objects, or Bootstrap_Array(index, nboot, seed=None),
+ which returns the spectrum data of all replicates as a single array.
+'''
+
+#**************
+nboot = 100
+seed = 12345
+
+Bootstrap_Functions.Write_Bootstraps(index, nboot, "North_South", seed=seed)
@@ -0,0 +1,408 @@
+'''
+-------------------------
+Written for Python 3.7
+Python modules required:
+-Numpy
+-Scipy
+-dadi
+-------------------------
+
+Daniel Portik
+daniel.portik@gmail.com
+https://github.com/dportik
+Updated October 2020
+'''
+import os
+import numpy
+import dadi
+from dadi import Godambe, Inference
+from datetime import datetime
+
+#model spectra evaluated at the finite-difference points, shared by the empirical
+#spectrum and all bootstrap replicates (and by later calls with the same model)
+model_cache = {}
+
+def read_best_params(filename):
+    """
+    Read a main results file ([outfile].[model_name].optimized.txt), return a list with
+    the following elements: [name of the best replicate, log-likelihood, optimized parameters,
+    list of parameter labels (empty if none were written to the file)].
+
+    Arguments
+    filename: the results file
+    """
+    labels = []
+    results = []
+    with open(filename, 'r') as fh:
+        for line in fh:
+            l = line.strip().split('\t')
+            if line.startswith("Model"):
+                header = l[-1]
+                if "(" in header:
+                    labels = [x.strip() for x in header[header.index("(")+1:header.rindex(")")].split(",") if x.strip()]
+                continue
+            if len(l) != 7:
+                continue
+            results.append([l[1], float(l[2]), [float(x) for x in l[6].split(',')]])
+    if not results:
+        raise ValueError("\n\nERROR: No replicates were found in {}.\n\n".format(filename))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results[0] + [labels]
+
+def cache_key(func, params, ns, pts):
+    """
+    Return the key of a model evaluation in the model cache.
+
+    Arguments
+    func: the model function
+    params: parameter values
+    ns: sample sizes
+    pts: grid size for extrapolation, list of three values
+    """
+    return (func.__module__, func.__name__, tuple(params), tuple(ns), tuple(pts))
+
+def evaluate_model(args):
+    """
+    Evaluate the extrapolated model spectrum in a worker process, return a list of
+    [parameter values, model spectrum], with None in place of the model spectrum if the
+    model could not be evaluated at these parameters.
+
+    Arguments
+    args: tuple of (func, params, ns, pts)
+    """
+    func, params, ns, pts = args
+    func_exec = dadi.Numerics.make_extrap_log_func(func)
+    try:
+        return [params, func_exec(numpy.array(params), ns, pts)]
+    except (AttributeError, ValueError):
+        #the model could not be evaluated at these parameters (ex. a negative population size)
+        return [params, None]
+
+def fill_cache(func, param_sets, ns, pts, workers=1):
+    """
+    Evaluate the model at every set of parameters not already in the model cache,
+    spreading the evaluations across a pool of worker processes. Return the list of
+    parameter sets at which the model could not be evaluated, which are not cached.
+
+    Arguments
+    func: the model function
+    param_sets: a list of tuples of parameter values
+    ns: sample sizes
+    pts: grid size for extrapolation, list of three values
+    workers: number of worker processes
+    """
+    todo = []
+    queued = set()
+    for params in param_sets:
+        if cache_key(func, params, ns, pts) not in model_cache and params not in queued:
+            todo.append(params)
+            queued.add(params)
+    if not todo:
+        return []
+    print("\tEvaluating the model at {0} points with {1} worker(s).".format(len(todo), max(1, int(workers))))
+    tasks = [(func, params, ns, pts) for params in todo]
+    if workers is None or int(workers) <= 1:
+        evaluated = [evaluate_model(t) for t in tasks]
+    else:
+        import multiprocessing
+        pool = multiprocessing.get_context("fork").Pool(int(workers))
+        try:
+            evaluated = pool.map(evaluate_model, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    failed = []
+    for params, model in evaluated:
+        if model is None:
+            failed.append(params)
+        else:
+            model_cache[cache_key(func, params, ns, pts)] = model
+    return failed
+
+def godambe_matrices(func, pts, p0, data, all_boot=None, eps=0.01, log=False, multinom=True, workers=1):
+    """
+    Calculate the Godambe Information Matrix (or only the Hessian if no bootstrap spectra
+    are supplied) as in dadi.Godambe.get_godambe, return a list with the following elements:
+    [GIM (or None), Hessian, parameter values including theta if multinom is True].
+
+    The finite-difference points of the Hessian and of the gradients of the bootstrap
+    spectra are the same as those of dadi. They are collected first, and the model is
+    evaluated once at each point across a pool of workers. The Hessian and gradients are
+    then calculated from the cached model spectra.
+
+    Arguments
+    func: the model function (not extrapolated), ex. Models_2D.sym_mig
+    pts: grid size for extrapolation, list of three values
+    p0: best-fit parameters of the model
+    data: the empirical spectrum
+    all_boot: a list of bootstrapped spectra, or None to only calculate the Hessian
+    eps: fractional step size of the finite differences
+    log: a Boolean, if True derivatives are taken with respect to the log of the parameters
+    multinom: a Boolean, if True theta is included as a final parameter (as in dadi)
+    workers: number of worker processes
+    """
+    ns = data.sample_sizes
+    p0 = [float(x) for x in p0]
+    if fill_cache(func, [tuple(p0)], ns, pts, workers=1):
+        raise ValueError("\n\nERROR: The model could not be evaluated at the parameters {}.\n\n".format(p0))
+    if multinom:
+        theta = Inference.optimal_sfs_scaling(model_cache[cache_key(func, p0, ns, pts)], data)
+        q0 = p0 + [theta]
+    else:
+        q0 = p0
+
+    def split(q):
+        if log:
+            q = numpy.exp(q)
+        if multinom:
+            return tuple(q[:-1]), q[-1]
+        return tuple(q), 1.0
+
+    #record the finite-difference points required, without evaluating the model
+    points = []
+    def record(q, *args):
+        points.append(split(q)[0])
+        return 0.0
+    start = numpy.log(q0) if log else numpy.array(q0)
+    Godambe.get_hess(record, start, eps)
+    if all_boot:
+        Godambe.get_grad(record, start, eps)
+    failed = fill_cache(func, points, ns, pts, workers)
+    if failed:
+        raise ValueError("\n\nERROR: The model could not be evaluated at {0} finite-difference point(s), ex. {1}.\n"
+                             "Try a smaller eps.\n\n".format(len(failed), list(failed[0])))
+
+    def loglik(q, spectrum):
+        params, scale = split(q)
+        return Inference.ll(scale*model_cache[cache_key(func, params, ns, pts)], spectrum)
+
+    hess = -Godambe.get_hess(loglik, start, eps, args=[data])
+    if not all_boot:
+        return [None, hess, q0]
+    J = numpy.zeros((len(q0), len(q0)))
+    for boot in all_boot:
+        grad = Godambe.get_grad(loglik, start, eps, args=[dadi.Spectrum(boot)])
+        J = J + numpy.outer(grad, grad)
+    J = J/len(all_boot)
+    godambe = numpy.dot(numpy.dot(hess, numpy.linalg.inv(J)), hess)
+    return [godambe, hess, q0]
+
+def Estimate_Uncertainty(fs, pts, outfile, model_name, func, all_boot=None, method="GIM", results_file=None,
+                             params=None, param_labels=None, log=False, eps=0.01, workers=1):
+    """
+    Estimate the uncertainties of the best optimized parameters of a model using the Godambe
+    Information Matrix (GIM, with bootstrapped spectra) or the Fisher Information Matrix (FIM),
+    and write the standard errors next to the parameter values in a tab-delimited file named
+    '[outfile].[model_name].uncertainty.txt'. Return a list of the standard errors, with
+    the standard error of theta last.
+
+    The model evaluations required by the finite differences are performed in parallel with
+    workers > 1, and are performed only once for the empirical spectrum and all bootstrap
+    replicates.
+
+    Mandatory Arguments =
+    (1) fs:  spectrum object name
+    (2) pts: grid size for extrapolation, list of three values
+    (3) outfile:  prefix for output naming (same as used for Optimize_Routine)
+    (4) model_name: a label to slap on the output files; ex. "no_mig"
+    (5) func: access the model function from within this script, ex. Models_2D.no_mig
+
+    Optional Arguments =
+    (6) all_boot: a list of bootstrapped spectra (ex. from Bootstrap_Functions.Bootstrap_Spectra),
+                  required for the GIM method
+    (7) method: "GIM" (Godambe Information Matrix) or "FIM" (Fisher Information Matrix)
+    (8) results_file: the results file to read the best replicate from, default is the main
+                      results file of Optimize_Routine ('[outfile].[model_name].optimized.txt')
+    (9) params: a list of parameter values to use instead of reading the results file
+    (10) param_labels: list of labels for parameters, used if not found in the results file
+    (11) log: a Boolean, if True the standard errors are of the log of the parameters
+               (relative uncertainties)
+    (12) eps: fractional step size of the finite differences, default is 0.01
+    (13) workers: number of worker processes used to evaluate the model, default is 1
+    """
+    if method not in ["GIM", "FIM"]:
+        raise ValueError("\n\nERROR: Unrecognized method selected: '{}'.\nPlease choose GIM or FIM.\n\n".format(method))
+    if method == "GIM" and not all_boot:
+        raise ValueError("\n\nERROR: The GIM method requires a list of bootstrapped spectra (all_boot).\n\n")
+
+    #get the best replicate from the results file, unless parameters were supplied
+    replicate = "input_params"
+    labels = []
+    if params is None:
+        if results_file is None:
+            results_file = "{0}.{1}.optimized.txt".format(outfile, model_name)
+        replicate, ll, params, labels = read_best_params(results_file)
+    if not labels:
+        labels = list(param_labels) if param_labels else ["param_{}".format(i+1) for i in range(len(params))]
+    labels = labels + ["theta"]
+
+    print("\n============================================================================"
+              "\nEstimating {0} uncertainties for model '{1}' ({2})"
+              "\n============================================================================".format(method, model_name, replicate))
+    tb_start = datetime.now()
+    if method == "GIM":
+        godambe, hess, values = godambe_matrices(func, pts, params, fs, all_boot=all_boot, eps=eps,
+                                                     log=log, workers=workers)
+        matrix = godambe
+    else:
+        godambe, hess, values = godambe_matrices(func, pts, params, fs, eps=eps, log=log, workers=workers)
+        matrix = hess
+    uncerts = numpy.sqrt(numpy.diag(numpy.linalg.inv(matrix)))
+
+    outname = "{0}.{1}.uncertainty.txt".format(outfile, model_name)
+    se_label = "std_error(log)" if log else "std_error"
+    with open(outname, 'a') as fh_out:
+        fh_out.write("Model\tReplicate\tMethod\tParameter\tValue\t{}\n".format(se_label))
+        for label, value, se in zip(labels, values, uncerts):
+            fh_out.write("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\n".format(model_name, replicate, method, label,
+                                                                   numpy.around(value, 4), numpy.around(se, 4)))
+            print("\t{0} = {1:.4f} +/- {2:.4f}".format(label, value, se))
+    tb_elapsed = datetime.now() - tb_start
+    print("\nAnalysis Time for Model '{0}': {1} (H:M:S)\n".format(model_name, tb_elapsed))
+    return list(uncerts)
+
+def scan_values(value, points, log_range, lower=None, upper=None):
+    """
+    Return an array of points values spaced evenly in log space around value, from
+    value/10**log_range to value*10**log_range, clipped to the bounds. With an odd number
+    of points, the middle value is the value itself.
+
+    Arguments
+    value: the parameter value at the center of the scan
+    points: number of values
+    log_range: the extent of the scan on each side, in log10 units (1.0 is a factor of 10)
+    lower: an optional lower bound of the values
+    upper: an optional upper bound of the values
+    """
+    values = float(value) * numpy.logspace(-float(log_range), float(log_range), int(points))
+    return numpy.clip(values, lower, upper) if (lower is not None or upper is not None) else values
+
+def default_upper(labels):
+    """
+    Return the default upper bounds of a likelihood scan: 1 for the fractions of the models
+    of Models_2D.py and Models_3D.py (parameters labelled s or f), and None for the others.
+
+    Arguments
+    labels: list of parameter labels
+    """
+    return [1.0 if label in ["s", "f"] else None for label in labels]
+
+def Scan_Likelihood(fs, pts, outfile, model_name, func, results_file=None, params=None, param_labels=None,
+                        profiles=None, slices=None, points=11, log_range=1.0, workers=1, upper=None, lower=None):
+    """
+    Scan the likelihood surface around the best optimized parameters of a model, to diagnose
+    parameters that are poorly identified (ex. T and m in sym_mig). For each parameter in profiles,
+    the parameter is varied over a grid in log space while the others are held at their best values
+    (a 1D slice), and for each pair of parameters in slices both parameters are varied over the grid
+    (a 2D slice). The log-likelihood of each point is calculated with the optimal theta, as in the
+    optimizations. Points at which the model cannot be evaluated (ex. a fraction above 1)
+    have a log-likelihood of nan.
+
+    The model is evaluated once at every distinct point across a pool of worker processes, and the
+    model spectra are kept in the model cache, so points shared by several scans (or by a previous
+    call, ex. with a larger grid) are not evaluated again.
+
+    The scans are written to a compressed NumPy archive named '[outfile].[model_name].scan.npz',
+    with the arrays '[label]_values' and '[label]_ll' for each 1D slice, and '[label1]_[label2]_x',
+    '[label1]_[label2]_y' and '[label1]_[label2]_ll' (with shape (points, points), indexed as [x, y])
+    for each 2D slice. The log-likelihoods are also written in a tab-delimited file named
+    '[outfile].[model_name].scan.txt'. Returns a dictionary of the arrays.
+
+    Mandatory Arguments =
+    (1) fs:  spectrum object name
+    (2) pts: grid size for extrapolation, list of three values
+    (3) outfile:  prefix for output naming (same as used for Optimize_Routine)
+    (4) model_name: a label to slap on the output files; ex. "no_mig"
+    (5) func: access the model function from within this script, ex. Models_2D.no_mig
+
+    Optional Arguments =
+    (6) results_file: the results file to read the best replicate from, default is the main
+                      results file of Optimize_Routine ('[outfile].[model_name].optimized.txt')
+    (7) params: a list of parameter values to use instead of reading the results file
+    (8) param_labels: list of labels for parameters, used if not found in the results file
+    (9) profiles: list of the labels of the parameters to scan one at a time, default is all parameters
+    (10) slices: list of pairs of labels of parameters to scan together, ex. [["m", "T"]], default is none
+    (11) points: number of values of each parameter in the grid, default is 11
+    (12) log_range: extent of the grid on each side of the best value, in log10 units, default is 1.0
+                    (from a tenth to ten times the best value)
+    (13) workers: number of worker processes used to evaluate the model, default is 1
+    (14) upper: list of upper bounds of the parameters (None for no bound), the grid is clipped to
+                the bounds. Default caps the fractions s and f at 1 (see default_upper).
+    (15) lower: list of lower bounds of the parameters (None for no bound), default is no bounds
+    """
+    replicate = "input_params"
+    labels = []
+    if params is None:
+        if results_file is None:
+            results_file = "{0}.{1}.optimized.txt".format(outfile, model_name)
+        replicate, ll, params, labels = read_best_params(results_file)
+    if not labels:
+        labels = list(param_labels) if param_labels else ["param_{}".format(i+1) for i in range(len(params))]
+    params = [float(x) for x in params]
+    if profiles is None:
+        profiles = list(labels)
+    if slices is None:
+        slices = []
+    for label in list(profiles) + [l for pair in slices for l in pair]:
+        if label not in labels:
+            raise ValueError("\n\nERROR: Parameter '{0}' not found in the parameter labels: {1}.\n\n".format(label, ", ".join(labels)))
+
+    print("\n============================================================================"
+              "\nScanning the likelihood surface of model '{0}' ({1})"
+              "\n============================================================================".format(model_name, replicate))
+    tb_start = datetime.now()
+
+    #collect the parameter sets of every scan, so the model is evaluated once at each distinct point
+    if upper is None:
+        upper = default_upper(labels)
+    if lower is None:
+        lower = [None] * len(labels)
+    if len(upper) != len(labels) or len(lower) != len(labels):
+        raise ValueError("\n\nERROR: The upper and lower bounds must have one value per parameter ({}).\n\n".format(len(labels)))
+    grids = dict([(label, scan_values(params[i], points, log_range, lower[i], upper[i])) for i, label in enumerate(labels)])
+    def point(changes):
+        p = list(params)
+        for label, value in changes:
+            p[labels.index(label)] = value
+        return tuple(p)
+    scans_1d = [[label, [point([(label, v)]) for v in grids[label]]] for label in profiles]
+    scans_2d = [[x, y, [point([(x, vx), (y, vy)]) for vx in grids[x] for vy in grids[y]]] for x, y in slices]
+    ns = fs.sample_sizes
+    failed = fill_cache(func, [p for s in scans_1d for p in s[1]] + [p for s in scans_2d for p in s[2]], ns, pts, workers)
+    if failed:
+        print("\tThe model could not be evaluated at {} point(s), their log-likelihood is nan.".format(len(failed)))
+
+    def loglik(p):
+        key = cache_key(func, p, ns, pts)
+        if key not in model_cache:
+            return numpy.nan
+        return Inference.ll_multinom(model_cache[key], fs)
+
+    arrays = {}
+    outname = "{0}.{1}.scan".format(outfile, model_name)
+    with open("{}.txt".format(outname), 'a') as fh_out:
+        fh_out.write("Model\tReplicate\tParameter_x\tValue_x\tParameter_y\tValue_y\tlog-likelihood\n")
+        for label, points_1d in scans_1d:
+            lls = numpy.array([loglik(p) for p in points_1d])
+            arrays["{}_values".format(label)] = grids[label]
+            arrays["{}_ll".format(label)] = lls
+            for value, ll in zip(grids[label], lls):
+                fh_out.write("{0}\t{1}\t{2}\t{3}\tNA\tNA\t{4}\n".format(model_name, replicate, label,
+                                                                         numpy.around(value, 4), numpy.around(ll, 2)))
+            best = int(numpy.argmax(numpy.nan_to_num(lls, nan=-numpy.inf)))
+            print("\t{0}: highest log-likelihood {1:.2f} at {0} = {2:.4f}".format(label, lls[best], grids[label][best]))
+        for x, y, points_2d in scans_2d:
+            pair = "{0}_{1}".format(x, y)
+            arrays["{}_x".format(pair)] = grids[x]
+            arrays["{}_y".format(pair)] = grids[y]
+            arrays["{}_ll".format(pair)] = numpy.array([loglik(p) for p in points_2d]).reshape(len(grids[x]), len(grids[y]))
+            for i, vx in enumerate(grids[x]):
+                for j, vy in enumerate(grids[y]):
+                    fh_out.write("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\n".format(model_name, replicate, x, numpy.around(vx, 4), y,
+                                                                               numpy.around(vy, 4), numpy.around(arrays["{}_ll".format(pair)][i, j], 2)))
+            print("\t{0} vs {1}: scanned {2} points".format(x, y, arrays["{}_ll".format(pair)].size))
+    numpy.savez_compressed("{}.npz".format(outname), **arrays)
+
+    tb_elapsed = datetime.now() - tb_start
+    print("\nAnalysis Time for Model '{0}': {1} (H:M:S)\n".format(model_name, tb_elapsed))
+    return arrays
@@ -0,0 +1,144 @@
+'''
+Usage: python dadi_Run_Uncertainty.py
+
+The purpose of this script is to estimate the uncertainties of the parameters of a model
+after the optimization routine has been performed (ex. with dadi_Run_Optimizations.py).
+The best replicate is read from the main results file ([outfile].[model_name].optimized.txt),
+and standard errors are calculated with the Godambe Information Matrix (GIM), using
+spectra bootstrapped over loci, or with the Fisher Information Matrix (FIM).
+
+The model evaluations required by the finite differences are spread across a pool of
+worker processes, and each is performed only once for the empirical spectrum and all
+of the bootstrap replicates.
+
+The sections with #************** must be edited.
+
+This script must be in the same working directory as Bootstrap_Functions.py and
+Uncertainty_Functions.py. The model function must be imported or defined below, and
+the pts and projections must match those used to optimize the model.
+
+Outputs:
+ The standard errors are written next to the optimized parameters in a tab-delimited
+ file named [outfile].[model_name].uncertainty.txt. Theta is included as the final
+ parameter. Here is an example of the output:
+
+ Model	Replicate	Method	Parameter	Value	std_error
+ sym_mig	Round_3_Replicate_2	GIM	nu1	0.5	0.0735
+ sym_mig	Round_3_Replicate_2	GIM	nu2	0.6	0.1021
+ sym_mig	Round_3_Replicate_2	GIM	m	1.2	0.2716
+ sym_mig	Round_3_Replicate_2	GIM	T	0.4	0.0551
+ sym_mig	Round_3_Replicate_2	GIM	theta	679.0269	43.1128
+
+Notes/Caveats:
+ The parameters are read from the main results file, in which they are rounded to four
+ decimal places. The GIM accounts for linkage among the SNPs of a locus, and is preferred
+ over the FIM for most data sets.
+
+-------------------------
+Written for Python 3.7
+Python modules required:
+-Numpy
+-Scipy
+-dadi
+-------------------------
+
+Daniel Portik
+daniel.portik@gmail.com
+https://github.com/dportik
+Updated October 2020
+'''
+import os
+import sys
+import Bootstrap_Functions
+import Uncertainty_Functions
+
+#add the model script directory so Models_2D can be imported
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(repo_dir, "Two_Population_Pipeline"))
+import Models_2D
+
+#===========================================================================
+# Index the SNPs by locus and create the empirical and bootstrapped spectra
+#===========================================================================
+
+#**************
+snps = "/Users/portik/Documents/GitHub/dadi_pipeline/Example_Data/dadi_2pops_North_South_snps.txt"
+
+#**************
+#pop_ids is a list which should match the populations headers of your SNPs file columns
+pop_ids=["North", "South"]
+
+#**************
+#projection sizes, in ALLELES not individuals
+proj = [16,32]
+
+#[polarized = False] creates folded spectrum objects
+index = Bootstrap_Functions.Index_Loci(snps, pop_ids, proj, polarized=False, locus_column="Gene")
+
+#the empirical spectrum, identical to dadi.Spectrum.from_data_dict
+fs = Bootstrap_Functions.Index_Spectrum(index, Bootstrap_Functions.Index_Array(index)[0])
+
+#**************
+#number of bootstrap replicates, and a seed for reproducible replicates
+all_boot = Bootstrap_Functions.Bootstrap_Spectra(index, 100, seed=12345)
+
+#================================================================================
+# Estimate the parameter uncertainties
+#================================================================================
+'''
+ We will use a function from the Uncertainty_Functions.py script:
+
+ Estimate_Uncertainty(fs, pts, outfile, model_name, func, all_boot=None, method="GIM", results_file=None,
+                          params=None, param_labels=None, log=False, eps=0.01, workers=1)
+
+   Mandatory Arguments =
+    fs:  spectrum object name
+    pts: grid size for extrapolation, list of three values
+    outfile:  prefix for output naming (same as used for Optimize_Routine)
+    model_name: a label to slap on the output files; ex. "no_mig"
+    func: access the model function from within this script, ex. Models_2D.no_mig
+
+   Optional Arguments =
+    all_boot: a list of bootstrapped spectra, required for the GIM method
+    method: "GIM" (Godambe Information Matrix) or "FIM" (Fisher Information Matrix)
+    results_file: the results file to read the best replicate from, default is
+                  [outfile].[model_name].optimized.txt
+    params: a list of parameter values to use instead of reading the results file
+    param_labels: list of labels for parameters, used if not found in the results file
+    log: a Boolean, if True the standard errors are of the log of the parameters
+    eps: fractional step size of the finite differences, default is 0.01
+    workers: number of worker processes used to evaluate the model, default is 1
+'''
+
+#**************
+#the grid size used to optimize the model
+pts = [50,60,70]
+
+#**************
+#the prefix used for the optimizations, and the number of worker processes
+prefix = "V5_Number_1"
+workers = 4
+
+Uncertainty_Functions.Estimate_Uncertainty(fs, pts, prefix, "sym_mig", Models_2D.sym_mig, all_boot=all_boot,
+                                               method="GIM", workers=workers)
+
+#================================================================================
+# Scan the likelihood surface around the best parameters (optional)
+#================================================================================
+'''
+ Scan_Likelihood(fs, pts, outfile, model_name, func, results_file=None, params=None, param_labels=None,
+                     profiles=None, slices=None, points=11, log_range=1.0, workers=1, upper=None, lower=None)
+
+   Optional Arguments (in addition to those of Estimate_Uncertainty) =
+    profiles: list of the labels of the parameters to scan one at a time, default is all parameters
+    slices: list of pairs of labels of parameters to scan together, ex. [["m", "T"]]
+    points: number of values of each parameter in the grid, default is 11
+    log_range: extent of the grid on each side of the best value, in log10 units, default is 1.0
+    upper, lower: lists of bounds the grid is clipped to, default caps the fractions s and f at 1
+
+ The scans are written to [outfile].[model_name].scan.npz and [outfile].[model_name].scan.txt.
+'''
+
+#**************
+#Uncertainty_Functions.Scan_Likelihood(fs, pts, prefix, "sym_mig", Models_2D.sym_mig, slices=[["m", "T"]],
+#                                          points=11, log_range=1.0, workers=workers)
@@ -0,0 +1,350 @@
+'''
+A filesystem-based work queue for running the optimization routine on any number of
+worker processes, on one or several hosts sharing a directory.
+
+A coordinator process hands out tasks (model, round, replicate, starting parameters) by
+writing them to the queue directory, and collects the results written by the workers.
+A round is advanced as soon as a quorum of its replicates has finished, using the best
+parameters found so far, so slow replicates do not hold up the whole round. Results of
+replicates that finish after their round was advanced are still collected. The results and
+log files of each model are identical in format to those of Optimize_Routine.
+
+Queue directory layout:
+ tasks/    tasks waiting for a worker
+ claimed/  tasks being run by a worker (a task is claimed by moving it here)
+ results/  results of finished tasks
+ done      written by the coordinator once all rounds of all models are complete
+
+Workers can be started before or after the coordinator, and stop once the coordinator
+is done. While a task runs, its worker regularly updates the modification time of the
+claimed task file, so the coordinator can queue again the tasks of workers that stopped.
+A task that fails with an error is reported to the coordinator as a failed replicate. The queue can be tested entirely on a single host by starting a coordinator
+and several workers in the same directory.
+
+-------------------------
+Written for Python 3.7
+Python modules required:
+-Numpy
+-Scipy
+-dadi
+-------------------------
+
+Daniel Portik
+daniel.portik@gmail.com
+https://github.com/dportik
+Updated October 2020
+'''
+import os
+import json
+import time
+import socket
+import threading
+import numpy
+import dadi
+from datetime import datetime
+import Optimize_Functions
+
+def queue_dirs(queue_dir):
+    """
+    Create the directories of a work queue if needed, return a list of the
+    [tasks, claimed, results] directory paths.
+
+    Arguments
+    queue_dir: path to the queue directory
+    """
+    dirs = [os.path.join(queue_dir, d) for d in ["tasks", "claimed", "results"]]
+    for d in dirs:
+        #the coordinator and workers may start at the same time
+        os.makedirs(d, exist_ok=True)
+    return dirs
+
+def write_json(filename, content):
+    """
+    Write a dictionary to a json file, making it visible under its final name only once
+    it is complete.
+
+    Arguments
+    filename: path of the json file
+    content: dictionary to write
+    """
+    tmp = "{0}.{1}.tmp".format(filename, os.getpid())
+    with open(tmp, 'w') as fh:
+        json.dump(content, fh)
+    os.rename(tmp, filename)
+
+def claim_task(queue_dir, worker_id):
+    """
+    Claim the next waiting task of the queue, return a list with the following elements:
+    [task id, task dictionary, path of the claimed task file], or None if no task is waiting.
+
+    Tasks are claimed by moving them to the claimed directory, which only one worker can
+    succeed in doing on a shared filesystem.
+
+    Arguments
+    queue_dir: path to the queue directory
+    worker_id: a label of the worker, ex. "host-1234"
+    """
+    tasks_dir, claimed_dir, results_dir = queue_dirs(queue_dir)
+    for name in sorted([f for f in os.listdir(tasks_dir) if f.endswith(".json")]):
+        task_id = name[:-len(".json")]
+        claimed = os.path.join(claimed_dir, "{0}.{1}.json".format(task_id, worker_id))
+        try:
+            os.rename(os.path.join(tasks_dir, name), claimed)
+        except OSError:
+            #another worker claimed this task first
+            continue
+        #record the time the task was claimed, used by the coordinator to detect stopped workers
+        os.utime(claimed, None)
+        with open(claimed, 'r') as fh:
+            return [task_id, json.load(fh), claimed]
+    return None
+
+def run_task(task_id, task, fs, pts, func, results_dir):
+    """
+    Perform the optimization replicate described by a task, and write its results and
+    replicate log to the results directory.
+
+    Arguments
+    task_id: the id of the task, ex. "sym_mig.Round_1.Replicate_3"
+    task: the task dictionary written by the coordinator
+    fs: spectrum object name
+    pts: grid size for extrapolation, list of three values
+    func: the model function of the task, ex. Models_2D.sym_mig
+    results_dir: path to the results directory of the queue
+    """
+    tb = datetime.now()
+    roundrep = "Round_{0}_Replicate_{1}".format(task["round"], task["rep"])
+    log_label = os.path.join(results_dir, task_id)
+    func_exec = dadi.Numerics.make_extrap_log_func(func)
+    params_opt = Optimize_Functions.optimize_replicate(task["params"], fs, func_exec, pts, log_label,
+                                                           task["lower_bound"], task["upper_bound"], task["maxiter"],
+                                                           task["optimizer"], func=func, fold=task["fold"])
+    sim_model = func_exec(params_opt, fs.sample_sizes, pts)
+    rep_results = Optimize_Functions.collect_results(fs, sim_model, params_opt, roundrep, task["fs_folded"])
+    write_json(os.path.join(results_dir, "{}.json".format(task_id)),
+                   {"model_name": task["model_name"], "round": task["round"], "rep": task["rep"],
+                    "results": [rep_results[0], float(rep_results[1]), float(rep_results[2]), float(rep_results[3]),
+                                    float(rep_results[4]), [float(x) for x in rep_results[5]]],
+                    "seconds": (datetime.now() - tb).total_seconds()})
+
+def release_task(claimed, task_id, tasks_dir):
+    """
+    Move a claimed task back to the tasks directory, so another worker can run it.
+    Nothing is done if the task is no longer claimed (ex. the coordinator queued it again).
+
+    Arguments
+    claimed: path of the claimed task file
+    task_id: the id of the task
+    tasks_dir: path to the tasks directory of the queue
+    """
+    try:
+        os.rename(claimed, os.path.join(tasks_dir, "{}.json".format(task_id)))
+    except OSError:
+        pass
+
+def Run_Worker(queue_dir, fs, pts, models, poll=2.0, max_tasks=None, heartbeat=60.0):
+    """
+    Run tasks from a work queue until the coordinator is done. If a task fails with an error,
+    the error is written as the result of the task, so the coordinator does not wait for it.
+
+    Arguments
+    queue_dir: path to the queue directory, shared with the coordinator
+    fs: spectrum object name
+    pts: grid size for extrapolation, list of three values
+    models: a dictionary of {model_name: model function} for the models of the run,
+            ex. {"sym_mig": Models_2D.sym_mig}
+    poll: seconds to wait before checking the queue again when no task is waiting
+    max_tasks: optional maximum number of tasks to run before stopping
+    heartbeat: seconds between updates of the modification time of the claimed task file while
+               a task runs, which must be shorter than the task_timeout of the coordinator
+    """
+    worker_id = "{0}-{1}".format(socket.gethostname().replace(".", "-"), os.getpid())
+    tasks_dir, claimed_dir, results_dir = queue_dirs(queue_dir)
+    print("\n\nWorker {0} started on queue {1}\n".format(worker_id, queue_dir))
+    completed = 0
+    while max_tasks is None or completed < int(max_tasks):
+        #tasks left in the queue once the coordinator is done are never collected, so they are not started
+        if os.path.exists(os.path.join(queue_dir, "done")):
+            break
+        claim = claim_task(queue_dir, worker_id)
+        if claim is None:
+            time.sleep(poll)
+            continue
+        task_id, task, claimed = claim
+        if task["model_name"] not in models:
+            #leave the task to a worker that was supplied this model
+            release_task(claimed, task_id, tasks_dir)
+            raise ValueError("\n\nERROR: Model {} of the queue was not supplied to the worker.\n\n".format(task["model_name"]))
+        print("\n\tTask {}:".format(task_id))
+
+        #show the coordinator that this worker is still running the task
+        stop = threading.Event()
+        def beat():
+            while not stop.wait(heartbeat):
+                try:
+                    os.utime(claimed, None)
+                except OSError:
+                    return
+        beat_thread = threading.Thread(target=beat)
+        beat_thread.daemon = True
+        beat_thread.start()
+        try:
+            run_task(task_id, task, fs, pts, models[task["model_name"]], results_dir)
+        except Exception as err:
+            print("\n\tTask {0} failed: {1}".format(task_id, repr(err)))
+            write_json(os.path.join(results_dir, "{}.json".format(task_id)),
+                           {"model_name": task["model_name"], "round": task["round"], "rep": task["rep"],
+                            "error": repr(err)})
+        finally:
+            stop.set()
+            beat_thread.join()
+
+        #the task may have been queued again by the coordinator while it was running
+        try:
+            os.remove(claimed)
+        except OSError:
+            pass
+        completed += 1
+    print("\n\nWorker {0} finished after {1} tasks.\n".format(worker_id, completed))
+
+def Run_Coordinator(queue_dir, outfile, model_set, rounds, fs_folded=True, reps=None, maxiters=None,
+                        folds=None, optimizer="log_fmin", quorum=0.8, poll=2.0, task_timeout=600.0):
+    """
+    Coordinate the optimization routine of a set of models across the workers of a work queue,
+    return a dictionary of {model_name: list of replicate results sorted by log-likelihood}.
+
+    For every model, the replicates of round 1 are queued from the starting parameters. When the
+    fraction quorum of the replicates of a round have finished, the replicates of the next round
+    are queued, perturbed from the best parameters found so far. Replicates finishing after this are
+    still written to the output files and considered for later rounds. A model is complete once
+    every replicate of every round has finished. Replicates that failed with an error in a worker
+    count as finished, and are written to the log file but not to the results file.
+
+    Mandatory/Positional Arguments
+    (1) queue_dir: path to the queue directory, shared with the workers
+    (2) outfile: prefix for output naming
+    (3) model_set: a list of dictionaries, one per model, with the keys "model_name" and
+                   "param_number", and optionally "in_params", "in_upper", "in_lower" and "param_labels"
+    (4) rounds: number of optimization rounds to perform
+
+    Optional Arguments
+    (5-9) fs_folded, reps, maxiters, folds, optimizer: see Optimize_Routine
+    (10) quorum: fraction of the replicates of a round that must finish before the next round is queued.
+                 Default is 0.8. A value of 1 waits for every replicate, as in Optimize_Routine.
+    (11) poll: seconds to wait between checks of the queue. Default is 2.
+    (12) task_timeout: tasks whose worker has not updated the claimed task file for this many seconds
+                       (for example because the worker was stopped) are queued again. Workers update the
+                       file every heartbeat seconds (see Run_Worker), so this does not limit the run time
+                       of a task. Default is 600. If None, tasks are never queued again, and the
+                       coordinator waits forever for the tasks of a worker that stopped.
+    """
+    tasks_dir, claimed_dir, results_dir = queue_dirs(queue_dir)
+    if not 0 < quorum <= 1:
+        raise ValueError("\n\nERROR: The quorum must be greater than 0 and at most 1.\n\n")
+    if os.listdir(tasks_dir) or os.listdir(claimed_dir) or os.listdir(results_dir) or os.path.exists(os.path.join(queue_dir, "done")):
+        raise ValueError("\n\nERROR: The queue directory {} was already used. Please supply a new queue directory.\n\n".format(queue_dir))
+    reps_list, maxiters_list, folds_list = Optimize_Functions.parse_opt_settings(rounds, reps, maxiters, folds)
+    rounds = int(rounds)
+
+    print("\n\n============================================================================"
+              "\nWork queue coordinator: {0}\nModels: {1}\n============================================================================\n\n".format(
+                  queue_dir, ", ".join([m["model_name"] for m in model_set])))
+    tb = datetime.now()
+
+    states = {}
+    for m in model_set:
+        params, upper_bound, lower_bound = Optimize_Functions.parse_params(m["param_number"], m.get("in_params"),
+                                                                               m.get("in_upper"), m.get("in_lower"))
+        Optimize_Functions.write_header(outfile, m["model_name"], m.get("param_labels"))
+        states[m["model_name"]] = {"params": params, "upper_bound": upper_bound, "lower_bound": lower_bound,
+                                       "round": 0, "finished": [0] * rounds, "results": []}
+
+    def queue_round(name, r):
+        state = states[name]
+        #start from the initial parameters until a replicate of the model succeeds
+        best_params = state["results"][0][5] if state["results"] else state["params"]
+        for rep in range(1, reps_list[r-1]+1):
+            params_perturbed = dadi.Misc.perturb_params(best_params, fold=folds_list[r-1],
+                                                            upper_bound=state["upper_bound"],
+                                                            lower_bound=state["lower_bound"])
+            task_id = "{0}.Round_{1}.Replicate_{2}".format(name, r, rep)
+            write_json(os.path.join(tasks_dir, "{}.json".format(task_id)),
+                           {"model_name": name, "round": r, "rep": rep,
+                            "params": [float(x) for x in params_perturbed],
+                            "upper_bound": [float(x) for x in state["upper_bound"]],
+                            "lower_bound": [float(x) for x in state["lower_bound"]],
+                            "maxiter": maxiters_list[r-1], "fold": folds_list[r-1],
+                            "optimizer": optimizer, "fs_folded": fs_folded})
+        state["round"] = r
+        print("\tQueued {0} replicates of round {1} for model {2}.".format(reps_list[r-1], r, name))
+
+    for name in states:
+        queue_round(name, 1)
+
+    processed = set()
+    while True:
+        #collect new results
+        for f in sorted(os.listdir(results_dir)):
+            if not f.endswith(".json") or f in processed:
+                continue
+            with open(os.path.join(results_dir, f), 'r') as fh:
+                result = json.load(fh)
+            processed.add(f)
+            name = result["model_name"]
+            state = states[name]
+            if "error" in result:
+                message = "Round_{0}_Replicate_{1} failed: {2}".format(result["round"], result["rep"], result["error"])
+                with Optimize_Functions.open_log(outfile, name) as fh_log:
+                    fh_log.write("\n{}\n".format(message))
+                state["finished"][result["round"]-1] += 1
+                print("\tModel {0}, {1}".format(name, message))
+                continue
+            rep_results = result["results"]
+            Optimize_Functions.write_log(outfile, name, rep_results, rep_results[0],
+                                             log_label=os.path.join(results_dir, f[:-len(".json")]))
+            Optimize_Functions.write_result("{0}.{1}.optimized.txt".format(outfile, name), name, rep_results)
+            state["results"].append(rep_results)
+            state["results"].sort(key=lambda x: float(x[1]), reverse=True)
+            state["finished"][result["round"]-1] += 1
+            print("\tModel {0}, {1} finished ({2:.1f} s), log-likelihood = {3}".format(name, rep_results[0],
+                                                                                       result["seconds"], rep_results[1]))
+
+        #queue the next round of models that reached the quorum of their current round
+        for name, state in states.items():
+            r = state["round"]
+            if r < rounds and state["finished"][r-1] >= numpy.ceil(quorum * reps_list[r-1]):
+                print("\n\tModel {0}: {1} of {2} replicates of round {3} finished.".format(name, state["finished"][r-1],
+                                                                                          reps_list[r-1], r))
+                if state["results"]:
+                    Optimize_Functions.print_best(state["results"])
+                queue_round(name, r+1)
+
+        #queue again the tasks of workers that stopped
+        if task_timeout is not None:
+            for f in os.listdir(claimed_dir):
+                path = os.path.join(claimed_dir, f)
+                task_id = f.rsplit(".", 2)[0]
+                if (time.time() - os.path.getmtime(path) > task_timeout and
+                        not os.path.exists(os.path.join(results_dir, "{}.json".format(task_id)))):
+                    try:
+                        os.rename(path, os.path.join(tasks_dir, "{}.json".format(task_id)))
+                        print("\tTask {} timed out and was queued again.".format(task_id))
+                    except OSError:
+                        pass
+
+        if all([s["round"] == rounds and sum(s["finished"]) == sum(reps_list) for s in states.values()]):
+            break
+        time.sleep(poll)
+
+    with open(os.path.join(queue_dir, "done"), 'w') as fh:
+        fh.write("{}\n".format(datetime.now()))
+
+    for name, state in states.items():
+        print("\n\tModel {}:".format(name))
+        if state["results"]:
+            Optimize_Functions.print_best(state["results"])
+        else:
+            print("\tAll replicates failed.")
+    print("\nAnalysis Time for Work Queue: {0} (H:M:S)\n\n"
+              "============================================================================".format(datetime.now() - tb))
+    return dict([(name, state["results"]) for name, state in states.items()])
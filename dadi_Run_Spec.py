@@ -0,0 +1,415 @@
+'''
+Usage: python dadi_Run_Spec.py run_spec.json [--index N] [--shard-index N] [--worker]
+
+This script runs the dadi_pipeline analyses from a run specification file, rather than
+by editing a python script for every job. A run spec (in JSON, TOML, or YAML format) contains
+the data, projections, grid sizes, models and optimization settings, and is dispatched to
+the Optimize_Routine, Optimize_Model_Set, Perform_Sims (goodness of fit), or plotting
+functions. Because run specs are plain text files, thousands of them can be generated
+programmatically and launched as cluster array jobs.
+
+This script must be in the main dadi_pipeline directory, along with Optimize_Functions.py.
+Models are imported from the Models_2D.py and Models_3D.py scripts of the Two_Population_Pipeline
+and Three_Population_Pipeline directories, or from a custom model script given by its path.
+
+Run spec:
+ Here is an example of a run spec in JSON format, which runs the optimization routine for
+ two models in Models_2D.py:
+
+ {
+   "task": "optimize",
+   "outfile": "V1",
+   "data": {"snps": "Example_Data/dadi_2pops_North_South_snps.txt",
+            "pop_ids": ["North", "South"],
+            "projections": [16, 32],
+            "polarized": false},
+   "pts": [50, 60, 70],
+   "models": [{"module": "Models_2D", "name": "no_mig"},
+              {"module": "Models_2D", "name": "sym_mig", "in_upper": [20, 20, 10, 15]}],
+   "settings": {"rounds": 3, "reps": [10, 20, 30], "maxiters": [3, 5, 10], "folds": [3, 2, 1],
+                "optimizer": "log_fmin", "workers": 1}
+ }
+
+ task: one of "optimize" (Optimize_Routine for each model), "model_set" (Optimize_Model_Set
+       for all models), "gof" (goodness of fit simulations for each model), "plot"
+       (fit each model to the data and plot the comparison), "shard" (one shard of an
+       optimization round for each model, see Optimize_Shard), "merge" (combine the
+       shards of a round for each model, see Merge_Shards), or "queue" (coordinate or work
+       on a work queue for all models, see Work_Queue.py)
+ outfile: prefix for output naming
+ data: either "snps" (a SNPs file, with "pop_ids", "projections" and "polarized"), or "fs" (a
+       frequency spectrum file). A spectrum that is not polarized is folded.
+ pts: grid size for extrapolation, list of three values
+ models: a list of models, each with a "module" (Models_2D, Models_3D, or the path to a model
+         script) and a "name" (the model function, or a model built with Model_Builder.py). The
+         "param_number" and "param_labels" are read from the model function if they are not supplied,
+         and must be supplied if they cannot be read. The optional "in_params", "in_upper"
+         and "in_lower" are used as in Optimize_Routine.
+ settings: "rounds", and any optional arguments of the function selected by the task
+           (ex. "reps", "maxiters", "folds", "optimizer", "workers"). Settings that do not apply
+           to the task (ex. "workers" for the gof task) are ignored, and unrecognized settings
+           raise an error.
+ gof: for the gof task, "sims" (number of simulations) and "max_projections"
+      (see Goodness_of_Fit/Simulate_and_Optimize.py). The "in_params" of each model
+      are the previously optimized parameters.
+ plot: for the plot task, an optional "vmin" value (other keys raise an error). The
+       "in_params" of each model are the previously optimized parameters.
+ shard: for the shard and merge tasks, the "round" (starting at 1), the number of shards
+        ("count"), a "seed" shared by all shards, and the "index" of the shard (starting at 0),
+        which can instead be supplied with the --shard-index argument.
+ queue: for the queue task, the queue directory ("dir"), and optionally the "quorum", "poll"
+        and "task_timeout" of the coordinator (see Work_Queue.Run_Coordinator). The coordinator
+        is run, unless the --worker argument is supplied.
+ jobs: an optional list of run specs. Each job uses the values of the main run spec, updated
+       with its own values. The --index argument selects a single job (for array jobs),
+       otherwise all jobs are run in order.
+
+-------------------------
+Written for Python 3.7
+Python modules required:
+-Numpy
+-Scipy
+-dadi
+Optional python modules:
+-PyYAML (for YAML run specs)
+-toml (for TOML run specs with Python versions before 3.11)
+-------------------------
+
+Daniel Portik
+daniel.portik@gmail.com
+https://github.com/dportik
+Updated October 2020
+'''
+import sys
+import os
+import re
+import json
+import argparse
+import importlib
+import inspect
+
+#directories of dadi_pipeline containing the model scripts and function scripts
+pipeline_dir = os.path.dirname(os.path.abspath(__file__))
+pipeline_dirs = [pipeline_dir] + [os.path.join(pipeline_dir, d) for d in ["Two_Population_Pipeline",
+                                                                           "Three_Population_Pipeline",
+                                                                           "Goodness_of_Fit", "Plotting"]]
+
+def load_spec(filename):
+    """
+    Read a run spec from a JSON (.json), TOML (.toml) or YAML (.yaml, .yml) file,
+    return a dictionary.
+
+    Arguments
+    filename: path to the run spec file
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".json":
+        with open(filename, 'r') as fh:
+            return json.load(fh)
+    elif ext == ".toml":
+        try:
+            import tomllib
+            with open(filename, 'rb') as fh:
+                return tomllib.load(fh)
+        except ImportError:
+            try:
+                import toml
+            except ImportError:
+                raise ImportError("\n\nERROR: Reading TOML run specs requires Python 3.11 or the toml module.\n\n")
+            with open(filename, 'r') as fh:
+                return toml.load(fh)
+    elif ext in [".yaml", ".yml"]:
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("\n\nERROR: Reading YAML run specs requires the PyYAML module.\n\n")
+        with open(filename, 'r') as fh:
+            return yaml.safe_load(fh)
+    else:
+        raise ValueError("\n\nERROR: Unrecognized run spec format: {}\nPlease use a .json, .toml, .yaml, or .yml file.\n\n".format(filename))
+
+def select_jobs(spec, index=None):
+    """
+    Return the list of run specs to perform. If the run spec contains a list of jobs,
+    each job is the main run spec updated with the values of the job.
+
+    Arguments
+    spec: the run spec dictionary
+    index: an optional job index (starting at 0) to select a single job
+    """
+    jobs = spec.get("jobs")
+    if not jobs:
+        if index is not None and int(index) != 0:
+            raise ValueError("\n\nERROR: Job index {} requested, but the run spec contains a single job.\n\n".format(index))
+        return [spec]
+    base = dict([(k, v) for k, v in spec.items() if k != "jobs"])
+    merged = []
+    for job in jobs:
+        m = dict(base)
+        m.update(job)
+        merged.append(m)
+    if index is not None:
+        if int(index) >= len(merged):
+            raise ValueError("\n\nERROR: Job index {0} requested, but the run spec contains {1} jobs.\n\n".format(index, len(merged)))
+        return [merged[int(index)]]
+    return merged
+
+def load_spectrum(data, projections=None):
+    """
+    Create the frequency spectrum from the data section of a run spec, return a list
+    with the following elements: [spectrum object, whether the spectrum is folded].
+
+    Arguments
+    data: dictionary with either "snps", "pop_ids", "projections" and "polarized", or "fs"
+    projections: optional projections used in place of the projections of the data section
+    """
+    import dadi
+    if "fs" in data:
+        fs = dadi.Spectrum.from_file(data["fs"])
+        if projections is not None:
+            fs = fs.project(projections)
+        return [fs, bool(fs.folded)]
+    dd = dadi.Misc.make_data_dict(data["snps"])
+    polarized = bool(data.get("polarized", False))
+    fs = dadi.Spectrum.from_data_dict(dd, pop_ids=data["pop_ids"],
+                                          projections=projections if projections is not None else data["projections"],
+                                          polarized=polarized)
+    return [fs, not polarized]
+
+def load_model(model):
+    """
+    Import a model function from the models section of a run spec, return a list with
+    the following elements: [model function, param_number, param_labels].
+
+    Arguments
+    model: dictionary with a "module" (Models_2D, Models_3D, or path to a model script)
+           and a "name", and optionally "param_number" and "param_labels"
+    """
+    module_name = model["module"]
+    if module_name.endswith(".py"):
+        module_dir, module_file = os.path.split(os.path.abspath(module_name))
+        if module_dir not in sys.path:
+            sys.path.append(module_dir)
+        module_name = module_file[:-3]
+    module = importlib.import_module(module_name)
+    try:
+        func = getattr(module, model["name"])
+    except AttributeError:
+        raise ValueError("\n\nERROR: Model {0} not found in {1}.\n\n".format(model["name"], model["module"]))
+
+    #read the parameter labels from the line that unpacks the params argument, ex. 'nu1, nu2, m, T = params',
+    #or from a model built with Model_Builder.py
+    if hasattr(func, "param_labels"):
+        labels = list(func.param_labels)
+    else:
+        match = re.search(r"^\s*([\w\s,]+?)\s*=\s*params\s*$", inspect.getsource(func), re.MULTILINE)
+        labels = [p.strip() for p in match.group(1).split(",") if p.strip()] if match else []
+    if "param_labels" in model:
+        labels = [p.strip() for p in model["param_labels"].split(",") if p.strip()]
+    param_number = int(model.get("param_number", len(labels)))
+    if param_number < 1:
+        raise ValueError("\n\nERROR: The number of parameters of model {0} could not be determined from {1}.\n"
+                             "Please supply its \"param_number\" (and \"param_labels\") in the run spec.\n\n".format(model["name"], model["module"]))
+    if labels and len(labels) != param_number:
+        raise ValueError("\n\nERROR: Model {0} has {1} parameter labels ({2}) but param_number is {3}.\n\n".format(
+            model["name"], len(labels), ", ".join(labels), param_number))
+    param_labels = ", ".join(labels) if labels else None
+    return [func, param_number, param_labels]
+
+def setting_functions():
+    """
+    Return the list of functions whose optional arguments can be supplied as settings of a run spec.
+    """
+    import Optimize_Functions
+    import Optimize_Functions_GOF
+    import Work_Queue
+    return [Optimize_Functions.Optimize_Routine, Optimize_Functions.Optimize_Model_Set,
+                Optimize_Functions.Optimize_Shard, Optimize_Functions_GOF.Perform_Sims,
+                Work_Queue.Run_Coordinator]
+
+def optional_arguments(func):
+    """
+    Return the list of names of the arguments of a function that have a default value.
+
+    Arguments
+    func: the function
+    """
+    return [name for name, p in inspect.signature(func).parameters.items() if p.default is not inspect.Parameter.empty]
+
+def task_settings(settings, func, task, fixed=()):
+    """
+    Return the settings of a run spec that are accepted by the function of a task. Settings that are
+    not an optional argument of any function of the pipeline (ex. a misspelled setting), or that are
+    set from other sections of the run spec, raise an error. Settings that only apply to other tasks
+    (ex. "workers" for the gof task) are reported and ignored.
+
+    Arguments
+    settings: dictionary of settings
+    func: the function called by the task, ex. Optimize_Functions.Optimize_Routine
+    task: the name of the task
+    fixed: names of the arguments of func that are set from other sections of the run spec
+    """
+    known = set()
+    for f in setting_functions():
+        known.update(optional_arguments(f))
+    unknown = sorted([k for k in settings if k not in known or k in fixed])
+    if unknown:
+        raise ValueError("\n\nERROR: Unrecognized settings for the {0} task: {1}.\nAccepted settings: {2}.\n\n".format(
+            task, ", ".join(unknown), ", ".join([a for a in optional_arguments(func) if a not in fixed])))
+    accepted = [a for a in optional_arguments(func) if a not in fixed]
+    ignored = sorted([k for k in settings if k not in accepted])
+    if ignored:
+        print("\tSettings not used by the {0} task: {1}\n".format(task, ", ".join(ignored)))
+    return dict([(k, v) for k, v in settings.items() if k in accepted])
+
+def run_spec(spec):
+    """
+    Perform the analysis described by a single run spec.
+
+    Arguments
+    spec: the run spec dictionary (see the description at the top of this script)
+    """
+    for d in pipeline_dirs:
+        if d not in sys.path:
+            sys.path.append(d)
+
+    task = spec.get("task", "optimize")
+    outfile = spec["outfile"]
+    pts = spec["pts"]
+    settings = dict(spec.get("settings", {}))
+    rounds = settings.pop("rounds", 3)
+    fs, fs_folded = load_spectrum(spec["data"])
+
+    print("\n\n============================================================================"
+              "\nRun spec task: {0}, sample sizes: {1}\n"
+              "============================================================================\n".format(task, list(fs.sample_sizes)))
+
+    if task == "optimize":
+        import Optimize_Functions
+        settings = task_settings(settings, Optimize_Functions.Optimize_Routine, task,
+                                     ["fs_folded", "in_params", "in_upper", "in_lower", "param_labels"])
+        for model in spec["models"]:
+            func, param_number, param_labels = load_model(model)
+            Optimize_Functions.Optimize_Routine(fs, pts, outfile, model["name"], func, rounds, param_number,
+                                                    fs_folded=fs_folded, in_params=model.get("in_params"),
+                                                    in_upper=model.get("in_upper"), in_lower=model.get("in_lower"),
+                                                    param_labels=param_labels, **settings)
+
+    elif task == "model_set":
+        import Optimize_Functions
+        settings = task_settings(settings, Optimize_Functions.Optimize_Model_Set, task, ["fs_folded"])
+        model_set = []
+        for model in spec["models"]:
+            func, param_number, param_labels = load_model(model)
+            entry = {"model_name": model["name"], "func": func, "param_number": param_number,
+                         "param_labels": param_labels}
+            for key in ["in_params", "in_upper", "in_lower"]:
+                if key in model:
+                    entry[key] = model[key]
+            model_set.append(entry)
+        Optimize_Functions.Optimize_Model_Set(fs, pts, outfile, model_set, rounds, fs_folded=fs_folded, **settings)
+
+    elif task == "gof":
+        import Optimize_Functions_GOF
+        gof = spec["gof"]
+        settings = task_settings(settings, Optimize_Functions_GOF.Perform_Sims, task,
+                                     ["fs_folded", "in_upper", "in_lower", "param_labels"])
+        projections = list(fs.sample_sizes)
+        max_fs = load_spectrum(spec["data"], gof.get("max_projections", projections))[0]
+        for model in spec["models"]:
+            func, param_number, param_labels = load_model(model)
+            fs_for_sims = Optimize_Functions_GOF.Get_Empirical(fs, max_fs, pts, outfile, model["name"], func,
+                                                                   model["in_params"], projections, fs_folded=fs_folded)
+            Optimize_Functions_GOF.Perform_Sims(gof["sims"], fs_for_sims, pts, model["name"], func, rounds,
+                                                    param_number, projections, fs_folded=fs_folded,
+                                                    in_upper=model.get("in_upper"), in_lower=model.get("in_lower"),
+                                                    param_labels=param_labels, **settings)
+
+    elif task == "plot":
+        import Plotting_Functions
+        settings = task_settings(settings, Plotting_Functions.Fit_Empirical, task, ["fs_folded"])
+        unknown = sorted([k for k in spec.get("plot", {}) if k not in ["vmin"]])
+        if unknown:
+            raise ValueError("\n\nERROR: Unrecognized plot settings: {}.\nAccepted settings: vmin.\n\n".format(", ".join(unknown)))
+        vmin = spec.get("plot", {}).get("vmin")
+        plot_funcs = {1: Plotting_Functions.Plot_1D, 2: Plotting_Functions.Plot_2D, 3: Plotting_Functions.Plot_3D}
+        for model in spec["models"]:
+            func = load_model(model)[0]
+            model_fit = Plotting_Functions.Fit_Empirical(fs, pts, outfile, model["name"], func,
+                                                             model["in_params"], fs_folded=fs_folded)
+            if len(fs.sample_sizes) == 1 or vmin is None:
+                plot_funcs[len(fs.sample_sizes)](fs, model_fit, outfile, model["name"])
+            else:
+                plot_funcs[len(fs.sample_sizes)](fs, model_fit, outfile, model["name"], vmin_val=vmin)
+
+    elif task == "shard":
+        import Optimize_Functions
+        shard = spec["shard"]
+        settings = task_settings(settings, Optimize_Functions.Optimize_Shard, task,
+                                     ["fs_folded", "in_params", "in_upper", "in_lower", "param_labels"])
+        for model in spec["models"]:
+            func, param_number, param_labels = load_model(model)
+            Optimize_Functions.Optimize_Shard(fs, pts, outfile, model["name"], func, rounds, param_number,
+                                                  shard["round"], shard["index"], shard["count"], shard["seed"],
+                                                  fs_folded=fs_folded, in_params=model.get("in_params"),
+                                                  in_upper=model.get("in_upper"), in_lower=model.get("in_lower"),
+                                                  param_labels=param_labels, **settings)
+
+    elif task == "merge":
+        import Optimize_Functions
+        shard = spec["shard"]
+        for model in spec["models"]:
+            param_labels = load_model(model)[2]
+            Optimize_Functions.Merge_Shards(outfile, model["name"], shard["round"], shard["count"],
+                                                param_labels=param_labels)
+
+    elif task == "queue":
+        import Work_Queue
+        queue = dict(spec["queue"])
+        queue_dir = queue.pop("dir")
+        if queue.pop("role", "coordinator") == "worker":
+            models = dict([(model["name"], load_model(model)[0]) for model in spec["models"]])
+            Work_Queue.Run_Worker(queue_dir, fs, pts, models, poll=queue.get("poll", 2.0))
+        else:
+            model_set = []
+            for model in spec["models"]:
+                func, param_number, param_labels = load_model(model)
+                entry = {"model_name": model["name"], "param_number": param_number, "param_labels": param_labels}
+                for key in ["in_params", "in_upper", "in_lower"]:
+                    if key in model:
+                        entry[key] = model[key]
+                model_set.append(entry)
+            settings.update(queue)
+            settings = task_settings(settings, Work_Queue.Run_Coordinator, task, ["fs_folded"])
+            Work_Queue.Run_Coordinator(queue_dir, outfile, model_set, rounds, fs_folded=fs_folded, **settings)
+
+    else:
+        raise ValueError("\n\nERROR: Unrecognized task: {}\nPlease select from: optimize, model_set, gof, plot, shard, merge, or queue.\n\n".format(task))
+
+def main(argv=None):
+    """
+    Command line entry point: read a run spec file and perform its jobs.
+
+    Arguments
+    argv: list of command line arguments, the arguments of the script are used if None
+    """
+    parser = argparse.ArgumentParser(description="Run dadi_pipeline analyses from a JSON, TOML, or YAML run spec.")
+    parser.add_argument("spec", help="path to the run spec file")
+    parser.add_argument("--index", type=int, default=None,
+                            help="index (starting at 0) of a single job to run from the jobs list of the run spec, "
+                                 "ex. --index $SLURM_ARRAY_TASK_ID")
+    parser.add_argument("--shard-index", type=int, default=None,
+                            help="index (starting at 0) of the shard to run for the shard task, "
+                                 "ex. --shard-index $SLURM_ARRAY_TASK_ID")
+    parser.add_argument("--worker", action="store_true",
+                            help="for the queue task, run a worker instead of the coordinator")
+    args = parser.parse_args(argv)
+    for job in select_jobs(load_spec(args.spec), args.index):
+        if args.shard_index is not None:
+            job["shard"] = dict(job.get("shard", {}), index=args.shard_index)
+        if args.worker:
+            job["queue"] = dict(job.get("queue", {}), role="worker")
+        run_spec(job)
+
+if __name__ == "__main__":
+    main()
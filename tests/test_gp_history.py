@@ -0,0 +1,34 @@
+'''
+Tests of the histories used by the gp optimizer (Optimize_Functions.optimize_log_gp).
+
+Run from the main directory with: python -m pytest tests
+'''
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy
+import Optimize_Functions
+
+def failing_model(params, ns, pts):
+    raise ValueError("model cannot be evaluated")
+
+def test_gp_falls_back_to_perturbed_points(tmp_path, monkeypatch):
+    #every evaluation fails, which leaves no points to fit the surrogate
+    monkeypatch.chdir(tmp_path)
+    numpy.random.seed(1)
+    history = {}
+    params = Optimize_Functions.optimize_log_gp([1.0, 1.0, 0.5], None, failing_model, [12, 14, 16], "gp",
+                                                    [0.01, 0.01, 0.01], [30, 30, 30], 8, 1, history=history)
+    assert len(params) == 3
+    assert list(history) == [(12, 14, 16)]
+    assert len(history[(12, 14, 16)]) == 8
+
+def test_gp_keeps_one_history_per_grid(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    numpy.random.seed(1)
+    coarse = [[numpy.log([1.0, 1.0, 0.5]), -100.0]]
+    history = {(8, 10, 12): list(coarse)}
+    Optimize_Functions.optimize_log_gp([1.0, 1.0, 0.5], None, failing_model, [12, 14, 16], "gp",
+                                           [0.01, 0.01, 0.01], [30, 30, 30], 3, 1, history=history)
+    assert len(history[(8, 10, 12)]) == 1
+    assert len(history[(12, 14, 16)]) == 3
@@ -0,0 +1,38 @@
+'''
+Tests of the models built from demographic events (Model_Builder.py), compared with the
+hand-written models of Models_2D.py under the default parameter order.
+
+Run from the main directory with: python -m pytest tests
+'''
+import os
+import sys
+MAIN = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MAIN)
+sys.path.insert(0, os.path.join(MAIN, "Two_Population_Pipeline"))
+import numpy
+import pytest
+import Model_Builder
+import Models_2D
+from Model_Builder import Split, Admixture, Epoch, Growth
+
+admixture_models = [
+    ["vic_no_mig_admix_early", [Split(), Admixture("f", 1, 2), Epoch("T", ["1-s", "s"])],
+         ["T", "s", "f"], [0.8, 0.3, 0.2]],
+    ["vic_no_mig_admix_late", [Split(), Epoch("T", ["1-s", "s"]), Admixture("f", 1, 2)],
+         ["T", "s", "f"], [0.8, 0.3, 0.2]],
+    ["vic_two_epoch_admix", [Split(), Epoch("T1", ["1-s", "s"]), Admixture("f", 1, 2), Epoch("T2", ["1-s", "s"])],
+         ["T1", "T2", "s", "f"], [0.5, 0.3, 0.3, 0.2]],
+    ["founder_nomig_admix_early", [Split(), Admixture("f", 1, 2), Epoch("T", ["1-s", Growth("s", "nu2")])],
+         ["nu2", "T", "s", "f"], [2.0, 0.8, 0.3, 0.2]],
+    ["founder_nomig_admix_late", [Split(), Epoch("T", ["1-s", Growth("s", "nu2")]), Admixture("f", 1, 2)],
+         ["nu2", "T", "s", "f"], [2.0, 0.8, 0.3, 0.2]],
+]
+
+@pytest.mark.parametrize("name, events, labels, params", admixture_models)
+def test_default_order_matches_hand_written_model(name, events, labels, params):
+    model = Model_Builder.Build_Model(name, events)
+    assert model.param_labels == labels
+    ns, pts = [8, 10], 20
+    built = model(params, ns, pts)
+    hand = getattr(Models_2D, name)(params, ns, pts)
+    assert numpy.allclose(built, hand)
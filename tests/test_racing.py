@@ -0,0 +1,39 @@
+'''
+Tests of the racing of models in Optimize_Model_Set (Optimize_Functions.race_models).
+
+Run from the main directory with: python -m pytest tests
+'''
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Optimize_Functions
+
+def make_state(lls, param_number):
+    """
+    Return a model state with replicate results for a list of log-likelihoods.
+    """
+    results = [["Round_1_Replicate_{}".format(i+1), ll, -2*ll + 2*param_number, 0.0, 100.0, [1.0]*param_number]
+                   for i, ll in enumerate(lls)]
+    results.sort(key=lambda x: x[1], reverse=True)
+    return {"results": results}
+
+def test_inferior_model_with_unconverged_replicates_is_dropped():
+    #the replicates of the inferior model disagree by thousands of AIC units after round 1,
+    #which must not prevent it from being dropped when its best replicate is far behind
+    states = {"best": make_state([-500.0, -500.4, -501.0], 4),
+              "inferior": make_state([-1150.0, -3000.0, -5000.0], 3)}
+    dropped = Optimize_Functions.race_models(states, ["best", "inferior"], 5)
+    assert [d[0] for d in dropped] == ["inferior"]
+    assert dropped[0][2] == 0.0
+
+def test_close_model_is_kept():
+    states = {"best": make_state([-500.0, -500.4, -501.0], 4),
+              "close": make_state([-501.5, -502.0, -503.5], 3)}
+    assert Optimize_Functions.race_models(states, ["best", "close"], 5) == []
+
+def test_converged_spread_widens_threshold():
+    #replicates within the window that disagree give the model more room
+    states = {"best": make_state([-498.0], 4),
+              "spread": make_state([-503.5, -504.5, -506.4], 3)}
+    assert Optimize_Functions.race_models(states, ["best", "spread"], 5, race_sd=0.0) != []
+    assert Optimize_Functions.race_models(states, ["best", "spread"], 5, race_sd=2.0) == []
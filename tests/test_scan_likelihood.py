@@ -0,0 +1,31 @@
+'''
+Tests of the likelihood scans of Uncertainty_Functions.Scan_Likelihood.
+
+Run from the main directory with: python -m pytest tests
+'''
+import os
+import sys
+MAIN = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MAIN)
+sys.path.insert(0, os.path.join(MAIN, "Two_Population_Pipeline"))
+sys.path.insert(0, os.path.join(MAIN, "Uncertainty"))
+import dadi
+import numpy
+import Uncertainty_Functions
+import Models_2D
+
+def test_scan_of_fractions_is_bounded(tmp_path, monkeypatch):
+    #the default grid of s reaches 10 times its value, where the model cannot be evaluated
+    monkeypatch.chdir(tmp_path)
+    dd = dadi.Misc.make_data_dict(os.path.join(MAIN, "Example_Data", "dadi_2pops_North_South_snps.txt"))
+    fs = dadi.Spectrum.from_data_dict(dd, pop_ids=["North", "South"], projections=[8, 10], polarized=False)
+    scan = Uncertainty_Functions.Scan_Likelihood(fs, [12, 14, 16], "test", "vic_no_mig_admix_early",
+                                                     Models_2D.vic_no_mig_admix_early, params=[0.8, 0.6, 0.3],
+                                                     param_labels=["T", "s", "f"], points=5, workers=2)
+    assert numpy.max(scan["s_values"]) == 1.0
+    assert numpy.max(scan["f_values"]) == 1.0
+    #s = 1 leaves population 1 with a size of zero
+    assert numpy.isnan(scan["s_ll"][-1])
+    assert numpy.isfinite(scan["s_ll"][2])
+    assert numpy.all(numpy.isfinite(scan["T_ll"]))
+    assert os.path.exists("test.vic_no_mig_admix_early.scan.npz")
@@ -0,0 +1,41 @@
+'''
+Tests of the trace archives written by Optimize_Routine with trace_archive=True.
+
+Run from the main directory with: python -m pytest tests
+'''
+import os
+import sys
+MAIN = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MAIN)
+sys.path.insert(0, os.path.join(MAIN, "Two_Population_Pipeline"))
+import dadi
+import numpy
+import pytest
+import Optimize_Functions
+import Models_2D
+
+def make_spectrum():
+    """
+    Return a small folded spectrum of the example data.
+    """
+    dd = dadi.Misc.make_data_dict(os.path.join(MAIN, "Example_Data", "dadi_2pops_North_South_snps.txt"))
+    return dadi.Spectrum.from_data_dict(dd, pop_ids=["North", "South"], projections=[8, 10], polarized=False)
+
+@pytest.mark.parametrize("optimizer, workers", [("de", 1), ("de", 2), ("log_lbfgsb", 2)])
+def test_trace_archive_is_not_empty(tmp_path, monkeypatch, optimizer, workers):
+    monkeypatch.chdir(tmp_path)
+    numpy.random.seed(1)
+    fs = make_spectrum()
+    #narrow bounds keep the evaluations at the edges of the search quick on the small grid
+    Optimize_Functions.Optimize_Routine(fs, [12, 14, 16], "test", "no_mig", Models_2D.no_mig, 1, 3,
+                                            fs_folded=True, reps=[2], maxiters=[2], folds=[2],
+                                            in_upper=[5, 5, 2], in_lower=[0.2, 0.2, 0.05],
+                                            optimizer=optimizer, workers=workers, trace_archive=True,
+                                            quiet=True)
+    traces = Optimize_Functions.Read_Traces("test", "no_mig")
+    assert sorted(traces) == ["Round_1_Replicate_1", "Round_1_Replicate_2"]
+    for name, trace in traces.items():
+        assert len(trace["ll"]) > 0
+        assert trace["params"].shape == (len(trace["ll"]), 3)
+        #the evaluations are numbered in order within the replicate
+        assert numpy.all(numpy.diff(trace["eval"]) > 0)